@@ -1,19 +1,17 @@
 import pandas as pd
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from bs4 import BeautifulSoup
 import concurrent.futures
 import time
-import json
 import os
+import sys
 import re
 import logging
-from threading import Lock
+from urllib.parse import urlsplit
+from browser_pool import DriverPool
+from http_fetch import extract_table_html, fetch_table_html, rate_limiter, resolve_url
+from page_cache import PageCache
+from kv_cache import open_cache
+from instrumentation import stage, start_run, traced
+import table_parser
 
 STAT_CATEGORIES = {
     "standard": [
@@ -62,19 +60,36 @@ STAT_CATEGORIES = {
     ]
 }
 
-URLS = {
-    "standard": "https://fbref.com/en/comps/9/stats/Premier-League-Stats",
-    "keeper": "https://fbref.com/en/comps/9/keepers/Premier-League-Stats",
-    "keeper_adv": "https://fbref.com/en/comps/9/keepersadv/Premier-League-Stats",
-    "shooting": "https://fbref.com/en/comps/9/shooting/Premier-League-Stats",
-    "passing": "https://fbref.com/en/comps/9/passing/Premier-League-Stats",
-    "passing_types": "https://fbref.com/en/comps/9/passing_types/Premier-League-Stats",
-    "gca": "https://fbref.com/en/comps/9/gca/Premier-League-Stats",
-    "defense": "https://fbref.com/en/comps/9/defense/Premier-League-Stats",
-    "possession": "https://fbref.com/en/comps/9/possession/Premier-League-Stats",
-    "misc": "https://fbref.com/en/comps/9/misc/Premier-League-Stats"
+COMPETITIONS = {
+    9: "Premier-League",
+    12: "La-Liga",
+    11: "Serie-A",
+    20: "Bundesliga",
+    13: "Ligue-1",
 }
 
+CATEGORY_PAGES = {
+    "standard": "stats",
+    "keeper": "keepers",
+    "keeper_adv": "keepersadv",
+    "shooting": "shooting",
+    "passing": "passing",
+    "passing_types": "passing_types",
+    "gca": "gca",
+    "defense": "defense",
+    "possession": "possession",
+    "misc": "misc"
+}
+
+CURRENT_SEASON_URL = "https://fbref.com/en/comps/{comp_id}/{page}/{comp_name}-Stats"
+SEASON_URL = "https://fbref.com/en/comps/{comp_id}/{season}/{page}/{season}-{comp_name}-Stats"
+
+def category_url(category, comp_id=9, season=None):
+    template = CURRENT_SEASON_URL if season is None else SEASON_URL
+    return template.format(comp_id=comp_id, season=season, page=CATEGORY_PAGES[category], comp_name=COMPETITIONS[comp_id])
+
+URLS = {category: category_url(category) for category in CATEGORY_PAGES}
+
 TABLE_IDS = {
     "standard": "stats_standard",
     "keeper": "stats_keeper",
@@ -90,6 +105,10 @@ TABLE_IDS = {
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
 CACHE_FILE = os.path.join(script_dir, "fbref_cache.json")
+PAGE_CACHE_DIR = os.path.join(script_dir, "page_cache")
+# keeper_adv and passing_types have no columns in STAT_CATEGORIES, so fetching them only costs time
+SCRAPED_CATEGORIES = [category for category in URLS if category in STAT_CATEGORIES]
+BROWSER_POOL_SIZE = int(os.environ.get("FBREF_BROWSER_POOL_SIZE", "4"))
 
 def get_first_name(full_name):
     if not full_name or not isinstance(full_name, str) or re.match(r'^\d+$', full_name) or not any(c.isalpha() for c in full_name):
@@ -104,57 +123,62 @@ def parse_minutes(minutes_str):
     except (ValueError, AttributeError):
         return 0
 
-def scrape_table(url, table_id, stat_category, max_retries=2):
-    options = Options()
-    options.add_argument("--headless")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/91.0.4472.124 Safari/537.36")
+def fetch_page_source(pool, url, table_id):
+    # selenium is only imported once a page has to go through the browser
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
 
-    for attempt in range(max_retries):
-        driver = None
-        try:
-            driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+    rate_limiter.wait(url)
+    with pool.session() as driver:
+        start = time.perf_counter()
+        with stage("fetch", host=urlsplit(url).netloc, via="browser"):
             driver.get(url)
+        with stage("wait_table", table=table_id):
             WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, table_id)))
+        pool.record("page_load", time.perf_counter() - start)
+        with stage("fetch", host=urlsplit(url).netloc, via="page_source") as fetched:
+            html = driver.page_source
+            fetched.bytes = len(html)
+        return html
 
-            soup = BeautifulSoup(driver.page_source, "html.parser")
-            table = soup.find("table", id=table_id)
-            if not table:
-                logging.error(f"No table found with id {table_id} at {url}")
-                return {}
+def parse_table(html, table_id, stat_category):
+    with stage("parse", category=stat_category) as parsed:
+        data = table_parser.parse_table(html, table_id, STAT_CATEGORIES[stat_category], stat_category,
+                                        include_minutes_raw=stat_category == "standard")
+        parsed.bytes, parsed.rows = len(html), len(data or ())
+    return data
+
+def scrape_table(url, table_id, stat_category, max_retries=2, pool=None, use_http=True):
+    if use_http:
+        html = fetch_table_html(url, table_id)
+        if html is not None:
+            try:
+                data = parse_table(html, table_id, stat_category)
+                if data is not None:
+                    return data
+            except Exception as e:
+                logging.error(f"Failed to parse {table_id} from HTTP response: {str(e)}")
+        logging.info(f"Table {table_id} not found over HTTP, falling back to browser for {url}")
 
-            headers = table.find("thead").find_all("tr")[-1].find_all(["th", "td"])
-            stat_to_index = {header.get("data-stat"): idx for idx, header in enumerate(headers) if header.get("data-stat")}
-
-            data = {}
-            rows = table.find("tbody").find_all("tr")
-            for row in rows:
-                player_cell = row.find(["th", "td"], {"data-stat": "player"})
-                if not player_cell:
-                    continue
-                player_name = player_cell.text.strip()
-                if not player_name or re.match(r'^\d+$', player_name):
-                    continue
-
-                if player_name in data:
-                    logging.warning(f"Duplicate player found in {stat_category}: {player_name}")
-
-                data[player_name] = {}
-                cells = row.find_all(["th", "td"])
-                for stat_name, data_stat in STAT_CATEGORIES[stat_category]:
-                    idx = stat_to_index.get(data_stat)
-                    if idx is not None and idx < len(cells):
-                        value = cells[idx].text.strip()
-                        data[player_name][stat_name] = value if value and value != "" else "N/a"
-                    else:
-                        data[player_name][stat_name] = "N/a"
-
-                if stat_category == "standard":
-                    idx = stat_to_index.get("minutes")
-                    data[player_name]["Minutes_raw"] = cells[idx].text.strip().replace(",", "") if idx is not None and idx < len(cells) else "N/a"
+    own_pool = pool is None
+    if own_pool:
+        pool = DriverPool(size=1)
 
+    try:
+        return _scrape_table_with_browser(pool, resolve_url(url), table_id, stat_category, max_retries)
+    finally:
+        if own_pool:
+            pool.close()
+
+def _scrape_table_with_browser(pool, url, table_id, stat_category, max_retries):
+    for attempt in range(max_retries):
+        try:
+            page_source = fetch_page_source(pool, url, table_id)
+            data = parse_table(page_source, table_id, stat_category)
+            if data is None:
+                logging.error(f"No table found with id {table_id} at {url}")
+                return {}
             return data
 
         except Exception as e:
@@ -164,78 +188,170 @@ def scrape_table(url, table_id, stat_category, max_retries=2):
             else:
                 logging.error(f"Failed to scrape {url} after {max_retries} attempts")
                 return {}
-        finally:
-            if driver:
-                driver.quit()
 
 def load_cached_data():
-    if os.path.exists(CACHE_FILE):
-        with open(CACHE_FILE, 'r') as f:
-            return json.load(f)
-    return None
+    with stage("cache_load", cache="fbref") as loaded, open_cache(CACHE_FILE) as cache:
+        data = dict(cache.items())
+        loaded.rows = len(data)
+        return data or None
 
 def save_to_cache(data):
-    with open(CACHE_FILE, 'w') as f:
-        json.dump(data, f)
+    # Players whose row did not change keep their timestamp (and, with SQLite, are not rewritten)
+    with stage("cache_save", cache="fbref") as saved, open_cache(CACHE_FILE) as cache:
+        saved.rows = len(data)
+        cache.replace(data)
+
+def scrape_category(category, pool=None, page_cache=None, url=None, table_key=None):
+    # Returns (rows, sha256 of the source page or None when it came from the browser)
+    url, table_id = url or URLS[category], TABLE_IDS[category]
+    table_key = table_key or category
+    if page_cache is None:
+        return scrape_table(url, table_id, category, pool=pool), None
+
+    page = page_cache.fetch(url)
+    if page is not None:
+        cached = page_cache.load_table(table_key, page.sha256)
+        if cached is not None:
+            logging.info(f"Skipping parse of {category}: page hash unchanged")
+            return cached, page.sha256
+
+        table_html = extract_table_html(page.html, table_id)
+        if table_html is not None:
+            try:
+                data = parse_table(table_html, table_id, category)
+            except Exception as e:
+                logging.error(f"Failed to parse {table_id} from cached page: {str(e)}")
+                data = None
+            if data is not None:
+                page_cache.store_table(table_key, page.sha256, data)
+                return data, page.sha256
+        logging.info(f"Table {table_id} not found over HTTP, falling back to browser for {url}")
+
+    return scrape_table(url, table_id, category, pool=pool, use_http=False), None
 
-def scrape_all_stats(force_scrape=False):
+def category_columns(category):
+    columns = [stat_name for stat_name, _ in STAT_CATEGORIES.get(category, [])]
+    if category == "standard":
+        columns = ["Player", "Player ID"] + columns + ["Minutes_raw"]
+    return columns
+
+# Columns such as PrgP/PrgR appear in several tables; the first category in URLS order owns them.
+# Identity columns come from "standard", which is also the only table carrying minutes.
+COLUMN_OWNERS = {}
+for _category in SCRAPED_CATEGORIES:
+    for _column in category_columns(_category):
+        COLUMN_OWNERS.setdefault(_column, _category)
+
+def owned_columns(category):
+    return [column for column in category_columns(category) if COLUMN_OWNERS[column] == category]
+
+def table_frame(category, table_data):
+    frame = pd.DataFrame.from_dict(table_data, orient="index", columns=category_columns(category))
+    return frame[owned_columns(category)]
+
+@traced("merge")
+def merge_tables(merged, tables):
+    # One outer join on the player key over every category being (re)placed. When a previous merge is
+    # passed in, only the column blocks owned by the categories in `tables` are swapped out.
+    frames = [table_frame(category, table_data) for category, table_data in tables.items()]
+    if merged is not None:
+        replaced = [column for category in tables for column in owned_columns(category)]
+        frames.insert(0, merged.drop(columns=replaced, errors="ignore"))
+    if not frames:
+        return merged
+    return pd.concat(frames, axis=1, join="outer", sort=False).dropna(how="all")
+
+def frame_to_json(frame):
+    frame = frame.astype(object).where(frame.notna(), None)
+    return {"index": frame.index.tolist(), "columns": frame.columns.tolist(), "data": frame.values.tolist()}
+
+def frame_from_json(data):
+    return pd.DataFrame(data["data"], index=data["index"], columns=data["columns"])
+
+def results_frame(players):
+    required_columns = ["First Name"] + [stat_name for stats in STAT_CATEGORIES.values() for stat_name, _ in stats]
+    # required_columns repeats PrgP/PrgR on purpose; results.csv has always carried both copies
+    # The full name and fbref id go last so existing column positions are unchanged; Ex4 matches on the name
+    identity_columns = [column for column in ("Player", "Player ID") if column in players]
+    df = players.reindex(columns=list(dict.fromkeys(required_columns)))[required_columns]
+    df = pd.concat([df, players[identity_columns]], axis=1)
+    df = df.sort_values(by="First Name", kind="stable").reset_index(drop=True)
+    df = df.fillna("N/a")
+    df = df.replace("", "N/a")
+    return df
+
+def filter_players(all_players, min_minutes=90):
+    minutes = all_players["Minutes_raw"].map(parse_minutes) if "Minutes_raw" in all_players else 0
+    filtered_players = all_players[minutes > min_minutes].copy()
+    filtered_players.insert(0, "First Name", filtered_players["Player"].map(get_first_name))
+    return filtered_players
+
+def scrape_all_stats(force_scrape=False, pool_size=BROWSER_POOL_SIZE, use_page_cache=True):
     if not force_scrape:
         cached_data = load_cached_data()
         if cached_data:
-            df = pd.DataFrame.from_dict(cached_data, orient="index")
-            df = df.fillna("N/a")
-            df = df.replace("", "N/a")
-            return df
-
-    all_players_data = {}
-    data_lock = Lock()
-
-    def process_table(category):
-        table_data = scrape_table(URLS[category], TABLE_IDS[category], category)
-        with data_lock:
-            for player, stats in table_data.items():
-                if player not in all_players_data:
-                    all_players_data[player] = {"First Name": get_first_name(player)}
-                all_players_data[player].update(stats)
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
-        executor.map(process_table, URLS.keys())
-
-    filtered_players = {
-        player: data for player, data in all_players_data.items()
-        if parse_minutes(data.get("Minutes_raw", "0")) > 90
-    }
+            players = pd.DataFrame.from_dict(cached_data, orient="index")
+            if "Player" not in players:
+                # Caches written before players were keyed by fbref id are keyed by full name
+                players["Player"] = players.index
+            return results_frame(players)
 
-    logging.info(f"Found {len(filtered_players)} players with > 90 minutes")
+    page_cache = PageCache(PAGE_CACHE_DIR) if use_page_cache else None
+    merged = page_cache.load_merged() if page_cache else {"hashes": {}, "frame": None}
 
-    required_columns = ["First Name"] + [stat_name for stats in STAT_CATEGORIES.values() for stat_name, _ in stats]
+    with DriverPool(size=pool_size) as pool:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+            results = dict(zip(SCRAPED_CATEGORIES, executor.map(lambda category: scrape_category(category, pool, page_cache), SCRAPED_CATEGORIES)))
 
-    for player in filtered_players:
-        for col in required_columns:
-            filtered_players[player][col] = filtered_players[player].get(col, "N/a")
+        for kind, summary in pool.timing_summary().items():
+            logging.info(f"Browser {kind}: {summary['count']} runs, {summary['total']:.2f}s total, {summary['max']:.2f}s max")
 
-    save_to_cache(filtered_players)
-    df = pd.DataFrame.from_dict(filtered_players, orient="index").reset_index(drop=True)
-    df = df[required_columns].sort_values(by="First Name").reset_index(drop=True)
+    # Re-merge only the categories whose source page changed since the merged snapshot was taken
+    changed = {}
+    for category in SCRAPED_CATEGORIES:
+        table_data, sha256 = results[category]
+        if sha256 is not None and merged["hashes"].get(category) == sha256:
+            continue
+        if not table_data and merged["hashes"].get(category):
+            logging.warning(f"Keeping previously merged {category} rows: scrape returned nothing")
+            continue
+        changed[category] = table_data
+        merged["hashes"][category] = sha256
+    logging.info(f"Re-merged {len(changed)}/{len(SCRAPED_CATEGORIES)} categories: {list(changed)}")
 
-    if not df.index.is_unique:
-        logging.warning("Duplicate indices detected in final DataFrame")
-        df = df.drop_duplicates().reset_index(drop=True)
+    previous = frame_from_json(merged["frame"]) if merged["frame"] else None
+    all_players = merge_tables(previous, changed)
+    if all_players is None:
+        logging.error("No player tables could be scraped")
+        return pd.DataFrame()
 
-    df = df.fillna("N/a")
-    df = df.replace("", "N/a")
+    if page_cache:
+        page_cache.save()
+        if changed:
+            merged["frame"] = frame_to_json(all_players)
+            page_cache.save_merged(merged)
 
-    return df
+    filtered_players = filter_players(all_players)
+    logging.info(f"Found {len(filtered_players)} players with > 90 minutes")
+
+    save_to_cache(filtered_players.astype(object).where(filtered_players.notna(), "N/a").to_dict(orient="index"))
+    return results_frame(filtered_players)
 
 if __name__ == "__main__":
+    start_run("Ex1")
     try:
+        # force_scrape bypasses fbref_cache.json; unchanged pages are still served from page_cache/
         df = scrape_all_stats(force_scrape=True)
         if df is not None and not df.empty:
             output_path = os.path.join(script_dir, "results.csv")
-            print(f"Saving results.csv to: {output_path}")  # Debug: Print the output path
             df.to_csv(output_path, index=False)
-            logging.info("Data successfully exported to results.csv")
+            logging.info(f"Exported {len(df)} players to {output_path}")
+            from schema import write_typed
+            if write_typed(df, os.path.join(script_dir, "results.parquet")):
+                logging.info("Typed copy exported to results.parquet")
         else:
             logging.error("No data was scraped or DataFrame is empty")
+            sys.exit(1)
     except Exception as e:
         logging.error(f"Script failed: {str(e)}")
+        sys.exit(1)
@@ -0,0 +1,115 @@
+import gzip
+import glob
+import os
+import re
+import sys
+import time
+import logging
+
+from bs4 import BeautifulSoup
+
+from Ex1 import PAGE_CACHE_DIR, SCRAPED_CATEGORIES, STAT_CATEGORIES, TABLE_IDS, URLS, parse_table
+from http_fetch import extract_table_html, page_path
+
+# Compares the streaming lxml parser used by Ex1 with the BeautifulSoup/html.parser version it replaced.
+#   python bench_parser.py [saved_pages_dir] [repeats]
+# Pages are read from a FBREF_SAVE_PAGES snapshot directory if given, otherwise from page_cache/.
+
+
+def parse_table_bs4(html, table_id, stat_category):
+    soup = BeautifulSoup(html, "html.parser")
+    table = soup.find("table", id=table_id)
+    if not table:
+        return None
+
+    headers = table.find("thead").find_all("tr")[-1].find_all(["th", "td"])
+    stat_to_index = {header.get("data-stat"): idx for idx, header in enumerate(headers) if header.get("data-stat")}
+
+    data = {}
+    rows = table.find("tbody").find_all("tr")
+    for row in rows:
+        # fbref repeats the header every 20-25 rows as <tr class="thead">
+        if "thead" in (row.get("class") or []):
+            continue
+        player_cell = row.find(["th", "td"], {"data-stat": "player"})
+        if not player_cell:
+            continue
+        player_name = player_cell.text.strip()
+        if not player_name or re.match(r'^\d+$', player_name):
+            continue
+
+        if player_name in data:
+            logging.warning(f"Duplicate player found in {stat_category}: {player_name}")
+
+        data[player_name] = {}
+        cells = row.find_all(["th", "td"])
+        for stat_name, data_stat in STAT_CATEGORIES[stat_category]:
+            idx = stat_to_index.get(data_stat)
+            if idx is not None and idx < len(cells):
+                value = cells[idx].text.strip()
+                data[player_name][stat_name] = value if value and value != "" else "N/a"
+            else:
+                data[player_name][stat_name] = "N/a"
+
+        if stat_category == "standard":
+            idx = stat_to_index.get("minutes")
+            data[player_name]["Minutes_raw"] = cells[idx].text.strip().replace(",", "") if idx is not None and idx < len(cells) else "N/a"
+
+    return data
+
+
+def load_pages(directory):
+    pages = {}
+    if directory:
+        for category in SCRAPED_CATEGORIES:
+            path = page_path(directory, URLS[category])
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    pages[category] = f.read()
+        return pages
+
+    for path in glob.glob(os.path.join(PAGE_CACHE_DIR, "pages", "*.html.gz")):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            html = f.read()
+        for category in SCRAPED_CATEGORIES:
+            if category not in pages and re.search(r"id=[\"']" + TABLE_IDS[category] + r"[\"']", html):
+                pages[category] = html
+    return pages
+
+
+def best_of(func, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main(directory=None, repeats=5):
+    logging.disable(logging.WARNING)
+    pages = load_pages(directory)
+    if not pages:
+        print("No saved pages found. Run Ex1.py with FBREF_SAVE_PAGES set, or once with the page cache enabled.")
+        return
+
+    print(f"{'category':<12}{'rows':>6}{'bs4 (ms)':>12}{'lxml (ms)':>12}{'speedup':>10}")
+    total_old = total_new = 0.0
+    for category, html in pages.items():
+        table_id = TABLE_IDS[category]
+        table_html = extract_table_html(html, table_id) or html
+        old_time, old_rows = best_of(lambda: parse_table_bs4(table_html, table_id, category), repeats)
+        new_time, new_rows = best_of(lambda: parse_table(table_html, table_id, category), repeats)
+        # The lxml rows are keyed by player id|team; re-key by name to compare with the old output
+        by_name = {row["Player"]: {k: v for k, v in row.items() if k not in ("Player", "Player ID")}
+                   for row in (new_rows or {}).values()}
+        if old_rows != by_name:
+            print(f"WARNING: parsers disagree on {category}")
+        total_old += old_time
+        total_new += new_time
+        print(f"{category:<12}{len(new_rows or {}):>6}{old_time * 1000:>12.1f}{new_time * 1000:>12.1f}{old_time / new_time:>9.1f}x")
+    print(f"{'total':<12}{'':>6}{total_old * 1000:>12.1f}{total_new * 1000:>12.1f}{total_old / total_new:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else None, int(sys.argv[2]) if len(sys.argv) > 2 else 5)
@@ -0,0 +1,280 @@
+import argparse
+import functools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+# Ex3 and k_sweep import these on first use; importing them here keeps that one-off cost out of the timed steps
+import sklearn.cluster
+import sklearn.decomposition
+import sklearn.impute
+import sklearn.metrics
+import sklearn.preprocessing
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+for exercise in ("Exercise2", "Exercise3", "Exercise4"):
+    sys.path.insert(0, os.path.join(script_dir, "..", exercise))
+import Ex3
+from cluster_model import FRACTION_COLUMNS
+from k_sweep import MINIBATCH_ROWS, best_k, sweep_k
+from name_matching import NameIndex
+from results_data import load_results, split_columns
+from synthetic_data import SIZES, dataset
+
+# Scaling benchmark over synthetic results.csv files (synthetic_data.py) of SIZES players: loading the CSV, Ex2's
+# analyze_data / calculate_statistics / generate_top_bottom_3, Ex3's scaling, k sweep and PCA, and Ex4's name
+# matching against a Transfermarkt-like listing of the same players. Each step reports wall time and peak traced
+# memory (tracemalloc, so pure-Python steps run slower than untraced). Every run is appended to HISTORY_PATH with
+# the git commit, and each step is compared with the previous run of the same size and step on this machine (or
+# with --baseline, the last run at that commit); steps over TOLERANCE slower or larger are flagged.
+# Each size runs in a worker process, so a size that runs out of memory shows up as failed steps.
+#   python bench_pipeline.py [--sizes 1000,10000] [--steps load,k_sweep] [--baseline abc1234] [--check]
+
+HISTORY_PATH = os.path.join(script_dir, "bench_history.jsonl")
+STEPS = ('load', 'team_means', 'statistics', 'rankings', 'scale', 'k_sweep', 'pca', 'name_matching')
+EX2_STEPS = ('load', 'team_means', 'statistics', 'rankings')
+# The input each step works on, built before its timer starts
+PREREQUISITES = {'team_means': 'ex2_frame', 'statistics': 'ex2_frame', 'rankings': 'ex2_frame',
+                 'scale': 'ex3_frame', 'k_sweep': 'scaled', 'pca': 'scaled', 'name_matching': 'listing'}
+TOLERANCE = 0.2
+# Time regressions also have to be this many seconds, so millisecond steps do not flag on noise
+MIN_SLOWDOWN = 0.05
+# Ex4 only looks up players above this many minutes
+MATCH_MINUTES = 900
+LISTED_FRACTION = 0.85
+UNKNOWN_FRACTION = 0.1
+
+
+def transfermarkt_listing(players, seed=0):
+    # Transfermarkt-like (name, club) rows for LISTED_FRACTION of `players` ([(key, name, team)]), some with
+    # accents or the club's long name, shuffled with UNKNOWN_FRACTION rows of players Ex1 does not have.
+    # Returns (rows, {row: key}) for scoring the matches.
+    rng = np.random.default_rng(seed)
+    listed = [player for player, keep in zip(players, rng.random(len(players)) < LISTED_FRACTION) if keep]
+    rows = []
+    for key, name, team in listed:
+        if rng.random() < 0.1:
+            name = name.replace("a", "á", 1)
+        rows.append((name, f"{team} FC" if rng.random() < 0.5 else team))
+    truth = dict(enumerate(key for key, _, _ in listed))
+    unknown = rng.integers(len(players), size=int(len(players) * UNKNOWN_FRACTION))
+    rows += [(f"{players[i][1].split()[0]} Unknown{n}", players[i][2]) for n, i in enumerate(unknown)]
+    order = rng.permutation(len(rows))
+    position = np.argsort(order)
+    return [rows[i] for i in order], {int(position[row]): key for row, key in truth.items()}
+
+
+class Workload:
+    # The inputs of every step for one dataset; each is built on first use, outside the timed step that needs it
+    def __init__(self, path, k_range):
+        self.path = path
+        self.k_range = k_range
+        # Ex2 loads Ex1's results.csv when it is imported; its steps work on whatever frame is put in Ex2.df
+        import Ex2
+        self.ex2 = Ex2
+        self.ex2.df = None
+        self.ex2.OUTPUT_DIR = os.path.dirname(path)
+
+    @functools.cached_property
+    def ex2_frame(self):
+        return load_results(self.path, fraction_columns=self.ex2.percent_cols, use_cache=False)
+
+    @functools.cached_property
+    def ex3_frame(self):
+        return load_results(self.path, fraction_columns=FRACTION_COLUMNS)
+
+    @functools.cached_property
+    def scaled(self):
+        return Ex3.scale_stats(self.ex3_frame, split_columns(self.ex3_frame)[1])[2]
+
+    @functools.cached_property
+    def listing(self):
+        players = self.ex3_frame[self.ex3_frame['Minutes'] > MATCH_MINUTES]
+        players = list(dict.fromkeys(zip(players['Player'] + "|" + players['Team'], players['Player'],
+                                         players['Team'])))
+        return players, *transfermarkt_listing(players)
+
+    def use_ex2_frame(self):
+        self.ex2.df, self.ex2.stats_columns = self.ex2_frame, split_columns(self.ex2_frame)[1]
+
+    def release_ex2_frame(self):
+        self.ex2.df = None
+        self.__dict__.pop('ex2_frame', None)
+
+    # Steps; each returns extra fields for its record
+    def load(self):
+        self.__dict__.pop('ex2_frame', None)
+        self.use_ex2_frame()
+        return {'columns': self.ex2_frame.shape[1]}
+
+    def _ex2(self, function):
+        self.use_ex2_frame()
+        function()
+        return {}
+
+    def team_means(self):
+        return self._ex2(self.ex2.analyze_data)
+
+    def statistics(self):
+        return self._ex2(self.ex2.calculate_statistics)
+
+    def rankings(self):
+        return self._ex2(self.ex2.generate_top_bottom_3)
+
+    def scale(self):
+        self.__dict__.pop('scaled', None)
+        return {'features': self.scaled.shape[1]}
+
+    def k_sweep(self):
+        table, _ = sweep_k(self.scaled, self.k_range)
+        return {'best_k': best_k(table), 'minibatch': self.scaled.shape[0] > MINIBATCH_ROWS}
+
+    def pca(self):
+        Ex3.make_pca(self.scaled).fit_transform(self.scaled)
+        return {}
+
+    def name_matching(self):
+        players, rows, truth = self.listing
+        matches, ambiguous = NameIndex(players).match(rows)
+        correct = sum(truth.get(row) == key for key, (row, _) in matches.items())
+        return {'players': len(players), 'listed': len(truth), 'matched': len(matches),
+                'ambiguous': len(ambiguous), 'precision': round(correct / max(len(matches), 1), 4),
+                'recall': round(correct / max(len(truth), 1), 4)}
+
+
+def measure(workload, step):
+    if step in PREREQUISITES:
+        getattr(workload, PREREQUISITES[step])
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        record = {'ok': True, **getattr(workload, step)()}
+    except Exception as e:
+        record = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'step': step, 'seconds': round(seconds, 4), 'peak_mb': round(peak / 2 ** 20, 1), **record}
+
+
+def git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=script_dir, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def read_history(path=HISTORY_PATH):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def previous_run(history, record, baseline=None):
+    # The latest successful record of the same size and step on this machine (at `baseline` when given)
+    for old in reversed(history):
+        if (old['rows'], old['step'], old['host'], old['cpus']) == (record['rows'], record['step'], record['host'],
+                                                                     record['cpus']) and old['ok'] \
+                and (baseline is None or (old['commit'] or "").startswith(baseline)):
+            return old
+    return None
+
+
+def compare(record, old):
+    if old is None or not record['ok']:
+        return ""
+    slower = record['seconds'] > old['seconds'] * (1 + TOLERANCE) and \
+        record['seconds'] - old['seconds'] > MIN_SLOWDOWN
+    larger = record['peak_mb'] > old['peak_mb'] * (1 + TOLERANCE) and record['peak_mb'] - old['peak_mb'] > 1
+    return ", ".join(flag for flag, hit in (("SLOWER", slower), ("MORE MEMORY", larger)) if hit)
+
+
+def run_worker(path, steps, k_max, output):
+    # Benchmarks one dataset, appending each step's record to `output` as it finishes; Ex2's reports are written
+    # next to the dataset
+    workload = Workload(path, range(2, k_max + 1))
+    last_ex2_step = ([step for step in steps if step in EX2_STEPS] or [None])[-1]
+    for step in steps:
+        record = measure(workload, step)
+        if step == last_ex2_step:
+            workload.release_ex2_frame()
+        with open(output, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+
+
+def bench_size(rows, steps, k_max):
+    # Records of every step on a dataset of `rows` players. Each size runs in its own process, so one that runs out
+    # of memory is reported as failed instead of ending the benchmark, and sizes do not share memory.
+    path = dataset(rows)
+    output = os.path.join(os.path.dirname(path), "bench_records.jsonl")
+    if os.path.exists(output):
+        os.remove(output)
+    worker = subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", path, "--steps", ",".join(steps),
+                             "--k-max", str(k_max), "--output", output], stdout=subprocess.DEVNULL)
+    records = {record['step']: record for record in read_history(output)}
+    status = (f"killed by signal {-worker.returncode}" if worker.returncode < 0
+              else f"exited with status {worker.returncode}")
+    return [records.get(step, {'step': step, 'seconds': None, 'peak_mb': None, 'ok': False,
+                               'error': f"worker {status}"}) for step in steps]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Ex2-Ex4 on synthetic datasets of growing size")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)), help="comma-separated player counts")
+    parser.add_argument("--steps", default=",".join(STEPS), help=f"comma-separated subset of {','.join(STEPS)}")
+    parser.add_argument("--k-max", type=int, default=20, help="largest k of the sweep (from 2)")
+    parser.add_argument("--baseline", help="compare with the last run at this commit instead of the last run")
+    parser.add_argument("--history", default=HISTORY_PATH)
+    parser.add_argument("--no-save", action="store_true", help="do not append this run to the history")
+    parser.add_argument("--check", action="store_true", help="exit with status 1 when a step regressed or failed")
+    parser.add_argument("--worker", metavar="DATASET", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    steps = [step for step in STEPS if step in args.steps.split(",")]
+    if args.worker:
+        run_worker(args.worker, steps, args.k_max, args.output)
+        sys.exit()
+
+    history = read_history(args.history)
+    run = {'run': time.strftime("%Y%m%dT%H%M%S"), 'commit': git("rev-parse", "--short", "HEAD"),
+           'dirty': bool(git("status", "--porcelain", "--untracked-files=no", "--", "..")),
+           'host': platform.node(), 'cpus': os.cpu_count(), 'python': platform.python_version()}
+    print(f"Commit {run['commit']}{' (uncommitted changes)' if run['dirty'] else ''}, {run['cpus']} CPUs")
+
+    records = []
+    failed = regressed = False
+    for rows in map(int, args.sizes.split(",")):
+        start = time.perf_counter()
+        table = []
+        for record in bench_size(rows, steps, args.k_max):
+            record = {**run, 'rows': rows, **record}
+            old = previous_run(history, record, args.baseline)
+            flag = compare(record, old) or ("FAILED: " + record['error'] if not record['ok'] else "")
+            failed |= not record['ok']
+            regressed |= bool(compare(record, old))
+            records.append(record)
+            table.append({'step': record['step'], 'seconds': record['seconds'], 'peak MB': record['peak_mb'],
+                          'previous s': old['seconds'] if old else None,
+                          'previous MB': old['peak_mb'] if old else None, 'flag': flag,
+                          'details': ", ".join(f"{key}={value}" for key, value in record.items()
+                                               if key not in run and key not in ('rows', 'step', 'seconds',
+                                                                                 'peak_mb', 'ok', 'error'))})
+        print(f"\n{rows} players ({time.perf_counter() - start:.1f}s including generation)")
+        print(pd.DataFrame(table).to_string(index=False))
+
+    if not args.no_save:
+        with open(args.history, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, default=str) + "\n")
+        print(f"\nAppended {len(records)} records to {args.history}")
+    if args.check and (failed or regressed):
+        sys.exit(1)
@@ -0,0 +1,99 @@
+import argparse
+import collections
+import glob
+import os
+import subprocess
+import sys
+import time
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(script_dir)
+
+# Startup budget of the scripts' cache-hit paths. Each scenario runs REPEAT times in a fresh interpreter under
+# `python -X importtime`; the report gives the fastest wall time, the time spent importing, the packages that
+# cost the most (own import time of all their modules) and any HEAVY_MODULES that got loaded. Those belong to the
+# scraping, training and plotting paths only, so a cache hit that loads one has an import that should be moved into
+# the function needing it.
+# Ex4 runs at import and crawls on a cache miss, so its scenario imports the modules Ex4 imports instead.
+#   python bench_startup.py [ex1 pipeline] [--budget 1.0] [--check]
+
+Scenario = collections.namedtuple("Scenario", "name directory args requires")
+SCENARIOS = (
+    # scrape_all_stats() without force_scrape is served from fbref_cache.json
+    Scenario("ex1", "Exercise1", ["-c", "import Ex1; Ex1.scrape_all_stats()"], "Exercise1/fbref_cache.*"),
+    Scenario("ex2", "Exercise2", ["-c", "import Ex2"], None),
+    Scenario("ex3", "Exercise3", ["-c", "import Ex3"], None),
+    Scenario("ex4", "Exercise4", ["-c", "import sys; sys.path.insert(0, '../Exercise1'); "
+                                        "import kv_cache, name_matching, results_data, transfer_crawler, value_model"],
+             None),
+    # What a cron run costs when every stage is up to date
+    Scenario("pipeline", "Exercise1", ["pipeline.py", "--dry-run"], None),
+)
+SCENARIOS_BY_NAME = {scenario.name: scenario for scenario in SCENARIOS}
+HEAVY_MODULES = ("selenium", "webdriver_manager", "bs4", "sklearn", "scipy", "matplotlib")
+BUDGET = 1.0
+REPEAT = 3
+TOP_IMPORTS = 4
+
+
+def parse_importtime(stderr):
+    # {module: seconds spent importing it, not counting the modules it imported}
+    modules = {}
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and "[us]" not in line:
+            own, _, name = line[len("import time:"):].split("|")
+            modules[name.strip()] = int(own) / 1e6
+    return modules
+
+
+def run_scenario(scenario, repeat=REPEAT):
+    # {"wall", "imports", "top", "heavy"}, or {"error"} when the scenario failed
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        process = subprocess.run([sys.executable, "-X", "importtime", *scenario.args],
+                                 cwd=os.path.join(ROOT_DIR, scenario.directory), capture_output=True, text=True,
+                                 env=dict(os.environ, MPLBACKEND="Agg"))
+        wall = time.perf_counter() - start
+        if process.returncode != 0:
+            return {"error": process.stderr.strip().splitlines()[-1] if process.stderr.strip() else
+                    f"exit status {process.returncode}"}
+        if best is None or wall < best["wall"]:
+            packages = collections.Counter()
+            for module, seconds in parse_importtime(process.stderr).items():
+                packages[module.split(".")[0]] += seconds
+            best = {"wall": wall, "imports": sum(packages.values()), "top": packages.most_common(TOP_IMPORTS),
+                    "heavy": sorted(set(packages) & set(HEAVY_MODULES))}
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the scripts' startup on their cache-hit paths")
+    parser.add_argument("scenarios", nargs="*", metavar="SCENARIO",
+                        help=f"some of {', '.join(SCENARIOS_BY_NAME)}; all of them by default")
+    parser.add_argument("--budget", type=float, default=BUDGET, help="seconds each scenario may take")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="runs per scenario; the fastest is reported")
+    parser.add_argument("--check", action="store_true",
+                        help="exit with status 1 when a scenario fails, goes over budget or loads a heavy module")
+    args = parser.parse_args()
+    unknown = sorted(set(args.scenarios) - set(SCENARIOS_BY_NAME))
+    if unknown:
+        parser.error(f"unknown scenario {', '.join(unknown)}; expected {', '.join(SCENARIOS_BY_NAME)}")
+
+    failed = False
+    print(f"{'scenario':<9} {'wall s':>7} {'import s':>8}  {'top packages (s)':<64} flags")
+    for scenario in (SCENARIOS_BY_NAME[name] for name in args.scenarios or SCENARIOS_BY_NAME):
+        if scenario.requires and not glob.glob(os.path.join(ROOT_DIR, scenario.requires)):
+            print(f"{scenario.name:<9} skipped: no {scenario.requires}")
+            continue
+        result = run_scenario(scenario, args.repeat)
+        if "error" in result:
+            failed = True
+            print(f"{scenario.name:<9} FAILED: {result['error']}")
+            continue
+        flags = (["over budget"] if result["wall"] > args.budget else []) + result["heavy"]
+        failed = failed or bool(flags)
+        top = ", ".join(f"{module} {seconds:.3f}" for module, seconds in result["top"])
+        print(f"{scenario.name:<9} {result['wall']:>7.3f} {result['imports']:>8.3f}  {top:<64} {' '.join(flags)}")
+    if args.check and failed:
+        sys.exit(1)
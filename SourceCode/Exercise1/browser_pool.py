@@ -0,0 +1,144 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+# selenium and webdriver_manager are imported when the first browser is launched: runs served from the page cache
+# never start one, and these imports cost more than the rest of Ex1's startup
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/91.0.4472.124 Safari/537.36"
+
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+
+def get_driver_path():
+    # ChromeDriverManager().install() hits the network/disk every call, so resolve it once per process
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path is None:
+            from webdriver_manager.chrome import ChromeDriverManager
+
+            start = time.perf_counter()
+            _driver_path = ChromeDriverManager().install()
+            logging.info(f"Resolved chromedriver in {time.perf_counter() - start:.2f}s: {_driver_path}")
+    return _driver_path
+
+
+def build_options():
+    from selenium.webdriver.chrome.options import Options
+
+    options = Options()
+    options.add_argument("--headless")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument(f"user-agent={USER_AGENT}")
+    return options
+
+
+class DriverPool:
+    def __init__(self, size=4, options=None):
+        self.size = max(1, size)
+        # Built with the first browser, so a pool that is never used does not load selenium
+        self.options = options
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._idle = []
+        self._idle_lock = threading.Lock()
+        self._all = set()
+        self._closed = False
+        self.timings = {"startup": [], "page_load": []}
+        self._timings_lock = threading.Lock()
+
+    def record(self, kind, seconds):
+        with self._timings_lock:
+            self.timings.setdefault(kind, []).append(seconds)
+
+    def _launch(self):
+        from selenium import webdriver
+        from selenium.webdriver.chrome.service import Service
+
+        start = time.perf_counter()
+        with self._idle_lock:
+            if self.options is None:
+                self.options = build_options()
+        driver = webdriver.Chrome(service=Service(get_driver_path()), options=self.options)
+        self.record("startup", time.perf_counter() - start)
+        with self._idle_lock:
+            self._all.add(driver)
+        return driver
+
+    def _discard(self, driver):
+        with self._idle_lock:
+            self._all.discard(driver)
+        try:
+            driver.quit()
+        except Exception as e:
+            logging.warning(f"Error closing browser session: {e}")
+
+    @staticmethod
+    def is_healthy(driver):
+        try:
+            driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def acquire(self, timeout=None):
+        if self._closed:
+            raise RuntimeError("DriverPool is closed")
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError(f"No browser session free after {timeout}s")
+        try:
+            while True:
+                with self._idle_lock:
+                    driver = self._idle.pop() if self._idle else None
+                if driver is None:
+                    return self._launch()
+                if self.is_healthy(driver):
+                    return driver
+                logging.warning("Dropping unhealthy browser session")
+                self._discard(driver)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, driver, broken=False):
+        if broken or self._closed:
+            self._discard(driver)
+        else:
+            with self._idle_lock:
+                self._idle.append(driver)
+        self._slots.release()
+
+    @contextmanager
+    def session(self, timeout=None):
+        driver = self.acquire(timeout)
+        broken = False
+        try:
+            yield driver
+        except Exception:
+            broken = not self.is_healthy(driver)
+            raise
+        finally:
+            self.release(driver, broken)
+
+    def close(self):
+        self._closed = True
+        with self._idle_lock:
+            drivers = list(self._all)
+            self._idle.clear()
+        for driver in drivers:
+            self._discard(driver)
+
+    def timing_summary(self):
+        with self._timings_lock:
+            return {
+                kind: {"count": len(values), "total": sum(values), "max": max(values, default=0.0)}
+                for kind, values in self.timings.items()
+            }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,97 @@
+import argparse
+import os
+import sys
+
+import http_fetch
+from Ex1 import TABLE_IDS, URLS, parse_table
+from fixture_server import start_fixture_server
+from http_fetch import COMMENT_RE, extract_table_html, fetch_table_html, page_path
+
+# Offline check of Ex1's HTTP path against the fbref pages saved in fixtures/, served by fixture_server.py.
+# - The standard stats table is part of the page body.
+# - The shooting table ships inside an HTML comment, as fbref does for its secondary tables.
+# For each, fetch_table_html must return the same table extract_table_html finds in the saved file, and Ex1's
+# parser must read the expected players and values out of it. A table the page does not have, and a page that was
+# not saved (a 404), must both come back as None so Ex1 falls back to the browser.
+#   python check_http_fetch.py [fixtures_dir]
+# Exits with status 1 when any expectation fails.
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(script_dir, "fixtures")
+# category -> (where the table sits in the saved page, {player key: {stat: value}})
+EXPECTED = {
+    "standard": ("body", {
+        "e342ad68|Liverpool": {"Player": "Mohamed Salah", "Position": "FW", "Age": "32-325", "Minutes": "3,101",
+                               "Goals": "28", "Minutes_raw": "3101"},
+        "1f44ac21|Manchester City": {"Player": "Erling Haaland", "Nation": "no NOR", "xG": "20.8"},
+        "7a2e46a8|Liverpool": {"Player": "Alisson", "Position": "GK", "Goals": "0"},
+    }),
+    "shooting": ("comment", {
+        "e342ad68|Liverpool": {"Player": "Mohamed Salah", "SoT%": "42.0", "Dist": "14.7"},
+        "1f44ac21|Manchester City": {"G/Sh": "0.19"},
+        "7a2e46a8|Liverpool": {"Player": "Alisson", "SoT%": "N/a", "SoT/90": "0.00"},
+    }),
+}
+# Its page is not in fixtures/, so the server answers 404
+UNSAVED_CATEGORY = "misc"
+
+
+def check_category(category, placement, expected, directory):
+    # Failure messages for one saved page; empty when it passes
+    failures = []
+    table_id = TABLE_IDS[category]
+    with open(page_path(directory, URLS[category]), "r", encoding="utf-8") as f:
+        saved = f.read()
+    in_body = extract_table_html(COMMENT_RE.sub("", saved), table_id) is not None
+    if in_body != (placement == "body"):
+        failures.append(f"the saved page has {table_id} {'in the body' if in_body else 'only inside a comment'}, "
+                        f"expected it {'in the body' if placement == 'body' else 'inside a comment'}")
+
+    html = fetch_table_html(URLS[category], table_id)
+    if html is None:
+        return failures + [f"fetch_table_html found no {table_id}"]
+    if html != extract_table_html(saved, table_id):
+        failures.append("fetch_table_html returned different HTML than extract_table_html on the saved page")
+
+    data = parse_table(html, table_id, category) or {}
+    if set(data) != set(expected):
+        failures.append(f"parsed players {sorted(data)}, expected {sorted(expected)}")
+    for key, stats in expected.items():
+        for stat, value in stats.items():
+            actual = data.get(key, {}).get(stat)
+            if actual != value:
+                failures.append(f"{key} {stat} is {actual!r}, expected {value!r}")
+    return failures
+
+
+def run_checks(directory=FIXTURES_DIR):
+    # {check name: [failure messages]}, against a fixture server started for the run
+    server, url = start_fixture_server(directory)
+    base_url, min_interval = http_fetch.BASE_URL, http_fetch.rate_limiter.min_interval
+    http_fetch.BASE_URL, http_fetch.rate_limiter.min_interval = url, 0
+    try:
+        results = {f"{category} ({placement})": check_category(category, placement, expected, directory)
+                   for category, (placement, expected) in EXPECTED.items()}
+        missing_table = fetch_table_html(URLS["standard"], "stats_not_on_this_page")
+        results["table not on the page"] = [] if missing_table is None else ["expected None"]
+        unsaved = fetch_table_html(URLS[UNSAVED_CATEGORY], TABLE_IDS[UNSAVED_CATEGORY])
+        results["page not saved (404)"] = [] if unsaved is None else ["expected None"]
+    finally:
+        http_fetch.BASE_URL, http_fetch.rate_limiter.min_interval = base_url, min_interval
+        server.shutdown()
+        server.server_close()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check Ex1's HTTP fetch and table extraction against saved pages")
+    parser.add_argument("directory", nargs="?", default=FIXTURES_DIR)
+    args = parser.parse_args()
+
+    results = run_checks(args.directory)
+    for name, failures in results.items():
+        print(f"{'ok' if not failures else 'FAILED':<7} {name}")
+        for failure in failures:
+            print(f"        {failure}")
+    if any(results.values()):
+        sys.exit(1)
@@ -0,0 +1,58 @@
+import hashlib
+import os
+import sys
+import threading
+from email.utils import formatdate
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from http_fetch import page_path
+
+# Serves pages saved with http_fetch.save_page so the scraper can run offline:
+#   python fixture_server.py fixtures 8765
+#   FBREF_BASE_URL=http://127.0.0.1:8765 python Ex1.py
+# fixtures/ holds two trimmed fbref pages (the standard table in the page body, the shooting table inside a
+# comment) that check_http_fetch.py runs the HTTP path against.
+
+
+def make_handler(directory):
+    class FixtureHandler(SimpleHTTPRequestHandler):
+        def do_GET(self):
+            path = page_path(directory, self.path.split("?", 1)[0])
+            if not os.path.isfile(path):
+                self.send_error(404, "No saved page for this URL")
+                return
+            with open(path, "rb") as f:
+                body = f.read()
+            etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", formatdate(os.path.getmtime(path), usegmt=True))
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return FixtureHandler
+
+
+def start_fixture_server(directory, port=0):
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(directory))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    directory = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8765
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(directory))
+    print(f"Serving saved pages from {directory} on http://127.0.0.1:{port}")
+    server.serve_forever()
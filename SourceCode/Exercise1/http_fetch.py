@@ -0,0 +1,122 @@
+import logging
+import os
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from instrumentation import stage
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/91.0.4472.124 Safari/537.36"
+FBREF_ORIGIN = "https://fbref.com"
+# Point this at a local fixture_server.py to run the scraper offline against saved pages
+BASE_URL = os.environ.get("FBREF_BASE_URL", FBREF_ORIGIN).rstrip("/")
+# Set to a directory to snapshot every fetched page in the layout fixture_server.py serves
+SAVE_PAGES_DIR = os.environ.get("FBREF_SAVE_PAGES")
+
+# fbref blocks clients that go above ~20 requests a minute, so space requests to one host by default
+MIN_REQUEST_INTERVAL = float(os.environ.get("FBREF_MIN_INTERVAL", "3.5"))
+
+COMMENT_RE = re.compile(r"<!--(.*?)-->", re.S)
+
+
+class HostRateLimiter:
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        if self.min_interval <= 0:
+            return
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+rate_limiter = HostRateLimiter(MIN_REQUEST_INTERVAL)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session(pool_size=8):
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            session.headers.update({"User-Agent": USER_AGENT, "Accept-Language": "en-US,en;q=0.9"})
+            retry = Retry(total=3, backoff_factor=2, status_forcelist=(429, 500, 502, 503, 504),
+                          allowed_methods=("GET",), respect_retry_after_header=True)
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=retry)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+    return _session
+
+
+def resolve_url(url):
+    if BASE_URL != FBREF_ORIGIN and url.startswith(FBREF_ORIGIN):
+        return BASE_URL + url[len(FBREF_ORIGIN):]
+    return url
+
+
+def fetch_response(url, headers=None, timeout=20):
+    url = resolve_url(url)
+    rate_limiter.wait(url)
+    start = time.perf_counter()
+    with stage("fetch", host=urlsplit(url).netloc, via="http") as fetched:
+        response = get_session().get(url, headers=headers, timeout=timeout)
+        fetched.bytes = len(response.content)
+    response.raise_for_status()
+    logging.info(f"Fetched {url} over HTTP in {time.perf_counter() - start:.2f}s "
+                 f"(status {response.status_code}, {len(response.content)} bytes)")
+    if SAVE_PAGES_DIR and response.status_code == 200:
+        save_page(SAVE_PAGES_DIR, url, response.text)
+    return response
+
+
+def fetch_html(url, timeout=20):
+    return fetch_response(url, timeout=timeout).text
+
+
+def extract_table_html(html, table_id):
+    # fbref ships most secondary tables inside HTML comments and un-comments them with JS
+    marker = re.compile(r"<table\b[^>]*\bid=[\"']" + re.escape(table_id) + r"[\"']")
+    uncommented = COMMENT_RE.sub("", html)
+    if marker.search(uncommented):
+        return uncommented
+    for match in COMMENT_RE.finditer(html):
+        if marker.search(match.group(1)):
+            return match.group(1)
+    return None
+
+
+def fetch_table_html(url, table_id):
+    try:
+        html = fetch_html(url)
+    except requests.RequestException as e:
+        logging.warning(f"HTTP fetch failed for {url}: {e}")
+        return None
+    return extract_table_html(html, table_id)
+
+
+def page_path(directory, url):
+    path = urlsplit(url).path.strip("/") or "index"
+    return os.path.join(directory, *path.split("/")) + ".html"
+
+
+def save_page(directory, url, html):
+    path = page_path(directory, url)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(html)
+    return path
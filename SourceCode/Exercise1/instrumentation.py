@@ -0,0 +1,227 @@
+import argparse
+import atexit
+import collections
+import contextlib
+import cProfile
+import functools
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+
+# Stage-level timing shared by Ex1-Ex4. Code wraps its stages in `with stage("parse", category=...) as s:` (and may
+# set s.rows / s.bytes); each finished stage is added to in-process totals and, with tracing on, appended to a
+# JSON-lines trace as {"run", "script", "pid", "thread", "stage", "labels", "start", "wall", "cpu", "rows", "bytes"}.
+# cpu is the calling thread's CPU time, so work handed to process pools shows up as wall time only.
+# Switched by environment variables, so a nightly run can be inspected without editing the scripts:
+#   PIPELINE_TRACE=1 (or a file path)   write the trace, default .cache/trace.jsonl next to this module, and log a
+#                                        per-stage summary when the script exits
+#   PIPELINE_PROFILE=cprofile|sample    also profile the run: cProfile of the main thread, or a sampler of every
+#                                        thread's stack each PROFILE_INTERVAL seconds; written next to the trace
+#   PIPELINE_LOG_LEVEL=DEBUG            level for configure_logging (INFO by default)
+#   python instrumentation.py [trace.jsonl] [--run RUN]      summarise a trace
+
+STAGES = ('fetch', 'wait_table', 'parse', 'merge', 'cache_load', 'cache_save', 'clean', 'aggregate', 'fit', 'render')
+DEFAULT_TRACE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "trace.jsonl")
+_trace_setting = os.environ.get("PIPELINE_TRACE", "")
+TRACE_PATH = DEFAULT_TRACE if _trace_setting == "1" else _trace_setting or None
+PROFILE = os.environ.get("PIPELINE_PROFILE", "")
+PROFILE_INTERVAL = 0.005
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+# A process started by a traced run (a pipeline stage, a pool worker) takes the run id start_run exported, so its
+# stages land in the same run of the trace; importing this module alone does not touch the environment
+RUN_ID = os.environ.get("PIPELINE_RUN_ID") or uuid.uuid4().hex[:12]
+_script = os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0]
+_totals = collections.defaultdict(lambda: [0, 0.0, 0.0, 0, 0])  # (stage, labels) -> count, wall, cpu, rows, bytes
+_lock = threading.Lock()
+_started = False
+_trace_dir_ready = False
+
+
+class Stage:
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.rows = None
+        self.bytes = None
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def record(name, wall, cpu=None, rows=None, bytes=None, start=None, **labels):
+    # Adds one finished stage; for timings measured elsewhere (e.g. inside a worker)
+    entry = {"run": RUN_ID, "script": _script, "pid": os.getpid(), "thread": threading.current_thread().name,
+             "stage": name, "labels": labels, "start": time.time() - wall if start is None else start,
+             "wall": round(wall, 6), "cpu": None if cpu is None else round(cpu, 6), "rows": rows, "bytes": bytes}
+    with _lock:
+        for key in ((name, ()), (name, _label_key(labels))) if labels else ((name, ()),):
+            totals = _totals[key]
+            totals[0] += 1
+            totals[1] += wall
+            totals[2] += cpu or 0.0
+            totals[3] += rows or 0
+            totals[4] += bytes or 0
+        if TRACE_PATH:
+            global _trace_dir_ready
+            if not _trace_dir_ready:
+                os.makedirs(os.path.dirname(os.path.abspath(TRACE_PATH)), exist_ok=True)
+                _trace_dir_ready = True
+            # One short write per line in append mode, so lines from worker processes do not interleave
+            with open(TRACE_PATH, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, default=str) + "\n")
+
+
+@contextlib.contextmanager
+def stage(name, **labels):
+    current = Stage(name, labels)
+    start, wall, cpu = time.time(), time.perf_counter(), time.thread_time()
+    try:
+        yield current
+    finally:
+        record(name, time.perf_counter() - wall, time.thread_time() - cpu, current.rows, current.bytes, start,
+               **current.labels)
+
+
+def traced(name, **labels):
+    # Decorator form of stage()
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name, **labels):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def totals(by_label=False):
+    # {(stage, labels): (count, wall, cpu, rows, bytes)}; labels is () for the per-stage totals
+    with _lock:
+        return {key: tuple(values) for key, values in _totals.items() if by_label or not key[1]}
+
+
+def format_totals(by_label=False):
+    lines = [f"{'stage':<12} {'labels':<32} {'count':>6} {'wall s':>9} {'cpu s':>9} {'rows':>9} {'bytes':>12}"]
+    for (name, labels), (count, wall, cpu, rows, size) in sorted(totals(by_label).items(), key=lambda item:
+                                                                 -item[1][1]):
+        label = ",".join(f"{key}={value}" for key, value in labels)[:32]
+        lines.append(f"{name:<12} {label:<32} {count:>6} {wall:>9.3f} {cpu:>9.3f} {rows:>9} {size:>12}")
+    return "\n".join(lines)
+
+
+def configure_logging(level=None):
+    level = level or os.environ.get("PIPELINE_LOG_LEVEL", "INFO")
+    logging.basicConfig(level=getattr(logging, str(level).upper(), logging.INFO), format=LOG_FORMAT)
+
+
+class StackSampler:
+    # Counts every thread's stack each `interval` seconds; writes them in the folded "a;b;c count" format that
+    # flame graph tools read
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(names))] += 1
+
+    def stop(self, path):
+        self._stop.set()
+        self._thread.join()
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        leaves = collections.Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return "\n".join(f"{count / total:6.1%}  {leaf}" for leaf, count in leaves.most_common(15))
+
+
+def start_run(script=None):
+    # Call once from a script's entry point: configures logging, starts the profiler PIPELINE_PROFILE asks for and
+    # logs the stage totals at exit when tracing
+    global _script, _started
+    if _started:
+        return
+    _started = True
+    _script = script or _script
+    os.environ["PIPELINE_RUN_ID"] = RUN_ID
+    configure_logging()
+    if TRACE_PATH:
+        logging.info(f"Tracing {_script} run {RUN_ID} to {TRACE_PATH}")
+    base = os.path.join(os.path.dirname(os.path.abspath(TRACE_PATH or DEFAULT_TRACE)), f"{_script}-{RUN_ID}")
+    profiler = None
+    if PROFILE == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+    elif PROFILE == "sample":
+        profiler = StackSampler()
+        profiler.start()
+    elif PROFILE:
+        logging.warning(f"Unknown PIPELINE_PROFILE {PROFILE!r}; expected 'cprofile' or 'sample'")
+    if profiler is not None:
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+
+    def finish():
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+            profiler.dump_stats(base + ".prof")
+            stats = pstats.Stats(profiler).sort_stats("cumulative")
+            logging.info(f"cProfile written to {base}.prof ({stats.total_tt:.2f}s profiled)")
+        elif isinstance(profiler, StackSampler):
+            logging.info(f"Stack samples written to {base}.folded; hottest frames:\n{profiler.stop(base + '.folded')}")
+        if TRACE_PATH and _totals:
+            logging.info(f"Stage totals for {_script} run {RUN_ID}:\n{format_totals()}")
+
+    atexit.register(finish)
+
+
+def read_trace(path=DEFAULT_TRACE, run=None):
+    # Trace records as dicts; the last run in the file when `run` is None
+    with open(path, "r", encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    run = run or (entries[-1]["run"] if entries else None)
+    return [entry for entry in entries if entry["run"] == run]
+
+
+if __name__ == "__main__":
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Summarise a pipeline trace")
+    parser.add_argument("trace", nargs="?", default=TRACE_PATH or DEFAULT_TRACE)
+    parser.add_argument("--run", help="run id; the last run in the file by default")
+    parser.add_argument("--by", default="stage", help="comma-separated columns to group by, e.g. "
+                                                      "script,stage or stage,category")
+    args = parser.parse_args()
+
+    entries = read_trace(args.trace, args.run)
+    if not entries:
+        sys.exit(f"No trace records in {args.trace}")
+    frame = pd.DataFrame([{**{key: value for key, value in entry.items() if key != "labels"}, **entry["labels"]}
+                          for entry in entries])
+    keys = [key for key in args.by.split(",") if key in frame]
+    summary = frame.groupby(keys, dropna=False).agg(count=("wall", "size"), wall=("wall", "sum"),
+                                                    cpu=("cpu", "sum"), rows=("rows", "sum"), bytes=("bytes", "sum"))
+    print(f"Run {entries[0]['run']}: {len(entries)} records")
+    print(summary.sort_values("wall", ascending=False).to_string(float_format=lambda value: f"{value:.3f}"))
@@ -0,0 +1,154 @@
+import argparse
+import concurrent.futures
+import logging
+import os
+import threading
+import time
+
+from Ex1 import (COMPETITIONS, PAGE_CACHE_DIR, SCRAPED_CATEGORIES, category_url, filter_players, merge_tables,
+                 results_frame, scrape_category, script_dir)
+from browser_pool import DriverPool
+from instrumentation import start_run
+from page_cache import PageCache, read_json, write_json_atomic
+from schema import write_typed
+
+# Scrapes several (competition, season) pairs into one hive-style partitioned dataset:
+#   dataset/comp=9/season=2023-2024/players.csv      (same layout as results.csv)
+#   dataset/comp=9/season=2023-2024/players.parquet  (typed copy, see schema.py)
+# Progress lives in dataset/_jobs.json and every finished table in dataset/_tables/, so re-running the
+# same command after a crash only fetches the jobs that have not completed yet.
+#   python jobs.py 9:2023-2024 9:2022-2023 12:current --workers 4
+
+DATASET_DIR = os.path.join(script_dir, "dataset")
+CURRENT = "current"
+
+
+def parse_pair(text):
+    comp_id, _, season = text.partition(":")
+    comp_id = int(comp_id)
+    if comp_id not in COMPETITIONS:
+        raise argparse.ArgumentTypeError(f"Unknown competition {comp_id}; known: {sorted(COMPETITIONS)}")
+    return comp_id, season or CURRENT
+
+
+def partition_dir(output_dir, comp_id, season):
+    return os.path.join(output_dir, f"comp={comp_id}", f"season={season}")
+
+
+class JobState:
+    def __init__(self, output_dir):
+        self.path = os.path.join(output_dir, "_jobs.json")
+        self.tables_dir = os.path.join(output_dir, "_tables")
+        os.makedirs(self.tables_dir, exist_ok=True)
+        self.jobs = read_json(self.path, {})
+        self._lock = threading.Lock()
+
+    def get(self, job_id):
+        with self._lock:
+            return dict(self.jobs.get(job_id, {}))
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            self.jobs.setdefault(job_id, {}).update(fields)
+            write_json_atomic(self.path, self.jobs)
+
+    def table_path(self, job_id):
+        return os.path.join(self.tables_dir, job_id.replace("/", "_") + ".json")
+
+    def load_table(self, job_id):
+        return read_json(self.table_path(job_id))
+
+    def store_table(self, job_id, data):
+        write_json_atomic(self.table_path(job_id), data)
+
+
+def make_jobs(pairs):
+    return [(f"{comp_id}/{season}/{category}", comp_id, season, category)
+            for comp_id, season in pairs for category in SCRAPED_CATEGORIES]
+
+
+def run_job(job, state, pool, page_cache, max_attempts):
+    job_id, comp_id, season, category = job
+    url = category_url(category, comp_id, None if season == CURRENT else season)
+    for attempt in range(state.get(job_id).get("attempts", 0) + 1, max_attempts + 1):
+        start = time.perf_counter()
+        state.update(job_id, status="running", attempts=attempt, url=url)
+        try:
+            data, sha256 = scrape_category(category, pool, page_cache, url=url, table_key=job_id.replace("/", "_"))
+        except Exception as e:
+            logging.error(f"{job_id}: attempt {attempt} raised {e}")
+            data, sha256 = {}, None
+        if data:
+            state.store_table(job_id, data)
+            state.update(job_id, status="done", rows=len(data), sha256=sha256,
+                         seconds=round(time.perf_counter() - start, 2), finished_at=time.time())
+            return True
+        state.update(job_id, status="failed")
+        if attempt < max_attempts:
+            time.sleep(min(60, 5 * 2 ** (attempt - 1)))
+    return False
+
+
+def write_partitions(pairs, state, output_dir):
+    written = []
+    for comp_id, season in pairs:
+        jobs = make_jobs([(comp_id, season)])
+        if any(state.get(job_id).get("status") != "done" for job_id, *_ in jobs):
+            logging.warning(f"Skipping partition comp={comp_id}/season={season}: not every table finished")
+            continue
+        tables = {category: state.load_table(job_id) or {} for job_id, _, _, category in jobs}
+        players = filter_players(merge_tables(None, tables))
+        directory = partition_dir(output_dir, comp_id, season)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, "players.csv")
+        frame = results_frame(players)
+        frame.to_csv(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+        write_typed(frame, os.path.join(directory, "players.parquet"))
+        written.append(path)
+        logging.info(f"Wrote {len(players)} players to {path}")
+    return written
+
+
+def run(pairs, output_dir=DATASET_DIR, workers=4, pool_size=2, max_attempts=3, retry_failed=True):
+    state = JobState(output_dir)
+    jobs = make_jobs(pairs)
+    pending = []
+    for job in jobs:
+        status = state.get(job[0])
+        if status.get("status") == "done":
+            continue
+        if retry_failed and status.get("attempts", 0) >= max_attempts:
+            state.update(job[0], attempts=0)
+        pending.append(job)
+    logging.info(f"{len(jobs) - len(pending)}/{len(jobs)} jobs already done, {len(pending)} to run")
+
+    page_cache = PageCache(PAGE_CACHE_DIR)
+    done = len(jobs) - len(pending)
+    try:
+        with DriverPool(size=pool_size) as pool:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(run_job, job, state, pool, page_cache, max_attempts): job for job in pending}
+                for future in concurrent.futures.as_completed(futures):
+                    job_id = futures[future][0]
+                    ok = future.result()
+                    done += ok
+                    info = state.get(job_id)
+                    logging.info(f"[{done}/{len(jobs)}] {job_id} {'done' if ok else 'FAILED'} "
+                                 f"({info.get('rows', 0)} rows, attempt {info.get('attempts')})")
+    finally:
+        page_cache.save()
+
+    return write_partitions(pairs, state, output_dir)
+
+
+if __name__ == "__main__":
+    start_run("jobs")
+    parser = argparse.ArgumentParser(description="Scrape fbref player tables for several competitions and seasons")
+    parser.add_argument("pairs", nargs="+", type=parse_pair, help="competition:season, e.g. 9:2023-2024 or 12:current")
+    parser.add_argument("--output", default=DATASET_DIR)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--browsers", type=int, default=2, help="size of the Selenium fallback pool")
+    parser.add_argument("--max-attempts", type=int, default=3)
+    args = parser.parse_args()
+    run(args.pairs, args.output, args.workers, args.browsers, args.max_attempts)
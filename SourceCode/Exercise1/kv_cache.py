@@ -0,0 +1,235 @@
+import argparse
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from page_cache import read_json, write_json_atomic
+
+# Key-value cache with write-behind, used for Ex1's fbref_cache.json and Ex4's transfer_cache.json. Reads and
+# writes go to memory; changes reach disk once BATCH_SIZE of them are pending, on flush()/close(), and at exit.
+# Every entry carries the time it was last written, so callers can refresh stale entries selectively.
+#   JsonCache    the whole map in one JSON file, rewritten atomically (temp file + rename) per flush
+#   SqliteCache  one row per entry in a SQLite file; a flush writes only the changed rows, in one transaction
+# open_cache() picks the backend from KV_CACHE_BACKEND ("json" or "sqlite"); a SQLite cache starts from the JSON
+# file of the same name when it does not exist yet.
+#   python kv_cache.py fbref_cache.json --stale-days 7
+
+BACKEND = os.environ.get("KV_CACHE_BACKEND", "json")
+BATCH_SIZE = 100
+# Bump when the on-disk layout changes; JSON files without it are plain {key: value} maps from older versions
+KV_FORMAT = 1
+
+
+class KeyValueCache:
+    # Subclasses implement _load_entry, _load_all and _write(changed, deleted)
+    def __init__(self, path, batch_size=BATCH_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self._pending = {}  # key -> (value, updated_at)
+        self._deleted = set()
+        self._lock = threading.RLock()
+        atexit.register(self.flush)
+
+    def get(self, key, default=None):
+        entry = self._entry(key)
+        return default if entry is None else entry[0]
+
+    def updated_at(self, key):
+        entry = self._entry(key)
+        return None if entry is None else entry[1]
+
+    def age(self, key, now=None):
+        # Seconds since `key` was last written, or None when it is not cached
+        updated = self.updated_at(key)
+        return None if updated is None else (time.time() if now is None else now) - updated
+
+    def _entry(self, key):
+        with self._lock:
+            if key in self._deleted:
+                return None
+            if key in self._pending:
+                return self._pending[key]
+            return self._load_entry(key)
+
+    def __contains__(self, key):
+        return self._entry(key) is not None
+
+    def __getitem__(self, key):
+        entry = self._entry(key)
+        if entry is None:
+            raise KeyError(key)
+        return entry[0]
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __delitem__(self, key):
+        with self._lock:
+            self._pending.pop(key, None)
+            self._deleted.add(key)
+            self._maybe_flush()
+
+    def __len__(self):
+        return len(self.keys())
+
+    def keys(self):
+        return [key for key, _ in self.items()]
+
+    def items(self):
+        with self._lock:
+            entries = {key: entry for key, entry in self._load_all().items() if key not in self._deleted}
+            entries.update(self._pending)
+            return [(key, value) for key, (value, _) in entries.items()]
+
+    def set(self, key, value, updated_at=None):
+        with self._lock:
+            self._deleted.discard(key)
+            self._pending[key] = (value, time.time() if updated_at is None else updated_at)
+            self._maybe_flush()
+
+    def update(self, mapping):
+        now = time.time()
+        with self._lock:
+            for key, value in mapping.items():
+                self._deleted.discard(key)
+                self._pending[key] = (value, now)
+            self._maybe_flush()
+
+    def replace(self, mapping):
+        # Make the cache hold exactly `mapping`; entries whose value did not change keep their timestamp
+        with self._lock:
+            current = dict(self.items())
+            self._deleted.update(key for key in current if key not in mapping)
+            for key in self._deleted:
+                self._pending.pop(key, None)
+            self.update({key: value for key, value in mapping.items()
+                         if key not in current or current[key] != value})
+
+    def stale(self, max_age, now=None):
+        # Keys last written more than `max_age` seconds ago
+        now = time.time() if now is None else now
+        with self._lock:
+            entries = {key: entry for key, entry in self._load_all().items() if key not in self._deleted}
+            entries.update(self._pending)
+            return [key for key, (_, updated) in entries.items() if now - updated > max_age]
+
+    def _maybe_flush(self):
+        if len(self._pending) + len(self._deleted) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            if not self._pending and not self._deleted:
+                return
+            changed, deleted = self._pending, self._deleted
+            self._write(changed, deleted)
+            self._pending, self._deleted = {}, set()
+            logging.debug(f"Flushed {len(changed)} changed and {len(deleted)} deleted entries to {self.path}")
+
+    def close(self):
+        self.flush()
+        atexit.unregister(self.flush)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class JsonCache(KeyValueCache):
+    # {"format": KV_FORMAT, "values": {key: value}, "updated": {key: unix time}}
+    def __init__(self, path, batch_size=BATCH_SIZE):
+        super().__init__(path, batch_size)
+        self._entries = read_entries(path)
+
+    def _load_entry(self, key):
+        return self._entries.get(key)
+
+    def _load_all(self):
+        return self._entries
+
+    def _write(self, changed, deleted):
+        for key in deleted:
+            self._entries.pop(key, None)
+        self._entries.update(changed)
+        write_json_atomic(self.path, {
+            "format": KV_FORMAT,
+            "values": {key: value for key, (value, _) in self._entries.items()},
+            "updated": {key: updated for key, (_, updated) in self._entries.items()},
+        })
+
+
+def read_entries(path):
+    # {key: (value, updated_at)} from a JsonCache file or an older plain {key: value} map, whose entries are
+    # dated by the file's modification time
+    data = read_json(path, {})
+    if not isinstance(data, dict):
+        return {}
+    if data.get("format") == KV_FORMAT and isinstance(data.get("values"), dict):
+        updated = data.get("updated", {})
+        return {key: (value, updated.get(key, 0.0)) for key, value in data["values"].items()}
+    written = os.path.getmtime(path) if data else 0.0
+    return {key: (value, written) for key, value in data.items()}
+
+
+class SqliteCache(KeyValueCache):
+    def __init__(self, path, batch_size=BATCH_SIZE, import_from=None):
+        super().__init__(path, batch_size)
+        new = not os.path.exists(path)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                         "updated_at REAL NOT NULL)")
+        if new and import_from and os.path.exists(import_from):
+            entries = read_entries(import_from)
+            self._write(entries, set())
+            logging.info(f"Imported {len(entries)} entries from {import_from} into {path}")
+
+    def _load_entry(self, key):
+        row = self._db.execute("SELECT value, updated_at FROM entries WHERE key = ?", (key,)).fetchone()
+        return None if row is None else (json.loads(row[0]), row[1])
+
+    def _load_all(self):
+        return {key: (json.loads(value), updated)
+                for key, value, updated in self._db.execute("SELECT key, value, updated_at FROM entries")}
+
+    def _write(self, changed, deleted):
+        with self._db:
+            self._db.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in deleted])
+            self._db.executemany("INSERT OR REPLACE INTO entries (key, value, updated_at) VALUES (?, ?, ?)",
+                                 [(key, json.dumps(value), updated) for key, (value, updated) in changed.items()])
+
+    def close(self):
+        super().close()
+        self._db.close()
+
+
+def open_cache(path, backend=BACKEND, batch_size=BATCH_SIZE):
+    # `path` is the JSON file; the SQLite backend uses the same name with a .sqlite extension
+    if backend == "sqlite":
+        return SqliteCache(os.path.splitext(path)[0] + ".sqlite", batch_size, import_from=path)
+    if backend != "json":
+        raise ValueError(f"Unknown cache backend {backend!r}; expected 'json' or 'sqlite'")
+    return JsonCache(path, batch_size)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarise a key-value cache file")
+    parser.add_argument("path", help="the JSON cache file (its .sqlite sibling with --backend sqlite)")
+    parser.add_argument("--backend", choices=("json", "sqlite"), default=BACKEND)
+    parser.add_argument("--stale-days", type=float, help="also list entries older than this")
+    args = parser.parse_args()
+
+    with open_cache(args.path, args.backend) as cache:
+        now = time.time()
+        ages = [cache.age(key, now) for key in cache.keys()]
+        print(f"{len(ages)} entries; newest {min(ages, default=0) / 86400:.1f} days old, "
+              f"oldest {max(ages, default=0) / 86400:.1f} days old")
+        if args.stale_days is not None:
+            stale = cache.stale(args.stale_days * 86400, now)
+            print(f"{len(stale)} entries older than {args.stale_days:g} days: {stale[:20]}")
@@ -0,0 +1,136 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+import requests
+
+from http_fetch import fetch_response
+from instrumentation import stage
+
+# Bump when the shape of parsed tables or the merged snapshot changes so stale entries are ignored
+CACHE_FORMAT = 2
+
+PageResult = namedtuple("PageResult", ["html", "sha256", "not_modified"])
+
+
+def write_json_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def read_json(path, default=None):
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable cache file {path}: {e}")
+        return default
+
+
+class PageCache:
+    # Layout under `directory`:
+    #   index.json            url -> {etag, last_modified, sha256, fetched_at}
+    #   pages/<sha256>.html.gz raw page bodies
+    #   tables/<category>.json parsed table rows keyed by player id|team, plus the sha256 of their page
+    #   merged.json           the joined player frame plus the page hash each category was merged from
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.pages_dir = os.path.join(directory, "pages")
+        self.tables_dir = os.path.join(directory, "tables")
+        os.makedirs(self.pages_dir, exist_ok=True)
+        os.makedirs(self.tables_dir, exist_ok=True)
+        self.index_path = os.path.join(directory, "index.json")
+        self.merged_path = os.path.join(directory, "merged.json")
+        self.index = read_json(self.index_path, {})
+        self._lock = threading.Lock()
+
+    def _page_path(self, sha256):
+        return os.path.join(self.pages_dir, f"{sha256}.html.gz")
+
+    def _read_page(self, sha256):
+        path = self._page_path(sha256)
+        if not os.path.exists(path):
+            return None
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return f.read()
+
+    def _write_page(self, sha256, html):
+        path = self._page_path(sha256)
+        if os.path.exists(path):
+            return
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            f.write(html)
+        os.replace(tmp_path, path)
+
+    def fetch(self, url):
+        with self._lock:
+            entry = dict(self.index.get(url, {}))
+
+        headers = {}
+        if entry.get("sha256") and os.path.exists(self._page_path(entry["sha256"])):
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        try:
+            response = fetch_response(url, headers=headers)
+        except requests.RequestException as e:
+            logging.warning(f"HTTP fetch failed for {url}: {e}")
+            return None
+
+        if response.status_code == 304:
+            html = self._read_page(entry["sha256"])
+            if html is not None:
+                logging.info(f"{url} not modified since last run")
+                return PageResult(html, entry["sha256"], True)
+            response = fetch_response(url)
+
+        sha256 = hashlib.sha256(response.content).hexdigest()
+        html = response.text
+        self._write_page(sha256, html)
+        with self._lock:
+            self.index[url] = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "sha256": sha256,
+                "fetched_at": time.time(),
+            }
+        return PageResult(html, sha256, sha256 == entry.get("sha256"))
+
+    def load_table(self, category, sha256):
+        with stage("cache_load", cache="tables", category=category):
+            cached = read_json(os.path.join(self.tables_dir, f"{category}.json"))
+        if cached and cached.get("sha256") == sha256 and cached.get("format") == CACHE_FORMAT:
+            return cached["data"]
+        return None
+
+    def store_table(self, category, sha256, data):
+        with stage("cache_save", cache="tables", category=category) as saved:
+            saved.rows = len(data)
+            write_json_atomic(os.path.join(self.tables_dir, f"{category}.json"),
+                              {"format": CACHE_FORMAT, "sha256": sha256, "data": data})
+
+    def load_merged(self):
+        merged = read_json(self.merged_path)
+        if not merged or merged.get("format") != CACHE_FORMAT:
+            return {"hashes": {}, "frame": None}
+        return merged
+
+    def save_merged(self, merged):
+        write_json_atomic(self.merged_path, dict(merged, format=CACHE_FORMAT))
+
+    def save(self):
+        with self._lock:
+            write_json_atomic(self.index_path, self.index)
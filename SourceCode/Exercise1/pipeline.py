@@ -0,0 +1,222 @@
+import argparse
+import concurrent.futures
+import glob
+import hashlib
+import logging
+import os
+import subprocess
+import sys
+import time
+from collections import namedtuple
+
+from instrumentation import start_run
+from page_cache import read_json, write_json_atomic
+
+# Runs Ex1 -> Ex2 / Ex3 / Ex4 as a dependency graph. Each stage declares its script, the files it reads (its code
+# included), the settings it reads (environment variables by prefix) and the files it writes.
+# - A stage is skipped when its inputs and settings are the same as at its last successful run and its outputs
+#   are still there.
+# - Ex1 scrapes live pages, so it is also re-run once results.csv is older than SCRAPE_MAX_AGE hours
+#   (PIPELINE_SCRAPE_MAX_AGE).
+# - Stages run as separate processes once their dependencies are done, up to --jobs at a time, so Ex2, Ex3 and Ex4
+#   (which only need results.csv) run concurrently. Every stage gets PIPELINE_RESULTS with the absolute path of
+#   results.csv, and its output goes to .cache/pipeline/<stage>.log.
+# - A stage fails on a non-zero exit status or a missing output; the end of its log is shown and the stages that
+#   depend on it are not run.
+#   python pipeline.py [ex3 ex4] [--force ex1] [--no-deps] [--jobs 3] [--dry-run]
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(script_dir)
+STATE_DIR = os.path.join(script_dir, ".cache", "pipeline")
+STATE_PATH = os.path.join(STATE_DIR, "state.json")
+RESULTS = "Exercise1/results.csv"
+SCRAPE_MAX_AGE = float(os.environ.get("PIPELINE_SCRAPE_MAX_AGE", "24"))
+JOBS = 3
+LOG_TAIL_LINES = 20
+
+# Paths are relative to SourceCode/; inputs may be glob patterns, outputs may be directories
+Stage = namedtuple("Stage", "name script inputs outputs deps env_prefixes max_age_hours")
+SHARED_MODULES = ("Exercise1/results_data.py", "Exercise1/instrumentation.py")
+STAGES = (
+    Stage("ex1", "Exercise1/Ex1.py",
+          ("Exercise1/Ex1.py", "Exercise1/browser_pool.py", "Exercise1/http_fetch.py", "Exercise1/page_cache.py",
+           "Exercise1/kv_cache.py", "Exercise1/table_parser.py", "Exercise1/schema.py", *SHARED_MODULES),
+          (RESULTS,), (), ("FBREF_", "KV_CACHE_"), SCRAPE_MAX_AGE),
+    Stage("ex2", "Exercise2/Ex2.py", (RESULTS, "Exercise2/*.py", *SHARED_MODULES),
+          ("Exercise2/results2.csv", "Exercise2/top_3.txt", "Exercise2/top_3.csv", "Exercise2/leadership_details.csv",
+           "Exercise2/leadership_counts.csv", "Exercise2/best_team_analysis.txt", "Exercise2/histograms"),
+          ("ex1",), ("EX2_",), None),
+    Stage("ex3", "Exercise3/Ex3.py", (RESULTS, "Exercise3/*.py", *SHARED_MODULES),
+          ("Exercise3/player_clusters.png", "Exercise3/clustering_analysis.png",
+           "Exercise3/clustering_explanation.txt", "Exercise3/model/cluster_model.pkl",
+           "Exercise3/model/similarity_index.pkl"),
+          ("ex1",), ("EX3_",), None),
+    Stage("ex4", "Exercise4/Ex4.py",
+          (RESULTS, "Exercise4/*.py", "Exercise4/transfer_cache.*", "Exercise1/kv_cache.py", "Exercise1/page_cache.py",
+           "Exercise1/http_fetch.py", *SHARED_MODULES),
+          ("Exercise4/transfer_values.csv", "Exercise4/transfer_value_explanation.txt",
+           "Exercise4/transfer_value_explanation1.txt"),
+          ("ex1",), ("EX4_", "TRANSFERMARKT_", "KV_CACHE_"), None),
+)
+STAGES_BY_NAME = {stage.name: stage for stage in STAGES}
+RAN, SKIPPED, FAILED, BLOCKED, WOULD_RUN = "ran", "skipped", "FAILED", "blocked", "would run"
+
+
+def absolute(path):
+    return os.path.join(ROOT_DIR, path)
+
+
+def file_sha256(path):
+    # results_data has the same helper, but importing it would load pandas, the bulk of a no-op run's time
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint(stage):
+    # {"files": {path: sha256}, "env": {name: value}} of everything the stage reads
+    files = {}
+    for pattern in stage.inputs:
+        for path in sorted(glob.glob(absolute(pattern))):
+            if os.path.isfile(path):
+                files[os.path.relpath(path, ROOT_DIR)] = file_sha256(path)
+    env = {name: value for name, value in sorted(os.environ.items()) if name.startswith(stage.env_prefixes)}
+    return {"files": files, "env": env}
+
+
+def missing_outputs(stage):
+    return [path for path in stage.outputs if not os.path.exists(absolute(path))]
+
+
+def stale_reason(stage, previous, forced):
+    # Why `stage` has to run, or None when its last successful run is still current
+    if forced:
+        return "forced"
+    if previous is None:
+        return "no previous run"
+    missing = missing_outputs(stage)
+    if missing:
+        return f"missing {', '.join(missing)}"
+    current = fingerprint(stage)
+    if current != previous["inputs"]:
+        old_files, new_files = previous["inputs"]["files"], current["files"]
+        changed = sorted(path for path in set(old_files) | set(new_files) if old_files.get(path) != new_files.get(path))
+        changed += [f"${name}" for name in sorted(set(previous["inputs"]["env"]) | set(current["env"]))
+                    if previous["inputs"]["env"].get(name) != current["env"].get(name)]
+        return f"changed {', '.join(changed[:5])}" + (f" and {len(changed) - 5} more" if len(changed) > 5 else "")
+    if stage.max_age_hours is not None:
+        age = (time.time() - min(os.path.getmtime(absolute(path)) for path in stage.outputs)) / 3600
+        if age > stage.max_age_hours:
+            return f"outputs are {age:.0f}h old"
+    return None
+
+
+def log_path(stage):
+    return os.path.join(STATE_DIR, f"{stage.name}.log")
+
+
+def run_stage(stage):
+    # (exit status, seconds); the stage's stdout and stderr go to its log
+    env = dict(os.environ, PIPELINE_RESULTS=absolute(RESULTS))
+    start = time.perf_counter()
+    with open(log_path(stage), "w", encoding="utf-8") as log:
+        process = subprocess.run([sys.executable, absolute(stage.script)], cwd=os.path.dirname(absolute(stage.script)),
+                                 stdout=log, stderr=subprocess.STDOUT, env=env)
+    return process.returncode, time.perf_counter() - start
+
+
+def log_tail(stage, lines=LOG_TAIL_LINES):
+    with open(log_path(stage), "r", encoding="utf-8", errors="replace") as f:
+        return "".join(f.readlines()[-lines:])
+
+
+def with_dependencies(names):
+    selected = set()
+    todo = list(names)
+    while todo:
+        name = todo.pop()
+        if name not in selected:
+            selected.add(name)
+            todo.extend(STAGES_BY_NAME[name].deps)
+    return selected
+
+
+def run_pipeline(targets=None, force=(), jobs=JOBS, dry_run=False, no_deps=False):
+    # Returns {stage name: (status, seconds, detail)} for the targets and, unless no_deps, everything they depend on
+    selected = set(targets) if no_deps else with_dependencies(targets or STAGES_BY_NAME)
+    os.makedirs(STATE_DIR, exist_ok=True)
+    state = read_json(STATE_PATH, {})
+    results = {}
+    pending = [stage for stage in STAGES if stage.name in selected]
+    running = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        while pending or running:
+            for stage in list(pending):
+                deps = [dep for dep in stage.deps if dep in selected]
+                if any(dep not in results for dep in deps):
+                    continue
+                pending.remove(stage)
+                failed_deps = [dep for dep in deps if results[dep][0] in (FAILED, BLOCKED)]
+                if failed_deps:
+                    results[stage.name] = (BLOCKED, 0.0, f"{', '.join(failed_deps)} did not finish")
+                    continue
+                updated_deps = [dep for dep in deps if results[dep][0] == WOULD_RUN]
+                reason = (f"after {', '.join(updated_deps)}" if updated_deps else
+                          stale_reason(stage, state.get(stage.name), stage.name in force))
+                if reason is None:
+                    results[stage.name] = (SKIPPED, 0.0, "unchanged")
+                elif dry_run:
+                    results[stage.name] = (WOULD_RUN, 0.0, reason)
+                else:
+                    logging.info(f"Running {stage.name} ({reason})")
+                    running[executor.submit(run_stage, stage)] = (stage, reason)
+            if not running:
+                continue
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                stage, reason = running.pop(future)
+                status, seconds = future.result()
+                missing = missing_outputs(stage)
+                if status != 0 or missing:
+                    detail = f"exit status {status}" if status != 0 else f"did not write {', '.join(missing)}"
+                    results[stage.name] = (FAILED, seconds, detail)
+                    logging.error(f"{stage.name} failed ({detail}); end of {log_path(stage)}:\n{log_tail(stage)}")
+                    continue
+                results[stage.name] = (RAN, seconds, reason)
+                logging.info(f"{stage.name} finished in {seconds:.1f}s")
+                # Fingerprinted after the run: stages such as Ex4 update the caches they read
+                state[stage.name] = {"inputs": fingerprint(stage), "finished": time.time()}
+                write_json_atomic(STATE_PATH, state)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run Ex1-Ex4, skipping stages whose inputs have not changed")
+    parser.add_argument("stages", nargs="*", metavar="STAGE",
+                        help=f"stages to bring up to date, with their dependencies; all of {', '.join(STAGES_BY_NAME)} "
+                             f"by default")
+    parser.add_argument("--force", nargs="+", default=[], metavar="STAGE",
+                        help="run these stages even if they look up to date")
+    parser.add_argument("--no-deps", action="store_true",
+                        help="only the given stages, using their dependencies' outputs as they are")
+    parser.add_argument("--jobs", type=int, default=JOBS, help="stages run at the same time")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would run")
+    args = parser.parse_args()
+    unknown = sorted(set(args.stages + args.force) - set(STAGES_BY_NAME))
+    if unknown:
+        parser.error(f"unknown stage {', '.join(unknown)}; expected {', '.join(STAGES_BY_NAME)}")
+    if args.no_deps and not args.stages:
+        parser.error("--no-deps needs the stages to run")
+
+    start_run("pipeline")
+    start = time.perf_counter()
+    results = run_pipeline(args.stages, set(args.force), args.jobs, args.dry_run, args.no_deps)
+    print(f"\n{'stage':<6} {'status':<10} {'seconds':>8}  detail")
+    for name in (name for name in STAGES_BY_NAME if name in results):
+        status, seconds, detail = results[name]
+        print(f"{name:<6} {status:<10} {seconds:>8.1f}  {detail}")
+    print(f"Total {time.perf_counter() - start:.1f}s")
+    if any(status in (FAILED, BLOCKED) for status, _, _ in results.values()):
+        sys.exit(1)
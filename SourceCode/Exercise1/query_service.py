@@ -0,0 +1,500 @@
+import argparse
+import collections
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+import pandas as pd
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+for exercise in ("Exercise2", "Exercise3"):
+    sys.path.insert(0, os.path.join(script_dir, "..", exercise))
+from cluster_model import MODEL_PATH, ClusterModel
+from instrumentation import start_run
+from rankings import primary_position
+from results_data import RESULTS_CSV, load_results, split_columns, typed_path_for
+from similarity import DAYS_PER_YEAR, SimilarityIndex
+
+# Read-only JSON service over Ex1's results.csv, so looking up a player or a team's leaders does not mean re-running
+# Ex2. The data is loaded once into a PlayerStore with indexes by Player ID / name, team, primary position and stat
+# rank (every stat's players ordered highest first, ties by row order as in Ex2's rankings, and each player's place
+# in that order). Ex3's saved clustering model, when there is one, places every player in a cluster and backs a
+# SimilarityIndex over the same rows. Values are on results.csv's scale (Ex2 divides Save%, CS% and SoT% by 100);
+# Age is in years.
+# Responses go through an LRU cache of QUERY_CACHE_SIZE entries. Every QUERY_RELOAD_INTERVAL seconds the service
+# checks results.csv / results.parquet / the clustering model; once a change has settled for one interval it builds
+# a new store and swaps it in (a load that fails keeps the previous data). /metrics reports p50/p99 latency per path
+# over the last LATENCY_WINDOW requests, the cache hit rate and what is loaded. GET only.
+#   python query_service.py [--port 8770]
+#   curl 'http://127.0.0.1:8770/player?player=Mohamed Salah'              Player ID (row number in older files),
+#                                                                          full name or unique first name
+#   curl 'http://127.0.0.1:8770/top?stat=Goals&team=Liverpool&n=5'        also position=FW, direction=bottom,
+#                                                                          min_minutes=900
+#   curl 'http://127.0.0.1:8770/team_means?team=Arsenal'                  analyze_data's means and leaders; all
+#                                                                          teams without team=
+#   curl 'http://127.0.0.1:8770/teams'
+#   curl 'http://127.0.0.1:8770/cluster?player=Mohamed Salah'             or cluster=3; n= members listed
+#   curl 'http://127.0.0.1:8770/similar?player=Mohamed Salah&k=5'         also team, min_age, max_age, min_minutes
+#   curl 'http://127.0.0.1:8770/metrics'
+
+CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", "1024"))
+RELOAD_INTERVAL = float(os.environ.get("QUERY_RELOAD_INTERVAL", "2"))
+LATENCY_WINDOW = 10000
+PORT = 8770
+DEFAULT_N = 10
+SUMMARY_COLUMNS = ['Player ID', 'Player', 'First Name', 'Team', 'Position']
+
+
+def jsonable(value):
+    # json.dumps default= for NumPy scalars
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def records(frame):
+    # Rows as dicts with None for missing values and Age in years
+    frame = frame.copy()
+    if 'Age' in frame:
+        frame['Age'] = (frame['Age'] / DAYS_PER_YEAR).round(1)
+    return frame.astype(object).where(frame.notna(), None).to_dict(orient='records')
+
+
+def require_count(name, value):
+    # n= / k= below 1 would slice from the end instead of returning nothing
+    if value < 1:
+        raise ValueError(f"{name} must be at least 1, not {value}")
+    return value
+
+
+def file_signature(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class PlayerStore:
+    # One load of results.csv and its indexes; never modified after __init__, a reload builds a new one
+    def __init__(self, path=RESULTS_CSV, model_path=MODEL_PATH):
+        start = time.perf_counter()
+        self.path = path
+        self.players = load_results(path).reset_index(drop=True)
+        _, self.stats = split_columns(self.players)
+        self.values = self.players[self.stats].to_numpy(dtype=float, na_value=np.nan)
+        self.minutes = self.players['Minutes'].to_numpy(dtype=float, na_value=np.nan)
+
+        # Older results.csv files have no Player ID; their players are looked up by row number instead
+        ids = self.players['Player ID'] if 'Player ID' in self.players else self.players.index.astype(str)
+        self.by_id = {player_id: row for row, player_id in enumerate(ids)}
+        self.by_name = {column: self.players.groupby(self.players[column].astype('string').str.casefold()).indices
+                        for column in ('Player', 'First Name') if column in self.players}
+        self.by_team = self.players.groupby('Team').indices
+        self.by_position = self.players.groupby(primary_position(self.players['Position'])).indices
+
+        # order[j]: rows by stat j, highest first, ties by row order, missing values last; ranks[j]: its inverse
+        filled = np.where(np.isnan(self.values), -np.inf, self.values)
+        self.order = np.argsort(-filled, axis=0, kind='stable').T.astype(np.int32)
+        self.ranks = np.empty_like(self.order)
+        self.ranks[np.arange(len(self.stats))[:, None], self.order] = np.arange(len(self.players), dtype=np.int32)
+        self.counts = (~np.isnan(self.values)).sum(axis=0)
+
+        # What Ex2's analyze_data reports
+        self.team_means = self.players.groupby('Team')[self.stats].mean()
+        self.leaders = {stat: self.team_means[stat].idxmax() for stat in self.stats
+                        if self.team_means[stat].count() > 0}
+
+        self.model_path = model_path
+        self.clusters = self.similarity = None
+        self.model_error = self.load_model(model_path)
+        self.loaded_at = time.time()
+        self.load_seconds = time.perf_counter() - start
+
+    def load_model(self, model_path):
+        # Places the players with Ex3's model; returns why clustering is unavailable, or None
+        if not os.path.exists(model_path):
+            return f"No clustering model at {model_path}; run Ex3.py"
+        try:
+            model = ClusterModel.load(model_path)
+            players = self.players.copy()
+            players[model.fraction_columns] = players[model.fraction_columns] / 100
+            clusters = model.assign(players)['Cluster'].to_numpy()
+            similarity = SimilarityIndex(model.transform(players), self.players, fingerprint=model.fingerprint)
+            members = pd.Series(clusters).groupby(clusters).indices
+        except (OSError, ValueError, ImportError) as e:
+            logging.warning(f"Clustering queries disabled: {e}")
+            return str(e)
+        # Set together, so a failed load leaves clustering wholly off rather than half set up
+        self.clusters, self.similarity, self.cluster_members = clusters, similarity, members
+        return None
+
+    def locate(self, player):
+        # Row of `player`: a Player ID, or a full or first name (case-insensitive) that only one player has
+        if player in self.by_id:
+            return self.by_id[player]
+        for column, index in self.by_name.items():
+            rows = index.get(player.casefold())
+            if rows is not None and len(rows) == 1:
+                return int(rows[0])
+            if rows is not None:
+                matches = ", ".join(f"{self.player_id(row)} ({self.players.at[row, 'Team']})" for row in rows[:10])
+                raise ValueError(f"{player!r} matches {len(rows)} players: {matches}; use a Player ID")
+        raise KeyError(f"No player {player!r}")
+
+    def player_id(self, row):
+        return self.players.at[row, 'Player ID'] if 'Player ID' in self.players else str(row)
+
+    def summary(self, rows):
+        result = records(self.players.loc[rows, [col for col in SUMMARY_COLUMNS if col in self.players]])
+        if 'Player ID' not in self.players:
+            for entry, row in zip(result, rows):
+                entry['Player ID'] = str(row)
+        return result
+
+    def stat_column(self, stat):
+        try:
+            return self.stats.index(stat)
+        except ValueError:
+            raise KeyError(f"No stat {stat!r}; choose from {', '.join(self.stats)}") from None
+
+    def rows_for(self, team=None, position=None):
+        # Rows of `team` and/or primary `position` in row order, or None for every player
+        if team is None and position is None:
+            return None
+        rows = np.arange(len(self.players))
+        for value, index, label in ((team, self.by_team, "team"), (position, self.by_position, "position")):
+            if value is not None:
+                if value not in index:
+                    raise KeyError(f"No {label} {value!r}; choose from {', '.join(map(str, index))}")
+                rows = np.intersect1d(rows, index[value])
+        return rows
+
+    def player(self, player):
+        row = self.locate(player)
+        ranks = {stat: {"rank": int(self.ranks[j, row]) + 1, "of": int(self.counts[j])}
+                 for j, stat in enumerate(self.stats) if not np.isnan(self.values[row, j])}
+        return {"player": records(self.players.loc[[row]])[0], "ranks": ranks,
+                "cluster": None if self.clusters is None else int(self.clusters[row])}
+
+    def top(self, stat, n=DEFAULT_N, team=None, position=None, direction="top", min_minutes=None):
+        if direction not in ("top", "bottom"):
+            raise ValueError(f"direction must be 'top' or 'bottom', not {direction!r}")
+        require_count("n", n)
+        j = self.stat_column(stat)
+        rows = self.rows_for(team, position)
+        if rows is None:
+            # Straight from the rank index: the first count rows of order[j] are the ones with a value
+            rows = self.order[j, :self.counts[j]]
+            if min_minutes is not None:
+                rows = rows[self.minutes[rows] >= min_minutes]
+            if direction == "top":
+                rows = rows[:n]
+        else:
+            if min_minutes is not None:
+                rows = rows[self.minutes[rows] >= min_minutes]
+            rows = rows[~np.isnan(self.values[rows, j])]
+            if direction == "top":
+                rows = rows[np.argsort(self.ranks[j, rows], kind='stable')[:n]]
+        if direction == "bottom":
+            # Lowest first, ties by row order like DataFrame.nsmallest; order[j] breaks ties the other way round
+            rows = rows[np.lexsort((rows, self.values[rows, j]))[:n]]
+        result = self.summary(rows)
+        for entry, row in zip(result, rows):
+            entry.update({"Value": float(self.values[row, j]), "Rank": int(self.ranks[j, row]) + 1})
+        return {"stat": stat, "direction": direction, "team": team, "position": position, "players": result}
+
+    def team_summary(self, team):
+        return {"players": len(self.by_team[team]),
+                "leads": [stat for stat, leader in self.leaders.items() if leader == team]}
+
+    def teams(self):
+        return {"teams": {team: self.team_summary(team) for team in self.team_means.index}}
+
+    def means(self, team=None):
+        if team is None:
+            counts = pd.Series(self.leaders.values()).value_counts()
+            return {"leaders": {stat: {"team": leader, "mean": self.team_means.at[leader, stat]}
+                                for stat, leader in self.leaders.items()},
+                    "leader_counts": counts.to_dict(),
+                    "best_team": counts.idxmax() if not counts.empty else None,
+                    "means": {team: self.means(team)["means"] for team in self.team_means.index}}
+        if team not in self.team_means.index:
+            raise KeyError(f"No team {team!r}")
+        means = self.team_means.loc[team]
+        return {"team": team, **self.team_summary(team),
+                "means": means.astype(object).where(means.notna(), None).to_dict()}
+
+    def require_clusters(self):
+        if self.clusters is None:
+            raise LookupError(self.model_error)
+
+    def cluster(self, player=None, cluster=None, n=DEFAULT_N):
+        self.require_clusters()
+        require_count("n", n)
+        if (player is None) == (cluster is None):
+            raise ValueError("Pass either player= or cluster=")
+        if player is not None:
+            cluster = int(self.clusters[self.locate(player)])
+        if cluster not in self.cluster_members:
+            raise KeyError(f"No cluster {cluster}; clusters are 0-{len(self.cluster_members) - 1}")
+        members = self.cluster_members[cluster]
+        return {"cluster": cluster, "size": len(members), "players": self.summary(members[:n]),
+                "sizes": {int(label): len(rows) for label, rows in self.cluster_members.items()}}
+
+    def similar(self, player, k=DEFAULT_N, team=None, min_age=None, max_age=None, min_minutes=None):
+        self.require_clusters()
+        require_count("k", k)
+        row = self.locate(player)
+        result = self.similarity.similar(row, k, team, min_age, max_age, min_minutes)
+        # similar() already converted Age to years
+        result = result.astype(object).where(result.notna(), None)
+        return {"player": self.summary([row])[0], "similar": result.to_dict(orient='records')}
+
+
+def text_param(params, name, default=None):
+    return params.get(name, default)
+
+
+def number_param(params, name, default=None, kind=float):
+    if name not in params:
+        return default
+    try:
+        return kind(params[name])
+    except ValueError:
+        raise ValueError(f"{name} must be a number, not {params[name]!r}") from None
+
+
+def required_param(params, name):
+    if name not in params:
+        raise ValueError(f"Missing {name}=")
+    return params[name]
+
+
+# path -> handler(store, {parameter: value}) returning the response body
+ROUTES = {
+    "/player": lambda store, params: store.player(required_param(params, "player")),
+    "/top": lambda store, params: store.top(
+        required_param(params, "stat"), number_param(params, "n", DEFAULT_N, int), text_param(params, "team"),
+        text_param(params, "position"), text_param(params, "direction", "top"), number_param(params, "min_minutes")),
+    "/team_means": lambda store, params: store.means(text_param(params, "team")),
+    "/teams": lambda store, params: store.teams(),
+    "/cluster": lambda store, params: store.cluster(
+        text_param(params, "player"), number_param(params, "cluster", None, int),
+        number_param(params, "n", DEFAULT_N, int)),
+    "/similar": lambda store, params: store.similar(
+        required_param(params, "player"), number_param(params, "k", DEFAULT_N, int), text_param(params, "team"),
+        number_param(params, "min_age"), number_param(params, "max_age"), number_param(params, "min_minutes")),
+}
+ERROR_STATUS = ((KeyError, 404), (ValueError, 400), (LookupError, 503))
+
+
+class ResponseCache:
+    # Least recently used (status, body) responses, at most `size` of them
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class QueryService:
+    def __init__(self, path=RESULTS_CSV, model_path=MODEL_PATH, cache_size=CACHE_SIZE,
+                 reload_interval=RELOAD_INTERVAL):
+        self.path = path
+        self.model_path = model_path
+        self.reload_interval = reload_interval
+        self._signature = self._seen = self.signature()
+        self.store = PlayerStore(path, model_path)
+        # Part of every cache key, so a response computed from the previous store is never served after a reload
+        self.generation = 1
+        self.reloads = 0
+        self.reload_errors = 0
+        self.cache = ResponseCache(cache_size)
+        self.requests = 0
+        self._latencies = collections.defaultdict(lambda: collections.deque(maxlen=LATENCY_WINDOW))
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def signature(self):
+        return tuple(file_signature(path) for path in (self.path, typed_path_for(self.path), self.model_path))
+
+    def reload_if_changed(self):
+        # Reloads once the watched files have stopped changing for one check; Ex1 writes results.csv in place
+        signature = self.signature()
+        settled, self._seen = signature == self._seen, signature
+        if signature == self._signature or not settled:
+            return False
+        try:
+            store = PlayerStore(self.path, self.model_path)
+        except Exception as e:
+            # Anything, a missing column included: an exception here would end the watcher thread and hot reload
+            self.reload_errors += 1
+            self._signature = signature
+            logging.warning(f"Keeping the previous data: reloading {self.path} failed ({type(e).__name__}: {e})")
+            return False
+        with self._lock:
+            self.store, self.generation = store, self.generation + 1
+        self._signature = signature
+        self.cache.clear()
+        self.reloads += 1
+        logging.info(f"Reloaded {len(store.players)} players from {self.path} in {store.load_seconds:.2f}s")
+        return True
+
+    def watch(self):
+        thread = threading.Thread(target=self._watch, name="reload", daemon=True)
+        thread.start()
+        return thread
+
+    def _watch(self):
+        while not self._stop.wait(self.reload_interval):
+            self.reload_if_changed()
+
+    def stop(self):
+        self._stop.set()
+
+    def respond(self, path, query):
+        # (status, JSON body bytes, "hit" / "miss" / None when not cached)
+        if path == "/metrics":
+            return 200, json.dumps(self.metrics(), default=jsonable).encode(), None
+        route = ROUTES.get(path)
+        if route is None:
+            body = {"error": f"No such path {path!r}", "paths": [*ROUTES, "/metrics"]}
+            return 404, json.dumps(body).encode(), None
+        params = dict(parse_qsl(query))
+        with self._lock:
+            store, generation = self.store, self.generation
+        key = (generation, path, tuple(sorted(params.items())))
+        cached = self.cache.get(key)
+        if cached is not None:
+            return (*cached, "hit")
+        try:
+            status, body = 200, route(store, params)
+        except tuple(error for error, _ in ERROR_STATUS) as e:
+            status = next(code for error, code in ERROR_STATUS if isinstance(e, error))
+            body = {"error": e.args[0] if e.args else type(e).__name__}
+        entry = (status, json.dumps(body, default=jsonable).encode())
+        self.cache.put(key, entry)
+        return (*entry, "miss")
+
+    def record_latency(self, path, seconds):
+        with self._lock:
+            self.requests += 1
+            self._latencies[path if path in ROUTES or path == "/metrics" else "other"].append(seconds)
+            self._latencies["all"].append(seconds)
+
+    def metrics(self):
+        with self._lock:
+            latencies = {path: list(values) for path, values in self._latencies.items()}
+            store, requests = self.store, self.requests
+        latency = {}
+        for path, values in sorted(latencies.items()):
+            p50, p99 = np.percentile(values, [50, 99]) * 1000
+            latency[path] = {"count": len(values), "p50_ms": round(p50, 3), "p99_ms": round(p99, 3)}
+        lookups = self.cache.hits + self.cache.misses
+        return {
+            "requests": requests,
+            "latency": latency,
+            "cache": {"entries": len(self.cache), "capacity": self.cache.size, "hits": self.cache.hits,
+                      "misses": self.cache.misses, "hit_rate": round(self.cache.hits / lookups, 3) if lookups else None},
+            "data": {"path": store.path, "players": len(store.players), "stats": len(store.stats),
+                     "teams": len(store.by_team), "loaded_at": store.loaded_at,
+                     "load_seconds": round(store.load_seconds, 3), "generation": self.generation,
+                     "reloads": self.reloads, "reload_errors": self.reload_errors,
+                     "clusters": None if store.clusters is None else len(store.cluster_members),
+                     "cluster_error": store.model_error},
+        }
+
+
+def make_handler(service):
+    class QueryHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            start = time.perf_counter()
+            url = urlsplit(self.path)
+            try:
+                status, body, cache = service.respond(url.path.rstrip("/") or "/", url.query)
+            except Exception as e:
+                # A route error ERROR_STATUS does not map; the client still gets a JSON answer
+                logging.exception(f"Query {self.path} failed")
+                status, cache = 500, None
+                body = json.dumps({"error": f"Internal error: {type(e).__name__}: {e}"}).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            if cache:
+                self.send_header("X-Cache", cache)
+            self.end_headers()
+            self.wfile.write(body)
+            service.record_latency(url.path, time.perf_counter() - start)
+
+        def log_message(self, format, *args):
+            logging.debug(f"{self.address_string()} {format % args}")
+
+    return QueryHandler
+
+
+def start_query_service(service, host="127.0.0.1", port=0):
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve player, team and similarity queries over results.csv")
+    parser.add_argument("--results", default=RESULTS_CSV)
+    parser.add_argument("--model", default=MODEL_PATH, help="Ex3's clustering model, for /cluster and /similar")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE, help="responses kept in the LRU cache")
+    parser.add_argument("--reload-interval", type=float, default=RELOAD_INTERVAL,
+                        help="seconds between checks for a new results.csv")
+    args = parser.parse_args()
+
+    start_run("query_service")
+    service = QueryService(args.results, args.model, args.cache_size, args.reload_interval)
+    store = service.store
+    logging.info(f"Loaded {len(store.players)} players, {len(store.stats)} stats and {len(store.by_team)} teams "
+                 f"from {store.path} in {store.load_seconds:.2f}s"
+                 + (f"; {store.model_error}" if store.model_error else f"; {len(store.cluster_members)} clusters"))
+    service.watch()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f"Serving queries on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        server.server_close()
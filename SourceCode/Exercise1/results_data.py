@@ -0,0 +1,111 @@
+import hashlib
+import os
+
+import pandas as pd
+
+from instrumentation import stage
+
+# Shared loader for Ex1's output, used by Ex2, Ex3 and Ex4. It returns every stat as a number (NaN for "N/a"),
+# Minutes as a number and Age in days. It reads results.parquet when that is at least as new as results.csv.
+# Otherwise it parses the CSV once and keeps the cleaned frame in .cache/, keyed by the CSV's SHA-256.
+# PIPELINE_RESULTS points Ex2-Ex4 at another results.csv than Ex1's.
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+RESULTS_CSV = os.environ.get("PIPELINE_RESULTS") or os.path.join(script_dir, "results.csv")
+# Bump when clean_results changes so frames cached by an older version are not reused
+LOADER_VERSION = 1
+
+NON_STAT_COLUMNS = ['First Name', 'Nation', 'Team', 'Position', 'Age', 'Matches Played', 'Starts', 'Minutes']
+IDENTITY_COLUMNS = ['Player', 'Player ID']
+
+
+def split_columns(df):
+    non_stats = [col for col in df.columns if col in NON_STAT_COLUMNS or col in IDENTITY_COLUMNS]
+    stats = [col for col in df.columns if col not in non_stats]
+    return non_stats, stats
+
+
+def parse_age_days(values):
+    # fbref ages are "years-days"; 27-161 -> round(27 * 365.25) + 161
+    parts = values.astype("string").str.extract(r"^(\d+)-(\d+)$").astype(float)
+    return (parts[0] * 365.25).round() + parts[1]
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def typed_path_for(path):
+    return os.path.splitext(path)[0] + ".parquet"
+
+
+def is_typed_fresh(path):
+    typed_path = typed_path_for(path)
+    if not os.path.exists(typed_path):
+        return False
+    return not os.path.exists(path) or os.path.getmtime(typed_path) >= os.path.getmtime(path)
+
+
+def clean_results(df):
+    # read_csv(na_values=["N/a"], thousands=",") already made every well-formed stat numeric in C;
+    # anything still holding strings is coerced in one apply over the remaining columns.
+    non_stats, stats = split_columns(df)
+    numeric = stats + [col for col in ('Matches Played', 'Starts', 'Minutes') if col in df.columns]
+    leftover = [col for col in numeric if df[col].dtype == object]
+    if leftover:
+        df[leftover] = df[leftover].apply(
+            lambda column: pd.to_numeric(column.str.replace(r"[^\d.\-]", "", regex=True), errors="coerce"))
+    if 'Age' in df.columns and df['Age'].dtype == object:
+        df['Age'] = parse_age_days(df['Age'])
+    return df
+
+
+def read_clean_csv(path, use_cache=True):
+    cache_path = None
+    if use_cache:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), ".cache")
+        cache_path = os.path.join(cache_dir, f"results-{file_sha256(path)[:16]}-v{LOADER_VERSION}.pkl")
+        if os.path.exists(cache_path):
+            with stage("cache_load", cache="results") as loaded:
+                df = pd.read_pickle(cache_path)
+                loaded.rows, loaded.bytes = len(df), os.path.getsize(cache_path)
+            return df
+
+    with stage("clean", source="csv") as cleaned:
+        df = clean_results(pd.read_csv(path, encoding='utf-8', na_values=['N/a'], thousands=','))
+        cleaned.rows, cleaned.bytes = len(df), os.path.getsize(path)
+
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        df.to_pickle(cache_path + ".tmp")
+        os.replace(cache_path + ".tmp", cache_path)
+    return df
+
+
+def load_results(path=RESULTS_CSV, columns=None, stats_only=False, fraction_columns=(), use_cache=True):
+    # columns: only load these; stats_only: only load the stat columns; fraction_columns: divide by 100
+    if is_typed_fresh(path):
+        typed_path = typed_path_for(path)
+        if stats_only:
+            import pyarrow.parquet as pq
+            columns = split_columns(pd.DataFrame(columns=pq.read_schema(typed_path).names))[1]
+        with stage("cache_load", cache="parquet") as loaded:
+            df = pd.read_parquet(typed_path, columns=columns)
+            loaded.rows, loaded.bytes = len(df), os.path.getsize(typed_path)
+    else:
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        df = read_clean_csv(path, use_cache)
+        if stats_only:
+            columns = split_columns(df)[1]
+        if columns is not None:
+            df = df[columns].copy()
+
+    fraction_columns = [col for col in fraction_columns if col in df.columns]
+    if fraction_columns:
+        df[fraction_columns] = df[fraction_columns] / 100
+    return df
@@ -0,0 +1,98 @@
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from Ex1 import STAT_CATEGORIES
+from results_data import parse_age_days
+
+# Typed counterpart of results.csv. Column names follow what pd.read_csv makes of the CSV header, so the
+# second PrgP/PrgR copies are "PrgP.1"/"PrgR.1", and every stat is stored as a number with real nulls.
+# Age is stored as a whole number of days ("27-161" -> 27 * 365.25 + 161, rounded). Consumers read it with
+# pd.read_parquet(path, columns=[...]) so only the columns they use are loaded.
+
+STRING_STATS = {"nationality", "team", "position"}
+FLOAT_STATS = {"xg", "xg_assist", "goals_per_shot", "average_shot_distance"}
+IDENTITY_COLUMNS = [("Player", "string"), ("Player ID", "string")]
+
+
+def stat_type(data_stat):
+    if data_stat in STRING_STATS:
+        return "string"
+    if data_stat in FLOAT_STATS or "_pct" in data_stat or data_stat.endswith("per90"):
+        return "float64"
+    return "int32"
+
+
+def result_columns():
+    # [(column name as read back by pandas, type)] in results.csv order
+    columns = [("First Name", "string")]
+    seen = {}
+    for stats in STAT_CATEGORIES.values():
+        for stat_name, data_stat in stats:
+            count = seen.get(stat_name, 0)
+            seen[stat_name] = count + 1
+            columns.append((f"{stat_name}.{count}" if count else stat_name, stat_type(data_stat)))
+    return columns
+
+
+RESULT_COLUMNS = [name for name, _ in result_columns()]
+
+
+def arrow_schema(include_identity=False):
+    import pyarrow as pa
+
+    types = {"string": pa.string(), "float64": pa.float64(), "int32": pa.int32()}
+    columns = result_columns() + (IDENTITY_COLUMNS if include_identity else [])
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+def to_typed(df):
+    # `df` has the results.csv layout (strings, "N/a" for missing) with unique column names
+    typed = {}
+    for name, kind in result_columns() + IDENTITY_COLUMNS:
+        if name not in df:
+            continue
+        values = df[name].replace({"N/a": None, "": None})
+        if kind == "string":
+            typed[name] = values.astype("string")
+        elif name == "Age":
+            typed[name] = parse_age_days(values)
+        else:
+            cleaned = values.astype("string").str.replace(r"[,%\s]", "", regex=True)
+            typed[name] = pd.to_numeric(cleaned, errors="coerce")
+    return pd.DataFrame(typed, index=df.index)
+
+
+def unique_column_names(df):
+    seen = {}
+    names = []
+    for name in df.columns:
+        count = seen.get(name, 0)
+        seen[name] = count + 1
+        names.append(f"{name}.{count}" if count else name)
+    result = df.copy()
+    result.columns = names
+    return result
+
+
+def write_typed(df, path):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        logging.warning(f"pyarrow is not installed, skipping {path}")
+        return None
+
+    typed = to_typed(unique_column_names(df))
+    schema = arrow_schema(include_identity="Player" in typed)
+    for name, kind in result_columns():
+        if name not in typed:
+            typed[name] = np.nan if kind != "string" else pd.NA
+    # Drop the pandas metadata so readers get plain float64/int32/object columns instead of nullable extension types
+    table = pa.Table.from_pandas(typed[schema.names], schema=schema, preserve_index=False).replace_schema_metadata(None)
+    pq.write_table(table, path + ".tmp")
+    os.replace(path + ".tmp", path)
+    return path
+
@@ -0,0 +1,205 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from Ex1 import STAT_CATEGORIES
+from page_cache import read_json, write_json_atomic
+from results_data import RESULTS_CSV, file_sha256, load_results
+from schema import result_columns
+
+# Synthetic results.csv files at sizes Ex1 cannot scrape (1k to 1M players over many leagues), for benchmarks.
+# The columns are Ex1's: First Name, then STAT_CATEGORIES in order (PrgP/PrgR twice, with equal values), then
+# Player / Player ID. Values are drawn from a seed results.csv. Each synthetic player starts from a random real
+# player, which keeps the position mix, the age spread and the "N/a" pattern realistic (goalkeeping stats only for
+# goalkeepers, shot ratios only for players who shot). Counting stats, Minutes and appearances are scaled by one
+# playing-time factor per player, so they stay consistent with each other; rates and percentages get a little
+# independent noise and are clipped to their range. The seed's league is repeated as many times as keeps squads
+# at their real size; the copies' clubs get made-up, unique names that keep the seed club's suffix
+# ("Ipswich Town" -> "Barimo Town"), so no club name contains another. Output is written in chunks, so 1M rows fit
+# in memory.
+# Rows are not sorted by First Name the way Ex1 sorts them, and floats are printed without trailing zeros.
+#   python synthetic_data.py 1000 10000 100000 1000000     writes .cache/synthetic/<rows>/results.csv
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+OUTPUT_DIR = os.path.join(script_dir, ".cache", "synthetic")
+SIZES = (1000, 10000, 100000, 1000000)
+# Bump when the generated values change so datasets written by an older version are regenerated
+GENERATOR_VERSION = 1
+RANDOM_SEED = 42
+CHUNK_ROWS = 100000
+# Standard deviations, on a log scale, of the per-player playing-time factor and of the noise on rates
+PLAYING_TIME_SPREAD = 0.3
+RATE_SPREAD = 0.1
+AGE_SPREAD_DAYS = 365.25
+MIN_AGE_DAYS, MAX_AGE_DAYS = 16 * 365.25, 40 * 365.25
+MAX_MATCHES = 38
+# Ex1 only keeps players with more than 90 minutes
+MIN_MINUTES = 91
+SURNAME_SYLLABLES = np.array(["al", "ba", "ber", "co", "da", "der", "el", "fer", "gar", "go", "han", "ka", "ki",
+                              "lo", "man", "mar", "mo", "na", "nez", "ra", "ri", "ro", "sa", "son", "ta", "to",
+                              "va", "vic", "wa", "zo"])
+
+
+def layout():
+    # [(CSV header, column name as pandas reads it back, fbref data-stat)] for every column after First Name
+    stats = [pair for pairs in STAT_CATEGORIES.values() for pair in pairs]
+    return [(header, name, data_stat) for (header, data_stat), (name, _) in zip(stats, result_columns()[1:])]
+
+
+def is_rate(data_stat):
+    return "_pct" in data_stat or data_stat.endswith("per90") or data_stat in ("goals_per_shot",
+                                                                               "average_shot_distance")
+
+
+def read_seed(path=RESULTS_CSV):
+    # (typed frame, {column: decimal places printed in the seed})
+    seed = load_results(path)
+    raw = pd.read_csv(path, dtype=str, keep_default_na=False)
+    decimals = {}
+    for column in raw.columns:
+        places = raw[column].str.extract(r"\.(\d+)$")[0].str.len()
+        decimals[column] = int(places.max()) if places.notna().any() else 0
+    return seed, decimals
+
+
+def format_age(days):
+    # Days -> fbref's "years-days", the inverse of results_data.parse_age_days
+    known = ~np.isnan(days)
+    days = np.where(known, days, 0)
+    years = np.floor(days / 365.25)
+    years = np.where(days - np.round(years * 365.25) < 0, years - 1, years)
+    rest = days - np.round(years * 365.25)
+    ages = pd.Series(years.astype("int64")).astype(str) + "-" + pd.Series(rest.astype("int64")).astype(str)
+    return ages.where(known)
+
+
+def syllable_word(number, min_syllables=3):
+    # A distinct capitalised word for every non-negative number (its base-len(SURNAME_SYLLABLES) digits)
+    syllables = []
+    while number or len(syllables) < min_syllables:
+        number, digit = divmod(number, len(SURNAME_SYLLABLES))
+        syllables.append(SURNAME_SYLLABLES[digit])
+    return "".join(syllables).capitalize()
+
+
+def league_teams(teams, leagues):
+    # [league][team] club names: the seed's teams for the first league, made-up ones for the others
+    names = np.empty((leagues, len(teams)), dtype=object)
+    names[0] = teams
+    for league in range(1, leagues):
+        for i, team in enumerate(teams):
+            words = str(team).split()
+            place = syllable_word((league - 1) * len(teams) + i)
+            names[league, i] = f"{place} {words[-1]}" if len(words) > 1 else place
+    return names
+
+
+def surnames(rng, rows):
+    picks = SURNAME_SYLLABLES[rng.integers(len(SURNAME_SYLLABLES), size=(3, rows))]
+    third = np.where(rng.random(rows) < 0.4, picks[2], "")
+    return np.char.capitalize(np.char.add(np.char.add(picks[0], picks[1]), third))
+
+
+def synthetic_chunk(seed, decimals, start, rows, teams, random_seed=RANDOM_SEED):
+    # Rows start .. start + rows of a dataset, with `teams` from league_teams(); each chunk has its own generator,
+    # so the output does not depend on the chunk size
+    rng = np.random.default_rng([random_seed, start])
+    base = seed.iloc[rng.integers(len(seed), size=rows)].reset_index(drop=True)
+    # The factor actually applied is the one left after clipping Minutes to a season's worth
+    seed_minutes = base["Minutes"].to_numpy(dtype=float)
+    minutes = np.clip(np.round(seed_minutes * np.exp(rng.normal(0, PLAYING_TIME_SPREAD, rows))), MIN_MINUTES,
+                      MAX_MATCHES * 90)
+    playing_time = minutes / seed_minutes
+    matches = np.clip(np.round(base["Matches Played"].to_numpy(dtype=float) * playing_time), np.ceil(minutes / 90),
+                      MAX_MATCHES)
+    first_names = seed["First Name"].to_numpy(dtype=str)[rng.integers(len(seed), size=rows)]
+    columns = {"First Name": first_names}
+    by_stat = {}
+    for header, name, data_stat in layout():
+        if data_stat in by_stat:
+            columns[name] = by_stat[data_stat]
+            continue
+        if data_stat in ("nationality", "position"):
+            column = base[name]
+        elif data_stat == "team":
+            team = pd.Index(teams[0]).get_indexer(base[name])
+            column = pd.Series(teams[rng.integers(len(teams), size=rows), team], dtype="string")
+        elif data_stat == "age":
+            days = base[name].to_numpy(dtype=float) + rng.normal(0, AGE_SPREAD_DAYS, rows)
+            column = format_age(np.round(np.clip(days, MIN_AGE_DAYS, MAX_AGE_DAYS)))
+        elif data_stat == "games":
+            column = pd.Series(matches.astype("int64"))
+        elif data_stat == "games_starts":
+            column = pd.Series(np.minimum(np.round(base[name].to_numpy(dtype=float) * playing_time),
+                                          matches).astype("int64"))
+        elif data_stat == "minutes":
+            column = pd.Series(minutes.astype("int64")).map("{:,}".format)
+        else:
+            values = base[name].to_numpy(dtype=float)
+            if is_rate(data_stat):
+                values = values * np.exp(rng.normal(0, RATE_SPREAD, rows))
+                if "_pct" in data_stat:
+                    values = np.clip(values, 0, 100)
+            else:
+                values = values * playing_time
+            places = decimals.get(header, 0)
+            column = pd.Series(np.round(values, places))
+            if not places:
+                column = column.astype("Int64")
+        columns[name] = by_stat[data_stat] = column
+    first = pd.Series(first_names)
+    columns["Player"] = first + " " + surnames(rng, rows)
+    # Odd multipliers are bijections modulo 2**32, so ids stay unique and look random
+    ids = (np.arange(start, start + rows, dtype=np.uint64) * np.uint64(2654435761)) % np.uint64(2 ** 32)
+    columns["Player ID"] = np.char.mod("%08x", ids)
+    return pd.DataFrame(columns)
+
+
+def dataset_path(rows, output_dir=OUTPUT_DIR):
+    return os.path.join(output_dir, str(rows), "results.csv")
+
+
+def generate(rows, path=None, seed_path=RESULTS_CSV, random_seed=RANDOM_SEED, chunk_rows=CHUNK_ROWS):
+    # Writes a synthetic results.csv of `rows` players and returns its path
+    path = path or dataset_path(rows)
+    seed, decimals = read_seed(seed_path)
+    teams = league_teams(seed["Team"].dropna().unique(), max(1, round(rows / len(seed))))
+    header = ["First Name"] + [header for header, _, _ in layout()] + ["Player", "Player ID"]
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8", newline="") as f:
+        for start in range(0, rows, chunk_rows):
+            chunk = synthetic_chunk(seed, decimals, start, min(chunk_rows, rows - start), teams, random_seed)
+            chunk.to_csv(f, header=header if start == 0 else False, index=False, na_rep="N/a")
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def dataset(rows, output_dir=OUTPUT_DIR, seed_path=RESULTS_CSV, random_seed=RANDOM_SEED):
+    # Path of the synthetic results.csv of `rows` players, generated unless an up-to-date one exists
+    path = dataset_path(rows, output_dir)
+    stamp_path = os.path.join(os.path.dirname(path), "dataset.json")
+    stamp = {"generator": GENERATOR_VERSION, "rows": rows, "seed": file_sha256(seed_path)[:16],
+             "random_seed": random_seed}
+    if os.path.exists(path) and read_json(stamp_path) == stamp:
+        return path
+    generate(rows, path, seed_path, random_seed)
+    write_json_atomic(stamp_path, stamp)
+    return path
+
+
+if __name__ == "__main__":
+    import time
+
+    parser = argparse.ArgumentParser(description="Write synthetic results.csv files for benchmarking")
+    parser.add_argument("rows", nargs="*", type=int, default=list(SIZES))
+    parser.add_argument("--seed-file", default=RESULTS_CSV, help="real results.csv the values are drawn from")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--random-seed", type=int, default=RANDOM_SEED)
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        start = time.perf_counter()
+        path = dataset(rows, args.output_dir, args.seed_file, args.random_seed)
+        print(f"{rows} players: {path} ({os.path.getsize(path) / 1e6:.1f} MB, {time.perf_counter() - start:.1f}s)")
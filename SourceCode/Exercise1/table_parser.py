@@ -0,0 +1,118 @@
+import logging
+import re
+
+from lxml import etree
+
+CHUNK_SIZE = 64 * 1024
+PLAYER_HREF_RE = re.compile(r"/players/([0-9a-f]{8})/")
+
+
+class TableNotFound(Exception):
+    # The page has no table with the requested id; the caller can try another source for it
+    pass
+
+
+def find_table_start(html, table_id):
+    match = re.search(r"<table\b[^>]*\bid=[\"']" + re.escape(table_id) + r"[\"']", html)
+    return match.start() if match else None
+
+
+def cell_text(cell):
+    return "".join(cell.itertext()).strip()
+
+
+def build_plan(header_cells, columns):
+    # Maps each output column to the index of the header cell carrying its data-stat, computed once per table
+    stat_to_index = {cell.get("data-stat"): idx for idx, cell in enumerate(header_cells) if cell.get("data-stat")}
+    return [(stat_name, stat_to_index.get(data_stat)) for stat_name, data_stat in columns]
+
+
+def iter_table_rows(html, table_id, columns, extra_stats=()):
+    # Streams (player_cell, values) for each body row of the table with this id. `values` follows
+    # `columns` order, then `extra_stats`, with None for cells the table does not have.
+    # Raises TableNotFound right away, not on the first row, when no such table exists in `html`.
+    start = find_table_start(html, table_id)
+    if start is None:
+        raise TableNotFound(table_id)
+    return _stream_rows(html, start, columns, extra_stats)
+
+
+def _stream_rows(html, start, columns, extra_stats):
+    parser = etree.HTMLPullParser(events=("start", "end"))
+    section = None
+    plan = None
+    last_header = None
+    done = False
+
+    for offset in range(start, len(html), CHUNK_SIZE):
+        parser.feed(html[offset:offset + CHUNK_SIZE])
+        for event, element in parser.read_events():
+            tag = element.tag
+            if event == "start":
+                if tag in ("thead", "tbody"):
+                    section = tag
+                continue
+
+            if tag == "tr" and section == "thead":
+                last_header = [cell for cell in element if cell.tag in ("th", "td")]
+            elif tag == "thead":
+                section = None
+                if last_header is not None:
+                    plan = build_plan(last_header, list(columns) + [(s, s) for s in extra_stats])
+            elif tag == "tr" and section == "tbody":
+                if plan is not None and "thead" not in (element.get("class") or "").split():
+                    cells = [cell for cell in element if cell.tag in ("th", "td")]
+                    player_cell = next((cell for cell in cells if cell.get("data-stat") == "player"), None)
+                    if player_cell is not None:
+                        values = [cell_text(cells[idx]) if idx is not None and idx < len(cells) else None
+                                  for _, idx in plan]
+                        yield player_cell, values
+                element.clear()
+                parent = element.getparent()
+                while element.getprevious() is not None:
+                    del parent[0]
+            elif tag == "table":
+                done = True
+                break
+        if done:
+            break
+
+
+def player_id(player_cell):
+    # fbref player links look like /en/players/<8-char id>/<Name>
+    link = player_cell.find(".//a")
+    match = PLAYER_HREF_RE.search(link.get("href", "")) if link is not None else None
+    return match.group(1) if match else None
+
+
+def player_key(player_id, team, player_name):
+    # The same player appears once per club after a mid-season transfer, so the id alone is not unique
+    return f"{player_id or 'name:' + player_name}|{team or ''}"
+
+
+def parse_table(html, table_id, columns, stat_category, include_minutes_raw=False):
+    # {player key: stats} for the table with this id, or None when `html` has no such table. Any other error is a
+    # parsing bug and propagates instead of passing for a missing table.
+    extra_stats = ("team", "minutes") if include_minutes_raw else ("team",)
+    try:
+        rows = iter_table_rows(html, table_id, columns, extra_stats)
+    except TableNotFound:
+        return None
+    data = {}
+    for player_cell, values in rows:
+        player_name = cell_text(player_cell)
+        if not player_name or re.match(r'^\d+$', player_name):
+            continue
+
+        pid = player_id(player_cell)
+        key = player_key(pid, values[len(columns)], player_name)
+        if key in data:
+            logging.warning(f"Duplicate player found in {stat_category}: {player_name} ({key})")
+
+        stats = {"Player": player_name, "Player ID": pid or "N/a"}
+        stats.update((stat_name, value if value else "N/a") for (stat_name, _), value in zip(columns, values))
+        if include_minutes_raw:
+            minutes = values[-1]
+            stats["Minutes_raw"] = minutes.replace(",", "") if minutes is not None else "N/a"
+        data[key] = stats
+    return data
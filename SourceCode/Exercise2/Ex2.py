@@ -1,171 +1,114 @@
 import pandas as pd
-import numpy as np
 import os
-import matplotlib
-matplotlib.use('Agg') 
-import matplotlib.pyplot as plt
-import re
+import sys
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(script_dir, "..", "Exercise1"))
+from results_data import RESULTS_CSV, load_results, split_columns
+from instrumentation import start_run, traced
+from histogram_renderer import render_histograms
+from rankings import rank_players, report_paths, write_rankings
+from incremental import STATE_PATH, changed_cells, clear_state, load_state, merge_by_stat, save_state, tracked_rows
+from team_stats import DEFAULT_STATISTICS, team_statistics
 
 pd.set_option('future.no_silent_downcasting', True)
 
+# Only these three of Ex2's old percent list exist in results.csv; Ex2 has always reported them on a 0-1 scale
+percent_cols = ['Save%', 'CS%', 'SoT%']
+
+# Reports are written here and histograms to OUTPUT_DIR/histograms, wherever Ex2 is run from
+OUTPUT_DIR = script_dir
+
 try:
-    df = pd.read_csv("results.csv", encoding='utf-8')
+    df = load_results(RESULTS_CSV, fraction_columns=percent_cols)
     print("Columns in results.csv:", list(df.columns))
 except FileNotFoundError:
-    print("Error: results.csv not found.")
+    print(f"Error: {RESULTS_CSV} not found.")
     exit(1)
 
-df['Minutes'] = df['Minutes'].str.replace(',', '').pipe(pd.to_numeric, errors='coerce')
-
-percent_cols = ['Won%', 'Save%', 'Possession_Succ%', 'Possession_Tkld%', 'Pen Save%', 'CS%', 'SoT%']
-percent_cols = [col for col in percent_cols if col in df.columns]
-if not percent_cols:
-    print("Warning: No percent_cols found.")
-else:
-    print("Processing percent_cols:", percent_cols)
-    for col in percent_cols:
-        df[col] = (
-            df[col]
-            .astype(str)
-            .replace('N/a', np.nan)
-            .str.replace(r'[^\d.]', '', regex=True)
-            .pipe(pd.to_numeric, errors='coerce') / 100
-        )
-
-
-df['GA90'] = pd.to_numeric(df['GA90'], errors='coerce')
-
-stats_columns = df.columns[8:].tolist()
+non_stats_columns, stats_columns = split_columns(df)
 print("Stats columns:", stats_columns)
 
-for stat in stats_columns:
-    df[stat] = pd.to_numeric(df[stat], errors='coerce')
-
-def generate_top_bottom_3():
-    try:
-        with open('top_3.txt', 'w', encoding='utf-8') as f:
-            for stat in stats_columns:
-                df[stat] = pd.to_numeric(df[stat], errors='coerce')
-                valid_count = df[stat].count()
-                
-                if valid_count < 3:
-                    print(f"Skipping {stat}: Less than 3 valid entries ({valid_count})")
-                    continue
-
-                f.write(f"\n{'='*25} {stat.upper()} {'='*25}\n")
-                
-                top3 = df[['First Name', 'Team', stat]].nlargest(3, stat)
-                f.write("\nTop 3:\n")
-                for _, row in top3.iterrows():
-                    value = row[stat] if not pd.isna(row[stat]) else 0
-                    f.write(f"{row['First Name']} ({row['Team']}): {value:.2f}\n")
-                
-                bottom3 = df[['First Name', 'Team', stat]].nsmallest(3, stat)
-                f.write("\nBottom 3:\n")
-                for _, row in bottom3.iterrows():
-                    value = row[stat] if not pd.isna(row[stat]) else 0
-                    f.write(f"{row['First Name']} ({row['Team']}): {value:.2f}\n")
-    except Exception as e:
-        print(f"Error in generate_top_bottom_3: {e}")
-
-def calculate_statistics():
-    try:
-        teams = df['Team'].unique().tolist()
-        results_list = []
-        
-        for stat in stats_columns:
-            stat_data = df[stat]
-            if stat_data.count() > 0:
-                stat_dict = {
-                    'Statistic': [f'Median of {stat}', f'Mean of {stat}', f'Std of {stat}'],
-                    'all': [stat_data.median(), stat_data.mean(), stat_data.std()]
-                }
-                # Add per-team stats
-                for team in teams:
-                    team_data = df[df['Team'] == team][stat]
-                    if team_data.count() > 0:
-                        stat_dict[team] = [team_data.median(), team_data.mean(), team_data.std()]
-                    else:
-                        stat_dict[team] = [np.nan, np.nan, np.nan]
-                results_list.append(pd.DataFrame(stat_dict))
-        
-        if results_list:
-            results = pd.concat(results_list, ignore_index=True)
-            results.to_csv('results2.csv', index=False, float_format="%.2f", encoding='utf-8')
-        else:
-            print("No statistics to calculate.")
-    except Exception as e:
-        print(f"Error in calculate_statistics: {e}")
-
-def generate_histograms():
-    try:
-        os.makedirs('histograms', exist_ok=True)
-        
-        for stat in stats_columns:
-            stat_data = df[stat].dropna()
-            if not stat_data.empty:
-                plt.figure()
-                plt.hist(stat_data, bins=20)
-                plt.title(f'All Players - {stat}')
-                plt.xlabel(stat)
-                plt.ylabel('Frequency')
-                safe_stat = re.sub(r'[^a-zA-Z0-9]', '_', stat)
-                plt.savefig(f'histograms/all_players_{safe_stat}.png', bbox_inches='tight')
-                plt.close()
-            
-            for team in df['Team'].unique():
-                safe_team = re.sub(r'[\n<>:"/\\|?*()]', '_', team).replace(' ', '_').strip('_')
-                safe_stat = re.sub(r'[^a-zA-Z0-9]', '_', stat)
-                team_data = df[df['Team'] == team][stat].dropna()
-                if not team_data.empty:
-                    plt.figure()
-                    plt.hist(team_data, bins=20)
-                    plt.title(f'{team} - {stat}')
-                    plt.xlabel(stat)
-                    plt.ylabel('Frequency')
-                    plt.savefig(f'histograms/{safe_team}_{safe_stat}.png', bbox_inches='tight')
-                    plt.close()
-    except Exception as e:
-        print(f"Error in generate_histograms: {e}")
-
-def analyze_data():
-    try:
+# results2.csv rows per stat, e.g. EX2_STATISTICS=median,mean,std,q25,q75,count,mean_per90 (see team_stats.py)
+STATISTICS_TO_REPORT = tuple(os.environ.get("EX2_STATISTICS", ",".join(DEFAULT_STATISTICS)).split(","))
+# EX2_INCREMENTAL=1 only recomputes and rewrites the outputs whose players changed since the last run (see incremental.py)
+INCREMENTAL = os.environ.get("EX2_INCREMENTAL") == "1"
+OUTPUT_FILES = [*(os.path.join(OUTPUT_DIR, name) for name in ('leadership_details.csv', 'leadership_counts.csv',
+                                                              'best_team_analysis.txt', 'results2.csv')),
+                *report_paths(OUTPUT_DIR, 3)]
+
+@traced("aggregate", step="rankings")
+def generate_top_bottom_3(n=3, group_by=None, min_minutes=0, stats=None, previous=None):
+    # stats/previous: only rank `stats` and keep every other stat's rows from the `previous` rankings
+    stats = stats_columns if stats is None else stats
+    rankings, skipped = rank_players(df, stats, n, group_by, min_minutes)
+    for stat, group, count in skipped:
+        suffix = "" if group_by is None else f" in {group}"
+        print(f"Skipping {stat}{suffix}: Less than {n} valid entries ({count})")
+    if previous is not None:
+        by_stat = [frame.set_index('Statistic', drop=False) for frame in (previous, rankings)]
+        rankings = merge_by_stat(*by_stat, stats, stats_columns).reset_index(drop=True)
+    write_rankings(rankings, n, *report_paths(OUTPUT_DIR, n, group_by))
+    return rankings
+
+@traced("aggregate", step="statistics")
+def calculate_statistics(statistics=STATISTICS_TO_REPORT, stats=None, previous=None):
+    # stats/previous: only recompute the rows of `stats` and keep every other stat's rows from `previous`
+    results = team_statistics(df, stats_columns if stats is None else stats, statistics)
+    if previous is not None:
+        results = merge_by_stat(previous, results, stats, stats_columns)
+        results = results.reindex(columns=['Statistic', 'all'] + df['Team'].unique().tolist())
+    if not results.empty:
+        results.to_csv(os.path.join(OUTPUT_DIR, 'results2.csv'), index=False, float_format="%.2f", encoding='utf-8')
+    else:
+        print("No statistics to calculate.")
+    return results
+
+# render_histograms records its own per-team render stages
+def generate_histograms(changed=None):
+    rendered, skipped = render_histograms(df, stats_columns, os.path.join(OUTPUT_DIR, 'histograms'), changed=changed)
+    print(f"Histograms: {rendered} rendered, {skipped} unchanged and skipped")
+    return rendered, skipped
+
+@traced("aggregate", step="team_means")
+def analyze_data(team_stat=None):
+    # team_stat: per-team means to report; incremental runs pass the previous ones with the changed cells updated
+    if team_stat is None:
         team_stat = df.groupby('Team')[stats_columns].mean()
-        leadership = {}
-        leadership_details = []
-
-        for stat in stats_columns:
-            if team_stat[stat].count() > 0:
-                leader = team_stat[stat].idxmax()
-                max_value = team_stat[stat].max()
-                leadership[stat] = leader
-                leadership_details.append({
-                    'Statistic': stat,
-                    'Leading Team': leader,
-                    'Mean Value': f"{max_value:.2f}"
-                })
-
-        leadership_df = pd.DataFrame(leadership_details)
-        leadership_df.to_csv('leadership_details.csv', index=False, encoding='utf-8')
-
-        leader_counts = pd.Series(leadership.values()).value_counts()
-        leader_counts.to_csv('leadership_counts.csv', encoding='utf-8')
-
-        best_team = leader_counts.idxmax() if not leader_counts.empty else "No team leads"
-        best_team_count = leader_counts.max() if not leader_counts.empty else 0
-
-        with open('best_team_analysis.txt', 'w', encoding='utf-8') as f:
-            f.write("=== Team Performance Analysis ===\n\n")
-            f.write("Teams Leading in Each Statistic:\n")
-            for stat, team in leadership.items():
-                f.write(f"{stat}: {team} (Mean: {team_stat[stat][team]:.2f})\n")
-            f.write("\nLeadership Counts:\n")
-            for team, count in leader_counts.items():
-                f.write(f"{team}: Leads in {count} statistics\n")
-            f.write("\nBest-Performing Team:\n")
-            f.write(f"{best_team} leads in {best_team_count} statistics, showing strength across multiple metrics.\n")
-    except Exception as e:
-        print(f"Error in analyze_data: {e}")
+    leadership = {}
+    leadership_details = []
+
+    for stat in stats_columns:
+        if team_stat[stat].count() > 0:
+            leader = team_stat[stat].idxmax()
+            max_value = team_stat[stat].max()
+            leadership[stat] = leader
+            leadership_details.append({
+                'Statistic': stat,
+                'Leading Team': leader,
+                'Mean Value': f"{max_value:.2f}"
+            })
+
+    leadership_df = pd.DataFrame(leadership_details)
+    leadership_df.to_csv(os.path.join(OUTPUT_DIR, 'leadership_details.csv'), index=False, encoding='utf-8')
+
+    leader_counts = pd.Series(leadership.values()).value_counts()
+    leader_counts.to_csv(os.path.join(OUTPUT_DIR, 'leadership_counts.csv'), encoding='utf-8')
+
+    best_team = leader_counts.idxmax() if not leader_counts.empty else "No team leads"
+    best_team_count = leader_counts.max() if not leader_counts.empty else 0
+
+    with open(os.path.join(OUTPUT_DIR, 'best_team_analysis.txt'), 'w', encoding='utf-8') as f:
+        f.write("=== Team Performance Analysis ===\n\n")
+        f.write("Teams Leading in Each Statistic:\n")
+        for stat, team in leadership.items():
+            f.write(f"{stat}: {team} (Mean: {team_stat[stat][team]:.2f})\n")
+        f.write("\nLeadership Counts:\n")
+        for team, count in leader_counts.items():
+            f.write(f"{team}: Leads in {count} statistics\n")
+        f.write("\nBest-Performing Team:\n")
+        f.write(f"{best_team} leads in {best_team_count} statistics, showing strength across multiple metrics.\n")
+    return team_stat
 
 def sanitize_filename(filename):
     invalid_chars = ['\\', '/', ':', '*', '?', '"', '<', '>', '|', '\r', '\n']
@@ -174,11 +117,55 @@ def sanitize_filename(filename):
     filename = filename.rstrip('. ')
     return filename
 
-try:
-    analyze_data()
-    generate_histograms()
-    calculate_statistics()
-    generate_top_bottom_3()
-    print("Script completed successfully.")
-except Exception as e:
-    print(f"Script failed with error: {e}")
\ No newline at end of file
+def update_team_means(team_stat, changed):
+    stats = changed.columns[changed.any()].tolist()
+    teams = changed.index[changed.any(axis=1)].tolist()
+    team_stat = team_stat.copy()
+    team_stat.loc[teams, stats] = df[df['Team'].isin(teams)].groupby('Team')[stats].mean()
+    return team_stat
+
+def run_all(incremental=INCREMENTAL):
+    # Runs every step and keeps its results for the next incremental run; with `incremental` and a usable
+    # previous state only the changed stats/teams are recomputed and unchanged outputs are left untouched
+    rows = tracked_rows(df, stats_columns)
+    state = load_state(STATE_PATH, STATISTICS_TO_REPORT) if incremental else None
+    changed = None
+    if state is not None and all(os.path.exists(path) for path in OUTPUT_FILES):
+        changed = changed_cells(state['rows'], rows, stats_columns)
+
+    try:
+        if changed is None:
+            if incremental:
+                print("Incremental: no usable previous run, recomputing everything")
+            team_stat = analyze_data()
+            generate_histograms()
+            results = calculate_statistics()
+            rankings = generate_top_bottom_3()
+        else:
+            stats = changed.columns[changed.any()].tolist()
+            team_stat, results, rankings = state['team_means'], state['results2'], state['rankings']
+            if stats:
+                team_stat = analyze_data(update_team_means(team_stat, changed))
+                results = calculate_statistics(stats=stats, previous=results)
+                rankings = generate_top_bottom_3(stats=stats, previous=rankings)
+            histograms = generate_histograms(changed)
+            files_skipped = 0 if stats else len(OUTPUT_FILES)
+            print(f"Incremental: {len(stats)} stats on {int(changed.any(axis=1).sum())} teams changed; "
+                  f"{len(OUTPUT_FILES) - files_skipped + histograms[0]} artifacts rewritten, "
+                  f"{files_skipped + histograms[1]} skipped")
+    except Exception:
+        # Some outputs may be stale now, so the next incremental run starts from scratch
+        clear_state(STATE_PATH)
+        raise
+    save_state({'statistics': STATISTICS_TO_REPORT, 'rows': rows, 'team_means': team_stat,
+                'results2': results, 'rankings': rankings}, STATE_PATH)
+
+# Guarded so the histogram worker processes can import this module without re-running the analysis
+if __name__ == "__main__":
+    start_run("Ex2")
+    try:
+        run_all()
+        print("Script completed successfully.")
+    except Exception as e:
+        print(f"Script failed with error: {e}")
+        sys.exit(1)
\ No newline at end of file
@@ -0,0 +1,177 @@
+import collections
+import concurrent.futures
+import hashlib
+import json
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import record
+
+# Renders Ex2's histogram PNGs. All bins are computed up front (one vectorised pass per stat over every team),
+# then a process pool draws them, each worker reusing a single Agg figure. A manifest of content hashes lets
+# unchanged images be skipped on the next run.
+
+MANIFEST_NAME = ".manifest.json"
+# Bump when the drawing code changes so every image is redrawn once
+RENDER_VERSION = 1
+
+
+def safe_stat_name(stat):
+    return re.sub(r'[^a-zA-Z0-9]', '_', stat)
+
+
+def safe_team_name(team):
+    return re.sub(r'[\n<>:"/\\|?*()]', '_', team).replace(' ', '_').strip('_')
+
+
+def grouped_histograms(values, codes, n_groups, bins=20):
+    # Per-group np.histogram(group_values, bins) for every group at once. Rows with NaN or a negative code are
+    # ignored. Returns (edges, counts, present) where edges is (n_groups, bins + 1), counts is (n_groups, bins)
+    # and present is the number of values each group had; the binning mirrors np.histogram exactly.
+    keep = ~np.isnan(values) & (codes >= 0)
+    v = values[keep]
+    g = codes[keep]
+    present = np.bincount(g, minlength=n_groups)
+
+    lo = np.full(n_groups, np.inf)
+    hi = np.full(n_groups, -np.inf)
+    np.minimum.at(lo, g, v)
+    np.maximum.at(hi, g, v)
+    empty = present == 0
+    lo[empty], hi[empty] = 0.0, 1.0
+    flat = lo == hi
+    lo[flat] -= 0.5
+    hi[flat] += 0.5
+
+    edges = np.linspace(lo, hi, bins + 1, axis=1)
+    first, width = lo[g], (hi - lo)[g]
+    idx = (((v - first) / width) * bins).astype(np.intp)
+    idx[idx == bins] -= 1
+    idx[v < edges[g, idx]] -= 1
+    idx[(v >= edges[g, idx + 1]) & (idx != bins - 1)] += 1
+    counts = np.bincount(g * bins + idx, minlength=n_groups * bins).reshape(n_groups, bins)
+    return edges, counts, present
+
+
+def plan_histograms(df, stats_columns, output_dir, bins=20, changed=None):
+    # Returns one render job per non-empty (stat, all players) and (stat, team) histogram. `changed` is an
+    # optional team x stat boolean frame; only stats with a changed cell, and only their changed teams, are planned.
+    codes, teams = pd.factorize(df['Team'])
+    if changed is not None:
+        stats_columns = [stat for stat in stats_columns if changed[stat].any()]
+    matrix = df[stats_columns].to_numpy(dtype=float, na_value=np.nan)
+    everyone = np.zeros(len(df), dtype=np.intp)
+    jobs = []
+    for j, stat in enumerate(stats_columns):
+        column = matrix[:, j]
+        safe_stat = safe_stat_name(stat)
+        edges, counts, present = grouped_histograms(column, everyone, 1, bins)
+        if present[0]:
+            jobs.append((os.path.join(output_dir, f'all_players_{safe_stat}.png'), f'All Players - {stat}', stat,
+                         edges[0], counts[0]))
+        edges, counts, present = grouped_histograms(column, codes, len(teams), bins)
+        for t, team in enumerate(teams):
+            if present[t] and (changed is None or changed.at[team, stat]):
+                jobs.append((os.path.join(output_dir, f'{safe_team_name(team)}_{safe_stat}.png'), f'{team} - {stat}',
+                             stat, edges[t], counts[t]))
+    return jobs
+
+
+def job_hash(job):
+    _, title, xlabel, edges, counts = job
+    digest = hashlib.sha256(f"{RENDER_VERSION}|{title}|{xlabel}".encode())
+    digest.update(np.ascontiguousarray(edges, dtype=float).tobytes())
+    digest.update(np.ascontiguousarray(counts, dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+
+_figure = None
+_axes = None
+
+
+def _init_worker():
+    global _figure, _axes
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    _figure = Figure()
+    FigureCanvasAgg(_figure)
+    _axes = _figure.add_subplot()
+
+
+def _render_batch(jobs):
+    # Returns [(title, seconds)] for the jobs drawn
+    if _figure is None:
+        _init_worker()
+    timings = []
+    for path, title, xlabel, edges, counts in jobs:
+        start = time.perf_counter()
+        _axes.cla()
+        _axes.hist(edges[:-1], bins=edges, weights=counts)
+        _axes.set_title(title)
+        _axes.set_xlabel(xlabel)
+        _axes.set_ylabel('Frequency')
+        _figure.savefig(path, bbox_inches='tight')
+        timings.append((title, time.perf_counter() - start))
+    return timings
+
+
+def load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    return {}
+
+
+def save_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=0, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def render_histograms(df, stats_columns, output_dir='histograms', bins=20, workers=None, skip_unchanged=True,
+                      changed=None):
+    # Returns (rendered, skipped). With `changed` (see plan_histograms) every other image is kept as it is and
+    # counted as skipped.
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = plan_histograms(df, stats_columns, output_dir, bins, changed)
+
+    manifest = load_manifest(output_dir) if skip_unchanged else {}
+    hashes = {job[0]: job_hash(job) for job in jobs}
+    todo = [job for job in jobs
+            if not (os.path.exists(job[0]) and manifest.get(os.path.basename(job[0])) == hashes[job[0]])]
+
+    workers = workers or os.cpu_count() or 1
+    timings = []
+    if todo:
+        if workers == 1 or len(todo) < 2 * workers:
+            timings = _render_batch(todo)
+        else:
+            chunk = max(1, len(todo) // (workers * 4))
+            batches = [todo[i:i + chunk] for i in range(0, len(todo), chunk)]
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+                timings = [timing for batch in executor.map(_render_batch, batches) for timing in batch]
+
+    # Drawing time per team ("All Players" for the league-wide images), summed over the workers
+    per_team = collections.defaultdict(lambda: [0, 0.0])
+    for title, seconds in timings:
+        team = title.rsplit(' - ', 1)[0]
+        per_team[team][0] += 1
+        per_team[team][1] += seconds
+    for team, (images, seconds) in per_team.items():
+        record("render", seconds, rows=images, team=team)
+
+    if changed is None:
+        manifest = {}
+    manifest.update({os.path.basename(path): digest for path, digest in hashes.items()})
+    save_manifest(output_dir, manifest)
+    return len(todo), len(manifest) - len(todo)
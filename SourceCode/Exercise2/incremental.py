@@ -0,0 +1,100 @@
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+# State for Ex2's incremental mode (EX2_INCREMENTAL=1). After every successful run the players' rows (keyed by
+# player, stats plus the row attributes every output depends on) and the per-team / per-stat aggregates behind
+# each output are pickled to .cache/ex2_state.pkl. The next run compares its rows with those to get a
+# team x stat "changed" mask and only recomputes and rewrites the outputs that read a changed cell.
+
+STATE_VERSION = 1
+STATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'ex2_state.pkl')
+KEY_COLUMNS = ['Player ID', 'First Name', 'Nation', 'Team']
+# A change to one of these touches every stat of the player's team (per-90 statistics, rankings output)
+ROW_ATTRIBUTES = ['Position', 'Minutes']
+
+
+def row_keys(df):
+    # "<id or name>|<nation>|<team>#<n>", n numbering players that would otherwise share a key
+    columns = [col for col in KEY_COLUMNS if col in df]
+    parts = [df[col].astype('string').fillna('') for col in columns]
+    base = parts[0].str.cat(parts[1:], sep='|') if len(parts) > 1 else parts[0]
+    return base + '#' + base.groupby(base, sort=False).cumcount().astype(str)
+
+
+def tracked_rows(df, stats_columns):
+    attributes = [col for col in ROW_ATTRIBUTES if col in df]
+    rows = df[['Team'] + attributes + stats_columns].copy()
+    rows.index = row_keys(df).to_numpy()
+    return rows
+
+
+def _differs(old, new):
+    # Element-wise "value changed" for two aligned frames, treating missing == missing
+    if all(pd.api.types.is_numeric_dtype(dtype) for dtype in (*old.dtypes, *new.dtypes)):
+        old, new = old.to_numpy(dtype=float, na_value=np.nan), new.to_numpy(dtype=float, na_value=np.nan)
+        return ~((old == new) | (np.isnan(old) & np.isnan(new)))
+    old = old.astype(object).where(old.notna(), None).to_numpy()
+    new = new.astype(object).where(new.notna(), None).to_numpy()
+    return old != new
+
+
+def changed_cells(previous, current, stats_columns):
+    # Team x stat boolean frame of cells whose values differ between two tracked_rows() frames, or None when
+    # the columns or the set of teams changed and everything has to be rebuilt
+    if list(previous.columns) != list(current.columns):
+        return None
+    teams = current['Team'].unique()
+    if set(teams) != set(previous['Team'].unique()):
+        return None
+
+    common = current.index.intersection(previous.index)
+    old, new = previous.loc[common], current.loc[common]
+    common_teams = new['Team'].to_numpy()
+    changed = pd.DataFrame(_differs(old[stats_columns], new[stats_columns]), columns=stats_columns)
+    changed = changed.groupby(common_teams).any().reindex(index=teams, fill_value=False)
+
+    attributes = [col for col in ROW_ATTRIBUTES if col in current]
+    touched = set(common_teams[_differs(old[attributes], new[attributes]).any(axis=1)]) if attributes else set()
+    touched |= set(current.loc[current.index.difference(previous.index), 'Team'])
+    touched |= set(previous.loc[previous.index.difference(current.index), 'Team'])
+    changed.loc[list(touched)] = True
+    return changed
+
+
+def merge_by_stat(previous, new, recomputed, stats_columns):
+    # Rows of `previous` for stats outside `recomputed`, plus `new`, in stats_columns order. Both frames are
+    # indexed by stat column name; rows of one stat keep their order.
+    kept = previous[~previous.index.isin(recomputed)]
+    merged = pd.concat([kept, new])
+    position = {stat: i for i, stat in enumerate(stats_columns)}
+    order = np.argsort(merged.index.map(position).to_numpy(), kind='stable')
+    return merged.iloc[order]
+
+
+def load_state(path=STATE_PATH, statistics=None):
+    # None when there is no state, or it was written by another version or for other results2 statistics
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        return None
+    if state.get('version') != STATE_VERSION or tuple(state.get('statistics', ())) != tuple(statistics or ()):
+        return None
+    return state
+
+
+def save_state(state, path=STATE_PATH):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        pickle.dump(dict(state, version=STATE_VERSION), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + '.tmp', path)
+
+
+def clear_state(path=STATE_PATH):
+    if os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,142 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Top-N / bottom-N players for every stat. One np.partition per direction over the whole numeric matrix finds
+# each column's N-th value, and one lexsort over the rows at or beyond it orders them the way
+# DataFrame.nlargest/nsmallest(keep='first') would: by value, ties broken by row order.
+#   python rankings.py ../Exercise1/results.csv --n 5 --group-by Team --min-minutes 900
+
+RANKING_COLUMNS = ['Statistic', 'Group', 'Direction', 'Rank', 'First Name', 'Team', 'Position', 'Value']
+GROUP_COLUMNS = {'Team': 'Team', 'Position': 'Position'}
+ALL_PLAYERS = 'all'
+
+
+def primary_position(positions):
+    # "DF,MF" -> "DF"; fbref lists the position a player played most first
+    return positions.astype('string').str.split(',').str[0]
+
+
+def _select(mask, keys, n):
+    # (column, row, rank) of the n smallest `keys` per column among the rows in `mask`, ties by row order
+    columns, rows = np.nonzero(mask.T)
+    order = np.lexsort((rows, keys[rows, columns], columns))
+    columns, rows = columns[order], rows[order]
+    rank = np.arange(len(columns)) - np.searchsorted(columns, columns)
+    keep = rank < n
+    return columns[keep], rows[keep], rank[keep]
+
+
+def rank_matrix(matrix, n):
+    # Returns (counts, top, bottom): counts is the number of values per column; top and bottom are
+    # (column, row, rank) arrays for every column with at least n values
+    n_rows = matrix.shape[0]
+    valid = ~np.isnan(matrix)
+    counts = valid.sum(axis=0)
+    if n < 1 or n_rows < n:
+        empty = (np.empty(0, dtype=np.intp),) * 3
+        return counts, empty, empty
+
+    eligible = valid & (counts >= n)
+    high = np.where(valid, matrix, -np.inf)
+    low = np.where(valid, matrix, np.inf)
+    nth_high = np.partition(high, n_rows - n, axis=0)[n_rows - n]
+    nth_low = np.partition(low, n - 1, axis=0)[n - 1]
+    top = _select(eligible & (matrix >= nth_high), -matrix, n)
+    bottom = _select(eligible & (matrix <= nth_low), matrix, n)
+    return counts, top, bottom
+
+
+def rank_players(df, stats_columns, n=3, group_by=None, min_minutes=0):
+    # Returns (rankings, skipped). rankings has RANKING_COLUMNS, one row per listed player, ordered by stat,
+    # group, top before bottom, then rank; skipped lists (stat, group, count) for sections with fewer than n values
+    if group_by is not None and group_by not in GROUP_COLUMNS:
+        raise ValueError(f"Cannot group by {group_by!r}; choose from {list(GROUP_COLUMNS)}")
+    if min_minutes:
+        df = df[df['Minutes'] >= min_minutes]
+
+    matrix = df[stats_columns].to_numpy(dtype=float, na_value=np.nan)
+    if group_by is None:
+        codes, groups = np.zeros(len(df), dtype=np.intp), [ALL_PLAYERS]
+    else:
+        values = df[GROUP_COLUMNS[group_by]]
+        codes, groups = pd.factorize(primary_position(values) if group_by == 'Position' else values)
+
+    names = df['First Name'].to_numpy(dtype=object)
+    teams = df['Team'].to_numpy(dtype=object)
+    positions = df['Position'].to_numpy(dtype=object) if 'Position' in df else np.full(len(df), None)
+
+    parts, skipped = [], []
+    for g, group in enumerate(groups):
+        members = np.flatnonzero(codes == g)
+        counts, top, bottom = rank_matrix(matrix[members], n)
+        for j in np.flatnonzero(counts < n):
+            skipped.append((stats_columns[j], group, int(counts[j])))
+        for direction, (columns, rows, rank) in enumerate((top, bottom)):
+            parts.append((columns, np.full(len(rows), g), np.full(len(rows), direction), rank, members[rows]))
+
+    if not parts:
+        return pd.DataFrame(columns=RANKING_COLUMNS), skipped
+    columns, group_codes, directions, rank, rows = (np.concatenate(arrays) for arrays in zip(*parts))
+    order = np.lexsort((rank, directions, group_codes, columns))
+    columns, group_codes, directions, rank, rows = (a[order] for a in (columns, group_codes, directions, rank, rows))
+
+    rankings = pd.DataFrame({
+        'Statistic': np.asarray(stats_columns, dtype=object)[columns],
+        'Group': np.asarray(list(groups), dtype=object)[group_codes],
+        'Direction': np.array(['top', 'bottom'])[directions],
+        'Rank': rank + 1,
+        'First Name': names[rows],
+        'Team': teams[rows],
+        'Position': positions[rows],
+        'Value': matrix[rows, columns],
+    })
+    return rankings, skipped
+
+
+def format_report(rankings, n):
+    # The top_3.txt layout; grouped reports add the group to each stat's header
+    lines = []
+    for (stat, group), section in rankings.groupby(['Statistic', 'Group'], sort=False):
+        title = stat.upper() if group == ALL_PLAYERS else f"{stat.upper()} - {group}"
+        lines.append(f"\n{'='*25} {title} {'='*25}\n")
+        for direction, label in (('top', 'Top'), ('bottom', 'Bottom')):
+            rows = section[section['Direction'] == direction]
+            lines.append(f"\n{label} {n}:\n")
+            lines.extend(f"{name} ({team}): {value:.2f}\n"
+                         for name, team, value in zip(rows['First Name'], rows['Team'], rows['Value']))
+    return "".join(lines)
+
+
+def report_paths(output_dir='.', n=3, group_by=None):
+    # top_3.txt / top_3.csv, or e.g. top_5_by_team.txt / .csv
+    stem = f"top_{n}" + (f"_by_{group_by.lower()}" if group_by else "")
+    return os.path.join(output_dir, stem + ".txt"), os.path.join(output_dir, stem + ".csv")
+
+
+def write_rankings(rankings, n, text_path, table_path):
+    with open(text_path, 'w', encoding='utf-8') as f:
+        f.write(format_report(rankings, n))
+    rankings.to_csv(table_path, index=False, encoding='utf-8')
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Exercise1"))
+    from results_data import load_results, split_columns
+
+    parser = argparse.ArgumentParser(description="Top and bottom N players for every stat in results.csv")
+    parser.add_argument("results", nargs="?", default="results.csv")
+    parser.add_argument("--n", type=int, default=3)
+    parser.add_argument("--group-by", choices=list(GROUP_COLUMNS))
+    parser.add_argument("--min-minutes", type=float, default=0)
+    parser.add_argument("--output-dir", default=".")
+    args = parser.parse_args()
+
+    data = load_results(args.results, fraction_columns=['Save%', 'CS%', 'SoT%'])
+    rankings, skipped = rank_players(data, split_columns(data)[1], args.n, args.group_by, args.min_minutes)
+    text_path, table_path = report_paths(args.output_dir, args.n, args.group_by)
+    write_rankings(rankings, args.n, text_path, table_path)
+    print(f"Wrote {len(rankings)} rows to {text_path} and {table_path} ({len(skipped)} sections skipped)")
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+# Per-stat summary statistics for the whole league and for every team, computed with one groupby over all stat
+# columns instead of a boolean mask per (stat, team). Each entry: (row label, reducer, uses per-90 values).
+# A reducer takes either the stat frame or its GroupBy and returns one value per stat column.
+STATISTICS = {
+    'median': ('Median of {stat}', lambda data: data.median(), False),
+    'mean': ('Mean of {stat}', lambda data: data.mean(), False),
+    'std': ('Std of {stat}', lambda data: data.std(), False),
+    'count': ('Count of {stat}', lambda data: data.count(), False),
+    'min': ('Min of {stat}', lambda data: data.min(), False),
+    'max': ('Max of {stat}', lambda data: data.max(), False),
+    'q25': ('25th percentile of {stat}', lambda data: data.quantile(0.25), False),
+    'q75': ('75th percentile of {stat}', lambda data: data.quantile(0.75), False),
+    'mean_per90': ('Mean per 90 of {stat}', lambda data: data.mean(), True),
+    'median_per90': ('Median per 90 of {stat}', lambda data: data.median(), True),
+}
+
+DEFAULT_STATISTICS = ('median', 'mean', 'std')
+
+
+def per90(values, minutes):
+    nineties = minutes.where(minutes > 0) / 90
+    return values.div(nineties, axis=0)
+
+
+def team_statistics(df, stats_columns, statistics=DEFAULT_STATISTICS, group_column='Team'):
+    # Returns the results2.csv table: a 'Statistic' column, then 'all', then one column per team in order of
+    # first appearance, with len(statistics) rows per stat that has at least one value. The index holds each
+    # row's stat column name so callers can replace the rows of single stats.
+    unknown = [name for name in statistics if name not in STATISTICS]
+    if unknown:
+        raise ValueError(f"Unknown statistics {unknown}; choose from {list(STATISTICS)}")
+
+    values = df[stats_columns]
+    valid = values.columns[values.notna().any()].tolist()
+    values = values[valid]
+    groups = df[group_column]
+    teams = groups.unique().tolist()
+
+    sources = {False: values}
+    if any(STATISTICS[name][2] for name in statistics):
+        sources[True] = per90(values, df['Minutes'])
+    # Factorising the team column happens once per source; every reducer reuses the same grouping
+    grouped = {key: frame.groupby(groups, sort=False) for key, frame in sources.items()}
+
+    blocks = []
+    for name in statistics:
+        label, reducer, uses_per90 = STATISTICS[name]
+        overall = reducer(sources[uses_per90]).rename('all')
+        by_team = reducer(grouped[uses_per90]).T.reindex(columns=teams)
+        block = pd.concat([overall, by_team], axis=1)
+        block.insert(0, 'Statistic', [label.format(stat=stat) for stat in block.index])
+        blocks.append(block)
+
+    if not blocks or not valid:
+        return pd.DataFrame(columns=['Statistic', 'all'] + teams)
+
+    # Interleave so each stat's rows stay together in the order the statistics were requested
+    order = np.arange(len(valid) * len(blocks)).reshape(len(blocks), len(valid)).T.ravel()
+    return pd.concat(blocks).iloc[order]
@@ -0,0 +1,85 @@
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+# Ex3 and k_sweep import these on first use; importing them here keeps that one-off cost out of the timed steps
+import sklearn.cluster
+import sklearn.decomposition
+import sklearn.impute
+import sklearn.metrics
+import sklearn.preprocessing
+
+import Ex3
+from k_sweep import best_k, sweep_k
+from position_features import PositionScaler
+
+# Compares Ex3's default pipeline (mean-impute every stat, StandardScaler) with the position-scaled one
+# (position_features.py): scaling, the k sweep and PCA, with wall time, peak traced memory, matrix size and the
+# chosen k's silhouette. Both matrices are dense and the same shape, so runtime and memory should match. Each
+# silhouette is measured in its own feature space; the position-scaled one shrinks the goalkeeping columns, so
+# the silhouettes are not directly comparable.
+#   python bench_features.py [copies]
+# `copies` > 1 stacks that many jittered copies of the players to mimic a multi-league, multi-season input.
+
+
+def enlarge(df, stats_columns, copies, seed=0):
+    if copies <= 1:
+        return df
+    rng = np.random.default_rng(seed)
+    frames = [df]
+    spread = df[stats_columns].std().fillna(0).to_numpy()
+    for _ in range(copies - 1):
+        copy = df.copy()
+        values = copy[stats_columns].to_numpy(dtype=float, na_value=np.nan)
+        copy[stats_columns] = values + rng.normal(0, 0.05, values.shape) * spread
+        frames.append(copy)
+    return pd.concat(frames, ignore_index=True)
+
+
+MODES = ('dense imputed', 'position-scaled')
+
+
+def run(df, stats_columns, mode, k_range):
+    tracemalloc.start()
+    timings = {}
+    start = time.perf_counter()
+    if mode == 'dense imputed':
+        _, _, scaled = Ex3.scale_stats(df, stats_columns, position_mask=False)
+    else:
+        scaler = PositionScaler(stats_columns)
+        scaled = scaler.fit_transform(df[stats_columns].to_numpy(dtype=float, na_value=np.nan), df['Position'])
+    timings['scale'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    sweep, _ = sweep_k(scaled, k_range)
+    timings['k sweep'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    Ex3.make_pca(scaled).fit_transform(scaled)
+    timings['pca'] = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    k = best_k(sweep)
+    return {
+        'mode': mode,
+        **{f'{stage} (s)': round(seconds, 3) for stage, seconds in timings.items()},
+        'peak MB': round(peak / 2 ** 20, 1),
+        'matrix MB': round(scaled.nbytes / 2 ** 20, 2),
+        'best k': k,
+        'silhouette': round(float(sweep.loc[sweep['k'] == k, 'silhouette'].iloc[0]), 4),
+    }
+
+
+if __name__ == "__main__":
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    df, stats_columns = Ex3.load_stats()
+    df = enlarge(df, stats_columns, copies)
+    k_range = range(2, 11) if copies > 1 else Ex3.K_range
+    print(f"{len(df)} players x {len(stats_columns)} stats, k in {k_range.start}..{k_range.stop - 1}, "
+          f"{os.cpu_count()} CPUs")
+    rows = [run(df, stats_columns, mode, k_range) for mode in MODES]
+    print(pd.DataFrame(rows).to_string(index=False))
@@ -0,0 +1,57 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import Ex3
+from similarity import SimilarityIndex
+
+# Build time and query latency of the exact and vantage-point-tree similarity indexes over Ex3's scaled matrix,
+# unfiltered and filtered to one team, with a check that both return the same neighbours.
+#   python bench_similarity.py [copies] [queries]
+# `copies` > 1 stacks that many jittered copies of the players to mimic a multi-league, multi-season input.
+
+
+def enlarge(scaled, players, copies, seed=0):
+    if copies <= 1:
+        return scaled, players
+    rng = np.random.default_rng(seed)
+    matrices = [scaled] + [scaled + rng.normal(0, 0.05, scaled.shape) for _ in range(copies - 1)]
+    return np.vstack(matrices), pd.concat([players] * copies, ignore_index=True)
+
+
+def latency(index, queries, k=10, **filters):
+    timings = []
+    for row in queries:
+        start = time.perf_counter()
+        index.similar(int(row), k, **filters)
+        timings.append(time.perf_counter() - start)
+    return np.percentile(timings, [50, 99]) * 1000
+
+
+if __name__ == "__main__":
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    df, stats_columns = Ex3.load_stats()
+    _, _, scaled = Ex3.scale_stats(df, stats_columns)
+    scaled, players = enlarge(scaled, df, copies)
+    queries = np.random.default_rng(1).integers(0, len(scaled), n_queries)
+    team = players['Team'].iloc[0]
+    print(f"{len(scaled)} players x {scaled.shape[1]} features, {n_queries} queries, {os.cpu_count()} CPUs")
+
+    rows = []
+    indexes = {}
+    for method in ('exact', 'vptree'):
+        index = indexes[method] = SimilarityIndex(scaled, players, method)
+        p50, p99 = latency(index, queries)
+        team_p50, team_p99 = latency(index, queries, team=team)
+        rows.append({'method': method, 'build (s)': round(index.build_seconds, 3),
+                     'p50 (ms)': round(p50, 2), 'p99 (ms)': round(p99, 2),
+                     f'{team} p50 (ms)': round(team_p50, 2), f'{team} p99 (ms)': round(team_p99, 2)})
+    print(pd.DataFrame(rows).to_string(index=False))
+
+    same = all(np.allclose(indexes['exact'].similar(int(row)).Distance, indexes['vptree'].similar(int(row)).Distance)
+               for row in queries[:50])
+    print(f"vptree neighbours match exact search: {same}")
@@ -0,0 +1,145 @@
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from position_features import PositionScaler
+
+# Ex3's fitted pipeline (SimpleImputer -> StandardScaler -> KMeans, plus the 2-component PCA used for the plot),
+# saved so new or updated players can be placed without refitting anything. The file records MODEL_VERSION and
+# a fingerprint of the input schema (stat columns, in order, which of them were divided by 100 and whether the
+# position-aware scaler was used); loading it for a different schema fails instead of silently mis-assigning.
+# assign() only uses the fitted arrays, so a batch costs a few NumPy operations rather than four sklearn calls.
+#   python cluster_model.py ../Exercise1/results.csv --output assignments.csv
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.path.join(script_dir, "model")
+MODEL_PATH = os.path.join(MODEL_DIR, "cluster_model.pkl")
+# Bump when the saved fields or the meaning of the pipeline change
+MODEL_VERSION = 2
+# Ex3 clusters these on a 0-1 scale
+FRACTION_COLUMNS = ['Save%', 'CS%']
+
+
+def schema_fingerprint(stats_columns, fraction_columns=FRACTION_COLUMNS, position_mask=False):
+    schema = {"columns": list(stats_columns), "fraction_columns": [col for col in fraction_columns
+                                                                   if col in stats_columns],
+              "position_mask": bool(position_mask)}
+    return hashlib.sha256(json.dumps(schema, sort_keys=True).encode()).hexdigest()[:16]
+
+
+class ClusterModel:
+    # `imputer` is None when `scaler` is a PositionScaler, which does its own filling and needs players' Position
+    def __init__(self, stats_columns, imputer, scaler, kmeans, pca, fraction_columns=FRACTION_COLUMNS):
+        self.stats_columns = list(stats_columns)
+        self.fraction_columns = [col for col in fraction_columns if col in self.stats_columns]
+        self.position_mask = isinstance(scaler, PositionScaler)
+        self.fingerprint = schema_fingerprint(self.stats_columns, self.fraction_columns, self.position_mask)
+        self.version = MODEL_VERSION
+        self.created_at = time.time()
+        self.imputer = imputer
+        self.scaler = scaler
+        self.kmeans = kmeans
+        self.pca = pca
+        self._prepare()
+
+    def _prepare(self):
+        # SimpleImputer drops columns that were empty when it was fitted; the scaler only saw the others
+        if self.imputer is not None:
+            fill = self.imputer.statistics_
+            self.kept = np.flatnonzero(~np.isnan(fill))
+            self.fill = fill[self.kept]
+        self.mean = self.scaler.mean_
+        self.scale = self.scaler.scale_
+        self.centres = self.kmeans.cluster_centers_
+        self.centre_norms = (self.centres ** 2).sum(axis=1)
+        self.components = self.pca.components_
+        self.pca_offset = self.pca.mean_ @ self.components.T
+
+    @property
+    def n_clusters(self):
+        return len(self.centres)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ('kept', 'fill', 'mean', 'scale', 'centres', 'centre_norms', 'components', 'pca_offset'):
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._prepare()
+
+    def transform(self, players):
+        # Scaled feature matrix for `players` (a frame with the model's stat columns on Ex3's scale)
+        missing = [col for col in self.stats_columns if col not in players]
+        if self.position_mask and 'Position' not in players:
+            missing.append('Position')
+        if missing:
+            raise ValueError(f"Players are missing {len(missing)} columns the model was fitted on: {missing[:5]}")
+        values = players[self.stats_columns].to_numpy(dtype=float, na_value=np.nan)
+        if self.position_mask:
+            return self.scaler.transform(values, players['Position'])
+        values = values[:, self.kept]
+        values = np.where(np.isnan(values), self.fill, values)
+        return (values - self.mean) / self.scale
+
+    def assign(self, players):
+        # Returns a frame indexed like `players` with each player's Cluster and PCA coordinates PC1/PC2
+        scaled = self.transform(players)
+        distances = self.centre_norms - 2 * np.asarray(scaled @ self.centres.T)
+        coordinates = np.asarray(scaled @ self.components.T) - self.pca_offset
+        result = pd.DataFrame(coordinates, index=players.index,
+                              columns=[f"PC{i + 1}" for i in range(coordinates.shape[1])])
+        result.insert(0, "Cluster", distances.argmin(axis=1))
+        return result
+
+    def save(self, path=MODEL_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+        return path
+
+    @classmethod
+    def load(cls, path=MODEL_PATH, stats_columns=None, position_mask=False):
+        # stats_columns/position_mask: the schema the caller will pass to assign(); checked against the fingerprint
+        with open(path, "rb") as f:
+            model = pickle.load(f)
+        if getattr(model, "version", None) != MODEL_VERSION:
+            raise ValueError(f"{path} was saved by model version {getattr(model, 'version', None)}, "
+                             f"expected {MODEL_VERSION}; re-run Ex3.py")
+        expected = None if stats_columns is None else schema_fingerprint(stats_columns, position_mask=position_mask)
+        if expected is not None and expected != model.fingerprint:
+            raise ValueError(f"{path} was fitted on a different set of stat columns; re-run Ex3.py")
+        return model
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.join(script_dir, "..", "Exercise1"))
+    from results_data import load_results
+
+    parser = argparse.ArgumentParser(description="Place players from a results.csv-like file into Ex3's clusters")
+    parser.add_argument("results")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--output", help="CSV to write; prints the assignments when omitted")
+    args = parser.parse_args()
+
+    model = ClusterModel.load(args.model)
+    players = load_results(args.results, fraction_columns=model.fraction_columns)
+    start = time.perf_counter()
+    assignments = model.assign(players)
+    elapsed = time.perf_counter() - start
+    names = [col for col in ('Player', 'First Name', 'Team') if col in players]
+    assignments = pd.concat([players[names], assignments], axis=1)
+    if args.output:
+        assignments.to_csv(args.output, index=False)
+    else:
+        print(assignments.to_string(index=False))
+    print(f"Assigned {len(assignments)} players in {elapsed * 1000:.2f} ms")
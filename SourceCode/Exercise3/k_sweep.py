@@ -0,0 +1,116 @@
+import concurrent.futures
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from threadpoolctl import threadpool_limits
+
+# Model selection for Ex3: fits KMeans for every k in a range and scores each fit with the silhouette.
+# - The k range is split into contiguous chunks run on a process pool; inside a chunk each fit can start from
+#   the previous k's centres plus the point farthest from them (warm start).
+# - Above MINIBATCH_ROWS players MiniBatchKMeans replaces KMeans.
+# - The silhouette is exact up to EXACT_SILHOUETTE_ROWS rows; above that it is the mean over `repeats` fixed-seed
+#   samples of `sample_size` rows, with a 95% band.
+# Small inputs with the defaults reproduce the plain KMeans(random_state=42) loop exactly.
+
+MINIBATCH_ROWS = 20000
+EXACT_SILHOUETTE_ROWS = 5000
+SILHOUETTE_SAMPLE = 2000
+SILHOUETTE_REPEATS = 8
+SEED = 42
+
+_data = None
+
+
+def sampled_silhouette(data, labels, sample_size=SILHOUETTE_SAMPLE, repeats=SILHOUETTE_REPEATS, seed=SEED):
+    # Returns (score, low, high); low == high == score when every row was used
+    from sklearn.metrics import silhouette_score
+
+    if len(np.unique(labels)) < 2:
+        return np.nan, np.nan, np.nan
+    if data.shape[0] <= max(sample_size, EXACT_SILHOUETTE_ROWS):
+        score = silhouette_score(data, labels)
+        return score, score, score
+    rng = np.random.default_rng(seed)
+    scores = []
+    for _ in range(repeats):
+        rows = rng.choice(data.shape[0], sample_size, replace=False)
+        if len(np.unique(labels[rows])) > 1:
+            scores.append(silhouette_score(data[rows], labels[rows]))
+    scores = np.asarray(scores)
+    mean = scores.mean()
+    half_width = 1.96 * scores.std(ddof=1) / np.sqrt(len(scores)) if len(scores) > 1 else 0.0
+    return mean, mean - half_width, mean + half_width
+
+
+def warm_start_centres(data, model):
+    # The previous fit's centres plus the row farthest from all of them, i.e. the one worst served by k - 1 clusters
+    farthest = model.transform(data).min(axis=1).argmax()
+    return np.vstack([model.cluster_centers_, data[farthest]])
+
+
+def make_model(k, minibatch, init=None, seed=SEED):
+    # sklearn is imported here rather than at the top so that importing Ex3 does not load it
+    from sklearn.cluster import KMeans, MiniBatchKMeans
+
+    if minibatch:
+        if init is None:
+            return MiniBatchKMeans(n_clusters=k, random_state=seed, batch_size=4096, n_init=3)
+        return MiniBatchKMeans(n_clusters=k, random_state=seed, batch_size=4096, init=init, n_init=1)
+    if init is None:
+        return KMeans(n_clusters=k, random_state=seed)
+    return KMeans(n_clusters=k, random_state=seed, init=init, n_init=1)
+
+
+def _init_worker(data, threads):
+    # Each worker gets its share of the cores for KMeans' OpenMP loops instead of all of them
+    global _data
+    _data = data
+    threadpool_limits(threads)
+
+
+def _fit_chunk(ks, minibatch, warm_start, sample_size, repeats, seed, data=None):
+    # Fits the consecutive `ks` in order; returns [(row, model)]
+    data = _data if data is None else data
+    results = []
+    previous = None
+    for k in ks:
+        start = time.perf_counter()
+        init = warm_start_centres(data, previous) if warm_start and previous is not None else None
+        model = make_model(k, minibatch, init, seed).fit(data)
+        score, low, high = sampled_silhouette(data, model.labels_, sample_size, repeats, seed)
+        results.append(({'k': k, 'inertia': model.inertia_, 'silhouette': score, 'silhouette_low': low,
+                         'silhouette_high': high, 'seconds': time.perf_counter() - start}, model))
+        previous = model
+    return results
+
+
+def sweep_k(data, k_range=range(2, 21), workers=None, minibatch=None, warm_start=None,
+            sample_size=SILHOUETTE_SAMPLE, repeats=SILHOUETTE_REPEATS, seed=SEED):
+    # Returns (table, models): one row per k with inertia, silhouette and its band and the fit time, and the
+    # fitted model per k. minibatch defaults to more than MINIBATCH_ROWS rows; warm_start defaults to minibatch.
+    data = np.ascontiguousarray(data, dtype=float)
+    ks = list(k_range)
+    minibatch = data.shape[0] > MINIBATCH_ROWS if minibatch is None else minibatch
+    warm_start = minibatch if warm_start is None else warm_start
+    workers = max(1, min(workers or os.cpu_count() or 1, len(ks)))
+
+    if workers == 1:
+        results = _fit_chunk(ks, minibatch, warm_start, sample_size, repeats, seed, data)
+    else:
+        chunks = [chunk.tolist() for chunk in np.array_split(ks, workers)]
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                    initargs=(data, threads)) as executor:
+            futures = [executor.submit(_fit_chunk, chunk, minibatch, warm_start, sample_size, repeats, seed)
+                       for chunk in chunks]
+            results = [result for future in futures for result in future.result()]
+
+    table = pd.DataFrame([row for row, _ in results])
+    models = {row['k']: model for row, model in results}
+    return table, models
+
+
+def best_k(table):
+    return int(table.loc[table['silhouette'].idxmax(), 'k'])
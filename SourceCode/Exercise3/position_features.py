@@ -0,0 +1,72 @@
+import numpy as np
+
+# Position-aware scaling for Ex3. Goalkeeping stats only describe goalkeepers, and the shot / take-on ratios are
+# undefined for goalkeepers (who almost never shoot or dribble); feature_subsets lists the stats each position
+# group has. PositionScaler uses those subsets only to choose which players a stat's mean and std are taken over.
+# Its output is what SimpleImputer(mean) + StandardScaler give, with two differences:
+# - a goalkeeping stat's std is divided by the number of goalkeepers rather than all players, so those columns
+#   come out about sqrt(players / goalkeepers) (~3.5x here) smaller;
+# - an outfield-only ratio is centred and scaled without the few goalkeepers who recorded one, and their values
+#   are replaced by the mean.
+# Clustering and PCA still see every stat for every player: a stat that does not apply is a dense 0 (the mean),
+# exactly as it is after mean-imputation. Per-group clustering, or distances that skip non-applicable stats, were
+# not attempted; with only the GK and Outfield groups the change amounts to down-weighting the goalkeeping stats.
+
+GOALKEEPER_STATS = ['GA90', 'Save%', 'CS%', 'PK Save%']
+OUTFIELD_ONLY_STATS = ['SoT%', 'G/Sh', 'Dist', 'Succ% (Take-Ons)', 'Tkld% (Take-Ons)']
+POSITION_GROUPS = ('GK', 'Outfield')
+
+
+def position_group(positions):
+    # "GK" for goalkeepers (by the first listed position), "Outfield" for everyone else
+    primary = positions.astype('string').str.split(',').str[0]
+    return np.where(primary.fillna('').to_numpy() == 'GK', 'GK', 'Outfield')
+
+
+def feature_subsets(stats_columns):
+    # {position group: [stats that apply to it]}
+    return {
+        'GK': [stat for stat in stats_columns if stat not in OUTFIELD_ONLY_STATS],
+        'Outfield': [stat for stat in stats_columns if stat not in GOALKEEPER_STATS],
+    }
+
+
+def applicability(stats_columns):
+    # (len(POSITION_GROUPS), len(stats_columns)) boolean matrix, row i for POSITION_GROUPS[i]
+    subsets = feature_subsets(stats_columns)
+    return np.array([[stat in subsets[group] for stat in stats_columns] for group in POSITION_GROUPS])
+
+
+class PositionScaler:
+    # SimpleImputer(mean) + StandardScaler with each stat's mean and std taken over the players it applies to;
+    # fit/transform take the raw stat matrix (NaN for missing) and the players' Position strings
+    def __init__(self, stats_columns):
+        self.stats_columns = list(stats_columns)
+        self.applies = applicability(self.stats_columns)
+
+    def _mask(self, positions):
+        # (players, stats) boolean: does the stat apply to the player's position group
+        groups = (position_group(positions) == POSITION_GROUPS[1]).astype(np.intp)
+        return self.applies[groups]
+
+    def fit(self, values, positions):
+        values = np.asarray(values, dtype=float)
+        mask = self._mask(positions)
+        present = mask & ~np.isnan(values)
+        counts = present.sum(axis=0)
+        sums = np.where(present, values, 0.0).sum(axis=0)
+        self.mean_ = np.divide(sums, counts, out=np.zeros(values.shape[1]), where=counts > 0)
+        # Population std over the applicable players, gaps counted at the mean like SimpleImputer + StandardScaler
+        applicable = mask.sum(axis=0)
+        squares = (np.where(present, values - self.mean_, 0.0) ** 2).sum(axis=0)
+        std = np.sqrt(np.divide(squares, applicable, out=np.zeros(values.shape[1]), where=applicable > 0))
+        self.scale_ = np.where(std > 0, std, 1.0)
+        return self
+
+    def transform(self, values, positions):
+        values = np.asarray(values, dtype=float)
+        mask = self._mask(positions)
+        return np.where(mask & ~np.isnan(values), (values - self.mean_) / self.scale_, 0.0)
+
+    def fit_transform(self, values, positions):
+        return self.fit(values, positions).transform(values, positions)
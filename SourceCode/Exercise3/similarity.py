@@ -0,0 +1,202 @@
+import argparse
+import heapq
+import os
+import pickle
+import time
+
+import numpy as np
+
+# "Find a replacement": the k players closest to a given player in Ex3's scaled feature space (Euclidean), with
+# optional team / age / minutes filters. Small inputs are searched exactly with one matrix-vector product; above
+# EXACT_ROWS a vantage-point tree prunes whole subtrees with the triangle inequality, still returning exact
+# neighbours. Filters that leave at most EXACT_ROWS candidates are searched exactly over those rows.
+# The index is saved next to the clustering model with the model's schema fingerprint.
+#   python similarity.py Mohamed --k 5 --team Liverpool --max-age 30 --min-minutes 900
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+INDEX_PATH = os.path.join(script_dir, "model", "similarity_index.pkl")
+INDEX_VERSION = 1
+EXACT_ROWS = 20000
+LEAF_SIZE = 64
+DAYS_PER_YEAR = 365.25
+METADATA_COLUMNS = ['Player', 'Player ID', 'First Name', 'Team', 'Position', 'Age', 'Minutes']
+
+
+def build_vptree(data, leaf_size=LEAF_SIZE, seed=42):
+    # Returns (order, nodes). `order` is a permutation of the rows; node i is
+    # (vantage row, radius, inner child, outer child, leaf start, leaf end) with children -1 for leaves, whose
+    # rows are order[start:end]. Inner children hold the rows within `radius` of the vantage point.
+    rng = np.random.default_rng(seed)
+    order = np.arange(len(data))
+    nodes = []
+    stack = [(0, len(data), None, None)]
+    while stack:
+        start, end, parent, side = stack.pop()
+        node = len(nodes)
+        if parent is not None:
+            nodes[parent][side] = node
+        if end - start <= leaf_size:
+            nodes.append([-1, 0.0, -1, -1, start, end])
+            continue
+        pick = start + rng.integers(end - start)
+        order[[start, pick]] = order[[pick, start]]
+        vantage = order[start]
+        rows = order[start + 1:end]
+        distances = np.sqrt(((data[rows] - data[vantage]) ** 2).sum(axis=1))
+        half = len(rows) // 2
+        split = np.argpartition(distances, half)
+        order[start + 1:end] = rows[split]
+        nodes.append([vantage, float(distances[split[half]]), -1, -1, 0, 0])
+        middle = start + 1 + half
+        stack.append((middle, end, node, 3))
+        stack.append((start + 1, middle, node, 2))
+    return order, np.array(nodes, dtype=float)
+
+
+class SimilarityIndex:
+    def __init__(self, scaled, players, method=None, fingerprint=None, leaf_size=LEAF_SIZE):
+        # scaled: Ex3's scaled matrix; players: the matching rows with METADATA_COLUMNS where present
+        start = time.perf_counter()
+        self.data = np.ascontiguousarray(scaled, dtype=float)
+        self.players = players[[col for col in METADATA_COLUMNS if col in players]].reset_index(drop=True)
+        self.method = method or ("exact" if len(self.data) <= EXACT_ROWS else "vptree")
+        self.fingerprint = fingerprint
+        self.version = INDEX_VERSION
+        self.norms = (self.data ** 2).sum(axis=1)
+        if self.method == "vptree":
+            self.order, self.nodes = build_vptree(self.data, leaf_size)
+        self.build_seconds = time.perf_counter() - start
+
+    def __len__(self):
+        return len(self.data)
+
+    def locate(self, player):
+        # Row of `player`: a row number, a Player ID, or a name matched against Player / First Name
+        if isinstance(player, (int, np.integer)):
+            return int(player)
+        for column in ('Player ID', 'Player', 'First Name'):
+            if column in self.players:
+                matches = np.flatnonzero(self.players[column].astype('string').fillna('').to_numpy() == player)
+                if len(matches) == 1:
+                    return int(matches[0])
+                if len(matches) > 1:
+                    raise ValueError(f"{player!r} matches {len(matches)} players; use a Player ID or row number")
+        raise KeyError(f"No player {player!r}")
+
+    def candidates(self, team=None, min_age=None, max_age=None, min_minutes=None):
+        # Boolean mask of rows passing the filters, or None when there are none; ages are in years
+        mask = np.ones(len(self), dtype=bool)
+        if team is not None:
+            teams = [team] if isinstance(team, str) else list(team)
+            mask &= self.players['Team'].isin(teams).to_numpy()
+        if (min_age is not None or max_age is not None) and 'Age' in self.players:
+            years = self.players['Age'].to_numpy(dtype=float, na_value=np.nan) / DAYS_PER_YEAR
+            if min_age is not None:
+                mask &= years >= min_age
+            if max_age is not None:
+                mask &= years <= max_age
+        if min_minutes is not None:
+            mask &= self.players['Minutes'].to_numpy(dtype=float, na_value=np.nan) >= min_minutes
+        return None if mask.all() else mask
+
+    def _exact(self, query, k, allowed):
+        rows = np.arange(len(self)) if allowed is None else np.flatnonzero(allowed)
+        squared = self.norms[rows] - 2 * self.data[rows] @ query + query @ query
+        if len(rows) > k:
+            best = np.argpartition(squared, k)[:k]
+        else:
+            best = np.arange(len(rows))
+        best = best[np.lexsort((rows[best], squared[best]))]
+        return rows[best], np.sqrt(np.maximum(squared[best], 0))
+
+    def _vptree(self, query, k, allowed):
+        heap = []  # (-distance, row): the k best so far, worst on top
+        tau = np.inf
+        stack = [(0, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            if bound > tau:
+                continue
+            vantage, radius, inner, outer, start, end = self.nodes[node]
+            if inner < 0:
+                rows = self.order[int(start):int(end)]
+                if allowed is not None:
+                    rows = rows[allowed[rows]]
+                distances = np.sqrt(((self.data[rows] - query) ** 2).sum(axis=1))
+            else:
+                vantage = int(vantage)
+                distance = float(np.sqrt(((self.data[vantage] - query) ** 2).sum()))
+                rows, distances = np.array([vantage]), np.array([distance])
+                if allowed is not None and not allowed[vantage]:
+                    rows, distances = rows[:0], distances[:0]
+                if distance < radius:
+                    stack.append((int(outer), radius - distance))
+                    stack.append((int(inner), 0.0))
+                else:
+                    stack.append((int(inner), distance - radius))
+                    stack.append((int(outer), 0.0))
+            for row, d in zip(rows.tolist(), distances.tolist()):
+                if len(heap) < k:
+                    heapq.heappush(heap, (-d, -row))
+                elif d < -heap[0][0]:
+                    heapq.heapreplace(heap, (-d, -row))
+            if len(heap) == k:
+                tau = -heap[0][0]
+        found = sorted((-d, -row) for d, row in heap)
+        return (np.array([row for _, row in found], dtype=np.intp), np.array([d for d, _ in found]))
+
+    def similar(self, player, k=10, team=None, min_age=None, max_age=None, min_minutes=None):
+        # The k players closest to `player` (never the player itself) that pass the filters, nearest first;
+        # Age is shown in years
+        row = self.locate(player)
+        allowed = self.candidates(team, min_age, max_age, min_minutes)
+        allowed = np.ones(len(self), dtype=bool) if allowed is None else allowed.copy()
+        allowed[row] = False
+        query = self.data[row]
+        if self.method == "vptree" and allowed.sum() > EXACT_ROWS:
+            rows, distances = self._vptree(query, k, allowed)
+        else:
+            rows, distances = self._exact(query, k, allowed)
+        result = self.players.iloc[rows].copy()
+        result.insert(0, 'Distance', distances)
+        if 'Age' in result:
+            result['Age'] = (result['Age'] / DAYS_PER_YEAR).round(1)
+        return result.reset_index(drop=True)
+
+    def save(self, path=INDEX_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+        return path
+
+    @classmethod
+    def load(cls, path=INDEX_PATH, fingerprint=None):
+        # fingerprint: the clustering model's; an index built for another schema is rejected
+        with open(path, "rb") as f:
+            index = pickle.load(f)
+        if getattr(index, "version", None) != INDEX_VERSION:
+            raise ValueError(f"{path} was saved by index version {getattr(index, 'version', None)}, "
+                             f"expected {INDEX_VERSION}; re-run Ex3.py")
+        if fingerprint is not None and index.fingerprint != fingerprint:
+            raise ValueError(f"{path} was built for a different clustering model; re-run Ex3.py")
+        return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Players most similar to a given player, from Ex3's index")
+    parser.add_argument("player", help="Player ID, full name or first name (must be unique)")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--team", action="append", help="only players of this team; repeatable")
+    parser.add_argument("--min-age", type=float)
+    parser.add_argument("--max-age", type=float)
+    parser.add_argument("--min-minutes", type=float)
+    parser.add_argument("--index", default=INDEX_PATH)
+    args = parser.parse_args()
+
+    index = SimilarityIndex.load(args.index)
+    start = time.perf_counter()
+    result = index.similar(args.player, args.k, args.team, args.min_age, args.max_age, args.min_minutes)
+    elapsed = time.perf_counter() - start
+    print(result.to_string(index=False))
+    print(f"{index.method} search over {len(index)} players in {elapsed * 1000:.2f} ms")
@@ -1,63 +1,108 @@
 import pandas as pd
 import numpy as np
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 import time
-import re
 import os
-import json
-from bs4 import BeautifulSoup
+import sys
+from collections import Counter
 
 pd.set_option('future.no_silent_downcasting', True)
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
-file_path = os.path.join(script_dir, "..", "Exercise1", "results.csv")
+sys.path.insert(0, os.path.join(script_dir, "..", "Exercise1"))
+from results_data import RESULTS_CSV, load_results
+from instrumentation import stage, start_run
+from kv_cache import open_cache
+from name_matching import NameIndex
+from transfer_crawler import LEAGUE_VALUES_URL, crawl_market_values, parse_market_values
+from value_model import cached_features, format_report, inference_latency, train
+
+start_run("Ex4")
+file_path = RESULTS_CSV
 print(f"Attempting to load file from: {file_path}")  
 
 try:
-    df = pd.read_csv(file_path, encoding='utf-8')
+    # Only these columns reach transfer_values.csv; the full name, when Ex1 wrote one, is used for matching
+    players_df = load_results(file_path)
+    name_column = 'Player' if 'Player' in players_df.columns else 'First Name'
+    df = players_df[list(dict.fromkeys(['First Name', 'Team', 'Position', 'Minutes', name_column]))]
     print("Columns in results.csv:", list(df.columns))
 except FileNotFoundError:
     print(f"Error: {file_path} not found. Please ensure the file is in the specified directory.")
     exit(1)
 
-df['Minutes'] = df['Minutes'].str.replace(',', '').pipe(pd.to_numeric, errors='coerce')
-
 df = df[df['Minutes'] > 900].copy()
 print(f"Number of players with >900 minutes: {len(df)}")
 
 cache_file = os.path.join(script_dir, 'transfer_cache.json')
+ambiguous_file = os.path.join(script_dir, 'transfer_ambiguous_matches.csv')
+# "pages" walks the league's market value list, "clubs" every club's squad page
+CRAWL_MODE = os.environ.get("EX4_CRAWL_MODE", "pages")
+# Set to 0 to skip training the transfer value model (value_model.py)
+TRAIN_MODEL = os.environ.get("EX4_TRAIN_MODEL", "1") != "0"
+# Cached answers are looked up again once they are this old; misses (not found, or matched ambiguously) sooner
+VALUE_TTL = float(os.environ.get("EX4_VALUE_TTL_DAYS", "30")) * 86400
+MISS_TTL = float(os.environ.get("EX4_MISS_TTL_DAYS", "7")) * 86400
+# Cache entries: {"value": millions or None, "status": one of these}, dated by the cache. "no_value" means
+# Transfermarkt lists the player without a market value, which is an answer; the other two are misses.
+FOUND, NO_VALUE, NOT_FOUND, AMBIGUOUS = "found", "no_value", "not_found", "ambiguous"
+
+def is_fresh(entry, age):
+    # Bare values were written before entries carried a status, and a hand-edited entry may lack one; either is
+    # looked up again
+    status = entry.get("status") if isinstance(entry, dict) else None
+    if status is None:
+        return False
+    return age < (VALUE_TTL if status in (FOUND, NO_VALUE) else MISS_TTL)
 
-def load_cache():
-    if os.path.exists(cache_file):
-        with open(cache_file, 'r') as f:
-            return json.load(f)
-    return {}
+def cache_entry(status, value):
+    return {"value": None if value is None or np.isnan(value) else value, "status": status}
 
-def save_cache(data):
-    with open(cache_file, 'w') as f:
-        json.dump(data, f)
+def player_key(name, team):
+    # Cache and merge key; a first name alone is shared by several players, so the team is part of it
+    return f"{name}|{team}"
 
-def scrape_transfer_values(players):
-    cache = load_cache()
-    transfer_values = []
+def migrate_first_name_keys(cache, first_names):
+    # transfer_cache.json used to be keyed by first name alone. Such an entry moves to the "name|team" key of the one
+    # player with that first name, keeping its date; first names several players share cannot be attributed and
+    # are dropped with the rest, so those players are looked up again.
+    legacy = [key for key in cache.keys() if '|' not in key]
+    if not legacy:
+        return
+    counts = Counter(first_names.values())
+    unique = {first_name: key for key, first_name in first_names.items() if counts[first_name] == 1}
+    moved = 0
+    for old_key in legacy:
+        key = unique.get(old_key)
+        if key is not None and key not in cache:
+            value = cache[old_key]
+            if not isinstance(value, dict):
+                # Bare values predate statuses; a missing value meant the player was not found
+                missing = value is None or np.isnan(value)
+                value = cache_entry(NOT_FOUND if missing else FOUND, value)
+            cache.set(key, value, updated_at=cache.updated_at(old_key))
+            moved += 1
+        del cache[old_key]
+    cache.flush()
+    print(f"Migrated {moved} of {len(legacy)} first-name cache entries to name|team keys")
 
-    for player in players:
-        if player in cache:
-            transfer_values.append({
-                'First Name': player,
-                'Transfer_Value_Millions_EUR': cache[player]
-            })
+def write_ambiguous(ambiguous, scraped):
+    rows = [{'Player': entry['name'], 'Team': entry['team'], 'Candidate': scraped[row][0],
+             'Candidate Club': scraped[row][1], 'Candidate Value': scraped[row][2], 'Score': round(score, 3)}
+            for entry in ambiguous for row, score in entry['candidates']]
+    pd.DataFrame(rows, columns=['Player', 'Team', 'Candidate', 'Candidate Club', 'Candidate Value', 'Score']).to_csv(
+        ambiguous_file, index=False, encoding='utf-8')
+    print(f"{len(ambiguous)} ambiguous matches left unassigned; candidates written to {ambiguous_file}")
 
-    players_to_scrape = [p for p in players if p not in cache]
-    if not players_to_scrape:
-        print("All players found in cache.")
-        return pd.DataFrame(transfer_values)
+def browser_market_values(url=LEAGUE_VALUES_URL):
+    # First page of the market value list through Chrome, for when plain HTTP requests are turned away. selenium
+    # is imported here, so runs answered from the cache or over HTTP do not pay for it
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.chrome.options import Options
+    from webdriver_manager.chrome import ChromeDriverManager
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
 
     options = Options()
     options.add_argument("--headless")
@@ -68,73 +113,82 @@ def scrape_transfer_values(players):
 
     driver = None
     try:
-        url = "https://www.transfermarkt.com/premier-league/marktwerte/wettbewerb/GB1"
-        print(f"Scraping URL: {url}")
-
+        print(f"Scraping URL with the browser: {url}")
         driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
         driver.get(url)
-
         WebDriverWait(driver, 10).until(
             EC.presence_of_element_located((By.CSS_SELECTOR, "table.items"))
         )
+        return parse_market_values(driver.page_source)
+    finally:
+        if driver:
+            driver.quit()
 
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
-        table = soup.select_one("table.items")
-        if not table:
-            print("No player table found.")
-            return pd.DataFrame(transfer_values)
-
-        rows = table.select("tr.odd, tr.even")
-        for row in rows:
-            name_tag = row.select_one("td.hauptlink a")
-            value_tag = row.select_one("td.rechts.hauptlink")
-            if name_tag and value_tag:
-                name = name_tag.get_text(strip=True)
-                value_text = value_tag.get_text(strip=True)
-                value = re.sub(r'[^\d.]', '', value_text)
-                value = float(value) if value else np.nan
-                if 'k' in value_text.lower():
-                    value /= 1000
-                elif 'bn' in value_text.lower():
-                    value *= 1000
-                for player in players_to_scrape:
-                    if name.lower() in player.lower() or player.lower() in name.lower():
-                        transfer_values.append({
-                            'First Name': player,
-                            'Transfer_Value_Millions_EUR': value
-                        })
-                        cache[player] = value
-                        save_cache(cache)
-                        break
-
-        for player in players_to_scrape:
-            if player not in cache:
-                transfer_values.append({
-                    'First Name': player,
-                    'Transfer_Value_Millions_EUR': np.nan
-                })
-                cache[player] = np.nan
-                save_cache(cache)
+def scrape_transfer_values(players, first_names):
+    # players: [(key, name, team)]; first_names: {key: First Name}. Returns a frame with 'Player Key' and
+    # 'Transfer_Value_Millions_EUR'
+    with stage("cache_load", cache="transfer"):
+        cache = open_cache(cache_file)
+    with cache:
+        migrate_first_name_keys(cache, first_names)
+        now = time.time()
+        players_to_scrape = [player for player in players
+                             if player[0] not in cache or not is_fresh(cache[player[0]], cache.age(player[0], now))]
 
+        if not players_to_scrape:
+            print("All players found in cache.")
+        else:
+            update_cache(cache, players_to_scrape)
+
+        transfer_values = [{'Player Key': key, 'Transfer_Value_Millions_EUR': cache.get(key).get("value")}
+                           for key, _, _ in players if isinstance(cache.get(key), dict)]
+    return pd.DataFrame(transfer_values, columns=['Player Key', 'Transfer_Value_Millions_EUR']).astype(
+        {'Transfer_Value_Millions_EUR': float})
+
+def update_cache(cache, players_to_scrape):
+    statuses = {}
+    scraped = []
+    try:
+        scraped, stats = crawl_market_values(CRAWL_MODE)
+        print(f"Crawled {len(scraped)} listed players from {stats['pages']} pages "
+              f"({stats['failed']} failed) in {stats['seconds']:.2f}s")
+        if not scraped:
+            scraped = browser_market_values()
+        if not scraped:
+            print("No player table found.")
+        else:
+            with stage("merge", step="name_match") as matched:
+                index = NameIndex(players_to_scrape)
+                found, ambiguous = index.match([(name, club) for name, club, _ in scraped])
+                matched.rows = len(scraped)
+            for key, (row, _) in found.items():
+                value = scraped[row][2]
+                statuses[key] = (NO_VALUE if np.isnan(value) else FOUND, value)
+            for entry in ambiguous:
+                statuses[entry['key']] = (AMBIGUOUS, None)
+            if ambiguous:
+                write_ambiguous(ambiguous, scraped)
     except Exception as e:
         print(f"Error scraping Transfermarkt: {e}")
-        for player in players_to_scrape:
-            if player not in cache:
-                transfer_values.append({
-                    'First Name': player,
-                    'Transfer_Value_Millions_EUR': np.nan
-                })
-                cache[player] = np.nan
-                save_cache(cache)
-    finally:
-        if driver:
-            driver.quit()
 
-    return pd.DataFrame(transfer_values)
+    # Without a listing a miss says nothing, so nothing is cached and the players are tried again next run
+    if scraped:
+        with stage("cache_save", cache="transfer") as saved:
+            saved.rows = len(players_to_scrape)
+            cache.update({key: cache_entry(*statuses.get(key, (NOT_FOUND, None))) for key, _, _ in players_to_scrape})
+            cache.flush()
+        counts = pd.Series([cache[key]["status"] for key, _, _ in players_to_scrape]).value_counts()
+        print(f"Looked up {len(players_to_scrape)} players: "
+              + ", ".join(f"{n} {status}" for status, n in counts.items()))
 
-transfer_df = scrape_transfer_values(df['First Name'].unique())
+df['Player Key'] = [player_key(name, team) for name, team in zip(df[name_column], df['Team'])]
+players = list(dict.fromkeys(zip(df['Player Key'], df[name_column], df['Team'])))
+transfer_df = scrape_transfer_values(players, dict(zip(df['Player Key'], df['First Name'])))
 
-result_df = df.merge(transfer_df, on='First Name', how='left')
+# Keys are unique in transfer_df, so this is the left merge on 'Player Key' with df's index (and row order) kept
+df['Transfer_Value_Millions_EUR'] = df['Player Key'].map(
+    transfer_df.set_index('Player Key')['Transfer_Value_Millions_EUR'])
+result_df = df
 
 try:
     result_df[['First Name', 'Team', 'Position', 'Minutes', 'Transfer_Value_Millions_EUR']].to_csv(
@@ -151,9 +205,30 @@ except PermissionError as e:
         print(f"Transfer values saved to {alternative_path}")
     except Exception as e2:
         print(f"Error saving to alternative location: {e2}")
+        sys.exit(1)
 except Exception as e:
     print(f"Error saving file: {e}")
+    sys.exit(1)
 
+if TRAIN_MODEL:
+    # The regression the explanation below describes, trained on the players with a known value
+    try:
+        players = players_df.loc[result_df.index].assign(
+            Transfer_Value_Millions_EUR=result_df['Transfer_Value_Millions_EUR'])
+        features = cached_features(players, file_path)
+        value_model = train(players, features)
+        value_model.save()
+        latency = inference_latency(value_model, players, features)
+        report = format_report(value_model, len(players), latency)
+        with open(os.path.join(script_dir, 'transfer_value_model.txt'), 'w', encoding='utf-8') as f:
+            f.write(report)
+        print(report, end="")
+        predictions = result_df[['First Name', 'Team', 'Position', 'Minutes', 'Transfer_Value_Millions_EUR']].assign(
+            Predicted_Value_Millions_EUR=value_model.predict(players, features).round(2))
+        predictions.to_csv(os.path.join(script_dir, 'transfer_value_predictions.csv'), index=False, encoding='utf-8')
+        print("Predictions saved to transfer_value_predictions.csv")
+    except ValueError as e:
+        print(f"Skipping the transfer value model: {e}")
 
 with open(os.path.join(script_dir, 'transfer_value_explanation.txt'), 'w', encoding='utf-8') as f:
     f.write("=== Phương pháp cải tiến ước lượng giá trị ===\n\n")
@@ -195,7 +270,7 @@ with open(os.path.join(script_dir, 'transfer_value_explanation.txt'), 'w', encod
     f.write("- Cân bằng giữa performance hiện tại và tiềm năng phát triển [4][9]\n")
     f.write("- Giải thích được feature importance qua SHAP values [3][8]\n")
     f.write("\n\n")
-with open('transfer_value_explanation1.txt', 'w', encoding='utf-8') as f:
+with open(os.path.join(script_dir, 'transfer_value_explanation1.txt'), 'w', encoding='utf-8') as f:
     f.write("=== Phương pháp ước lượng giá trị chuyển nhượng cầu thủ ===\n\n")
     f.write("1. Lựa chọn đặc trưng:\n")
     f.write("- Tuổi, Vị trí, Số phút thi đấu, Goals, Assists, xG, Tkl, PrgP, Save%, Quốc tịch, Đội bóng.\n")
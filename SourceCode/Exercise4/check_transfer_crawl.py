@@ -0,0 +1,130 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+
+import transfer_crawler
+from fixture_server import start_fixture_server
+from name_matching import NameIndex
+from transfer_crawler import crawl_market_values
+
+# Offline check of Ex4's Transfermarkt crawl against the pages saved in fixtures/, served by Ex1's
+# fixture_server.py.
+# - "pages": the market value list spans three pages; page 1's pager must lead the crawl to pages 2 and 3, and
+#   the player repeated on page 2 (the list shifted mid-crawl) must be kept once.
+# - "clubs": the league overview links four clubs. Three squad pages are saved; the fourth answers 404 and must
+#   count as failed. Squad rows carry no club link, so they take the club from the overview, and they list a
+#   player below the market value list's cut-off.
+# The crawled rows are then matched to fbref players as Ex4 does. A player listed with "-" must come out
+# no_value, and a player on no page not_found.
+#   python check_transfer_crawl.py [fixtures_dir]
+# Exits with status 1 when any expectation fails.
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(script_dir, "fixtures")
+# The statuses Ex4.update_cache gives a looked-up player
+FOUND, NO_VALUE, NOT_FOUND, AMBIGUOUS = "found", "no_value", "not_found", "ambiguous"
+# mode -> (pages fetched, pages failed, {(name, club): value in millions})
+EXPECTED_CRAWL = {
+    "pages": (3, 0, {
+        ("Erling Haaland", "Manchester City"): 180.0,
+        ("Bukayo Saka", "Arsenal FC"): 140.0,
+        ("Martin Ødegaard", "Arsenal FC"): 90.0,
+        ("Mohamed Salah", "Liverpool FC"): 55.0,
+        ("Stefan Ortega", "Manchester City"): 0.8,
+        ("Alisson", "Liverpool FC"): np.nan,
+    }),
+    "clubs": (5, 1, {
+        ("Erling Haaland", "Manchester City"): 180.0,
+        ("Bukayo Saka", "Arsenal FC"): 140.0,
+        ("Martin Ødegaard", "Arsenal FC"): 90.0,
+        ("Mohamed Salah", "Liverpool FC"): 55.0,
+        ("Stefan Ortega", "Manchester City"): 0.8,
+        ("Scott Carson", "Manchester City"): 0.3,
+        ("Alisson", "Liverpool FC"): np.nan,
+    }),
+}
+# fbref players as Ex4 looks them up: (key, name, team), and their status per mode
+PLAYERS = [
+    ("Erling Haaland|Manchester City", "Erling Haaland", "Manchester City"),
+    ("Martin Ødegaard|Arsenal", "Martin Ødegaard", "Arsenal"),
+    ("Stefan Ortega|Manchester City", "Stefan Ortega", "Manchester City"),
+    ("Alisson|Liverpool", "Alisson", "Liverpool"),
+    ("Scott Carson|Manchester City", "Scott Carson", "Manchester City"),
+    ("Myles Lewis-Skelly|Arsenal", "Myles Lewis-Skelly", "Arsenal"),
+]
+EXPECTED_STATUS = {
+    "pages": {"Erling Haaland|Manchester City": FOUND, "Martin Ødegaard|Arsenal": FOUND,
+              "Stefan Ortega|Manchester City": FOUND, "Alisson|Liverpool": NO_VALUE,
+              "Scott Carson|Manchester City": NOT_FOUND, "Myles Lewis-Skelly|Arsenal": NOT_FOUND},
+    "clubs": {"Erling Haaland|Manchester City": FOUND, "Martin Ødegaard|Arsenal": FOUND,
+              "Stefan Ortega|Manchester City": FOUND, "Alisson|Liverpool": NO_VALUE,
+              "Scott Carson|Manchester City": FOUND, "Myles Lewis-Skelly|Arsenal": NOT_FOUND},
+}
+
+
+def same_value(a, b):
+    return (np.isnan(a) and np.isnan(b)) or a == b
+
+
+def check_crawl(rows, stats, expected_pages, expected_failed, expected):
+    # Failure messages for one crawl; empty when it passes
+    failures = []
+    if stats["pages"] != expected_pages or stats["failed"] != expected_failed:
+        failures.append(f"fetched {stats['pages']} pages ({stats['failed']} failed), "
+                        f"expected {expected_pages} ({expected_failed} failed)")
+    listed = {(name, club): value for name, club, value in rows}
+    if len(rows) != len(listed):
+        failures.append(f"{len(rows) - len(listed)} duplicate rows were kept")
+    if set(listed) != set(expected):
+        failures.append(f"crawled {sorted(listed)}, expected {sorted(expected)}")
+    for listing, value in expected.items():
+        if listing in listed and not same_value(listed[listing], value):
+            failures.append(f"{listing[0]} ({listing[1]}) is worth {listed[listing]!r}, expected {value!r}")
+    return failures
+
+
+def check_statuses(rows, expected):
+    # Matches the crawled rows to PLAYERS and compares each player's status with `expected`
+    found, ambiguous = NameIndex(PLAYERS).match([(name, club) for name, club, _ in rows])
+    statuses = {key: NO_VALUE if np.isnan(rows[row][2]) else FOUND for key, (row, _) in found.items()}
+    statuses.update({entry['key']: AMBIGUOUS for entry in ambiguous})
+    failures = []
+    for key, _, _ in PLAYERS:
+        status = statuses.get(key, NOT_FOUND)
+        if status != expected[key]:
+            failures.append(f"{key} is {status}, expected {expected[key]}")
+    return failures
+
+
+def run_checks(directory=FIXTURES_DIR):
+    # {check name: [failure messages]}, against a fixture server started for the run
+    server, url = start_fixture_server(directory)
+    base_url, min_interval = transfer_crawler.BASE_URL, transfer_crawler.rate_limiter.min_interval
+    transfer_crawler.BASE_URL, transfer_crawler.rate_limiter.min_interval = url, 0
+    results = {}
+    try:
+        for mode, (pages, failed, expected) in EXPECTED_CRAWL.items():
+            rows, stats = crawl_market_values(mode)
+            results[f"{mode} crawl"] = check_crawl(rows, stats, pages, failed, expected)
+            results[f"{mode} statuses"] = check_statuses(rows, EXPECTED_STATUS[mode])
+    finally:
+        transfer_crawler.BASE_URL, transfer_crawler.rate_limiter.min_interval = base_url, min_interval
+        server.shutdown()
+        server.server_close()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check Ex4's Transfermarkt crawl against saved pages")
+    parser.add_argument("directory", nargs="?", default=FIXTURES_DIR)
+    args = parser.parse_args()
+
+    results = run_checks(args.directory)
+    for name, failures in results.items():
+        print(f"{'ok' if not failures else 'FAILED':<7} {name}")
+        for failure in failures:
+            print(f"        {failure}")
+    if any(results.values()):
+        sys.exit(1)
@@ -0,0 +1,191 @@
+import argparse
+import difflib
+import re
+import unicodedata
+from collections import defaultdict
+
+# Matches names scraped from Transfermarkt against Ex1's players. The index is built once from the players' full
+# names (Ex1's "Player" column; older results.csv files only carry First Name): names are accent-folded and split
+# into tokens, players are blocked by team, and only players sharing a token prefix with the scraped name are
+# scored. A pair is accepted when its score reaches MATCH_THRESHOLD and no other candidate on either side comes
+# within AMBIGUITY_MARGIN of it; close calls are returned as ambiguous instead of taking the first hit.
+#   python name_matching.py "Gabriel Martinelli" --team Arsenal --player "Gabriel Magalhães|Arsenal" \
+#       --player "Gabriel Martinelli|Arsenal"
+
+MATCH_THRESHOLD = 0.8
+AMBIGUITY_MARGIN = 0.05
+TEAM_THRESHOLD = 0.75
+# Teams tied on token overlap are told apart by whole-name similarity only when the best is this much ahead
+TEAM_TIE_MARGIN = 0.1
+# Tokens of two names this close are treated as spelling variants (Mohammed / Mohamed)
+TOKEN_SIMILARITY = 0.8
+PREFIX_LENGTH = 4
+# Letters NFKD does not decompose into a base letter + combining mark
+SPECIAL_LETTERS = str.maketrans({'ø': 'o', 'Ø': 'O', 'ł': 'l', 'Ł': 'L', 'đ': 'd', 'Đ': 'D', 'ð': 'd', 'ß': 'ss',
+                                 'æ': 'ae', 'Æ': 'AE', 'œ': 'oe', 'Œ': 'OE', 'ı': 'i', 'þ': 'th', 'Þ': 'Th'})
+# fbref's short club names and Transfermarkt's full ones, token by token
+TEAM_ALIASES = {'utd': ['united'], 'nottham': ['nottingham'], 'wolves': ['wolverhampton', 'wanderers'],
+                'spurs': ['tottenham', 'hotspur'], 'man': ['manchester']}
+TEAM_STOPWORDS = {'fc', 'afc', 'cf', 'the'}
+
+
+def fold(text):
+    # "Martin Ødegaard" -> "martin odegaard"; apostrophes are dropped, other punctuation splits tokens
+    text = unicodedata.normalize('NFKD', str(text).translate(SPECIAL_LETTERS))
+    text = ''.join(char for char in text if not unicodedata.combining(char)).lower()
+    text = re.sub(r"['’`]", '', text)
+    return ' '.join(re.findall(r'[a-z0-9]+', text))
+
+
+def name_tokens(name):
+    return fold(name).split()
+
+
+def team_tokens(team):
+    tokens = []
+    for token in name_tokens(team):
+        if token not in TEAM_STOPWORDS:
+            tokens.extend(TEAM_ALIASES.get(token, [token]))
+    return tokens
+
+
+def team_score(a, b):
+    # Share of the shorter club name's tokens (sets of team_tokens) found in the other one
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+
+def team_similarity(a, b):
+    # difflib ratio of two club names given as token sets, for teams team_score cannot tell apart
+    return difflib.SequenceMatcher(None, ' '.join(sorted(a)), ' '.join(sorted(b))).ratio()
+
+
+def token_similarity(a, b):
+    if a == b:
+        return 1.0
+    ratio = difflib.SequenceMatcher(None, a, b).ratio()
+    return ratio if ratio >= TOKEN_SIMILARITY else 0.0
+
+
+def name_score(a_tokens, b_tokens):
+    # 0..1: how well the shorter name's tokens are covered by the longer one's (a first name alone fully covers
+    # "First Last"), blended with the similarity of the whole folded strings so closer spellings win ties
+    if not a_tokens or not b_tokens:
+        return 0.0
+    shorter, longer = sorted((a_tokens, b_tokens), key=len)
+    coverage = sum(max(token_similarity(token, other) for other in longer) for token in shorter) / len(shorter)
+    whole = difflib.SequenceMatcher(None, ' '.join(a_tokens), ' '.join(b_tokens)).ratio()
+    return 0.75 * coverage + 0.25 * whole
+
+
+class NameIndex:
+    # players: iterable of (key, name, team). match() takes scraped (name, club) pairs, club possibly None.
+    def __init__(self, players):
+        self.keys, self.names, self.teams, self.tokens = [], [], [], []
+        self.by_team = defaultdict(set)
+        self.by_prefix = defaultdict(set)
+        for key, name, team in players:
+            player = len(self.keys)
+            tokens = name_tokens(name)
+            self.keys.append(key)
+            self.names.append(name)
+            self.teams.append(team)
+            self.tokens.append(tokens)
+            self.by_team[team].add(player)
+            for token in tokens:
+                self.by_prefix[token[:PREFIX_LENGTH]].add(player)
+        # Club tokens -> teams, so a scraped club is only scored against the teams sharing a token with it (any
+        # other team scores 0) instead of against every team
+        self.team_token_sets = {team: frozenset(team_tokens(team)) for team in self.by_team}
+        self.by_team_token = defaultdict(set)
+        for team, tokens in self.team_token_sets.items():
+            for token in tokens:
+                self.by_team_token[token].add(team)
+        self._club_teams = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def team_for(self, club):
+        # The indexed team a scraped club name refers to, or None when there is no clear single best one
+        if club is None:
+            return None
+        if club not in self._club_teams:
+            tokens = set(team_tokens(club))
+            shortlist = set().union(*(self.by_team_token.get(token, ()) for token in tokens))
+            scores = {team: team_score(tokens, self.team_token_sets[team]) for team in shortlist}
+            best_score = max(scores.values(), default=0.0)
+            tied = [team for team, score in scores.items() if score == best_score]
+            best = None
+            if best_score >= TEAM_THRESHOLD:
+                if len(tied) == 1:
+                    best = tied[0]
+                else:
+                    ratios = sorted(((team_similarity(tokens, self.team_token_sets[team]), team) for team in tied),
+                                    key=lambda item: -item[0])
+                    if ratios[0][0] - ratios[1][0] >= TEAM_TIE_MARGIN:
+                        best = ratios[0][1]
+            self._club_teams[club] = best
+        return self._club_teams[club]
+
+    def candidates(self, tokens, team=None):
+        # Players sharing at least one token prefix with `tokens`, limited to `team` when it is known
+        found = set()
+        for token in tokens:
+            found |= self.by_prefix.get(token[:PREFIX_LENGTH], set())
+        if team is not None:
+            found &= self.by_team[team]
+        return found
+
+    def scores(self, name, club=None):
+        # [(score, player)] for every candidate of one scraped row, best first
+        tokens = name_tokens(name)
+        team = self.team_for(club)
+        scored = [(name_score(tokens, self.tokens[player]), player) for player in self.candidates(tokens, team)]
+        return sorted(scored, key=lambda item: (-item[0], item[1]))
+
+    def match(self, rows):
+        # rows: [(name, club)]. Returns (matches, ambiguous):
+        #   matches   {player key: (row number, score)}
+        #   ambiguous [{'key', 'name', 'team', 'candidates': [(row number, score)]}] for players whose best row
+        #             was not a clear winner, or whose best row fits another player about as well
+        by_player = defaultdict(list)
+        by_row = defaultdict(list)
+        for row, (name, club) in enumerate(rows):
+            for score, player in self.scores(name, club):
+                if score >= MATCH_THRESHOLD - AMBIGUITY_MARGIN:
+                    by_player[player].append((score, row))
+                    by_row[row].append((score, player))
+
+        matches, ambiguous = {}, []
+        for player, scored in by_player.items():
+            scored.sort(key=lambda item: (-item[0], item[1]))
+            best, row = scored[0]
+            if best < MATCH_THRESHOLD:
+                continue
+            rivals = [(score, row) for score, row in scored[1:] if best - score < AMBIGUITY_MARGIN]
+            rivals += [(score, other) for score, other in by_row[row]
+                       if other != player and best - score < AMBIGUITY_MARGIN and score >= MATCH_THRESHOLD]
+            if rivals:
+                ambiguous.append({'key': self.keys[player], 'name': self.names[player], 'team': self.teams[player],
+                                  'candidates': [(row, score) for score, row in scored
+                                                 if best - score < AMBIGUITY_MARGIN]})
+            else:
+                matches[self.keys[player]] = (row, best)
+        return matches, ambiguous
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score a scraped name against players given as NAME|TEAM")
+    parser.add_argument("name")
+    parser.add_argument("--team", help="club shown next to the scraped name")
+    parser.add_argument("--player", action="append", default=[], help="NAME|TEAM; repeatable")
+    args = parser.parse_args()
+
+    index = NameIndex((entry, *entry.split('|', 1)) for entry in args.player)
+    print(f"Team block: {index.team_for(args.team)}")
+    for score, player in index.scores(args.name, args.team):
+        print(f"{score:.3f}  {index.names[player]} ({index.teams[player]})")
+    matches, ambiguous = index.match([(args.name, args.team)])
+    print(f"Matched: {list(matches) or 'none'}; ambiguous: {[entry['key'] for entry in ambiguous] or 'none'}")
@@ -0,0 +1,173 @@
+import argparse
+import concurrent.futures
+import logging
+import os
+import re
+import sys
+import time
+from urllib.parse import urljoin, urlsplit
+
+import numpy as np
+import pandas as pd
+import requests
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(script_dir, "..", "Exercise1"))
+from http_fetch import HostRateLimiter, get_session, save_page
+from instrumentation import stage
+
+# Crawls Transfermarkt's Premier League market values over plain HTTP: every page of the league's market value
+# list ("pages"), or every club's squad page ("clubs", which also lists players below the league list's cut-off).
+# Page 1 tells how many pages / which clubs there are; the rest are fetched concurrently through Ex1's pooled
+# session, spaced per host by a rate limiter.
+# Run offline against saved pages with Ex1's fixture server:
+#   TRANSFERMARKT_SAVE_PAGES=tm_pages python transfer_crawler.py          # snapshot a live crawl
+#   python ../Exercise1/fixture_server.py tm_pages 8766
+#   TRANSFERMARKT_BASE_URL=http://127.0.0.1:8766 python Ex4.py
+# fixtures/ holds trimmed list, overview and squad pages that check_transfer_crawl.py runs both modes against.
+
+TRANSFERMARKT_ORIGIN = "https://www.transfermarkt.com"
+BASE_URL = os.environ.get("TRANSFERMARKT_BASE_URL", TRANSFERMARKT_ORIGIN).rstrip("/")
+SAVE_PAGES_DIR = os.environ.get("TRANSFERMARKT_SAVE_PAGES")
+MIN_REQUEST_INTERVAL = float(os.environ.get("TRANSFERMARKT_MIN_INTERVAL", "2"))
+WORKERS = 4
+LEAGUE_VALUES_URL = TRANSFERMARKT_ORIGIN + "/premier-league/marktwerte/wettbewerb/GB1"
+LEAGUE_CLUBS_URL = TRANSFERMARKT_ORIGIN + "/premier-league/startseite/wettbewerb/GB1"
+MODES = ("pages", "clubs")
+
+rate_limiter = HostRateLimiter(MIN_REQUEST_INTERVAL)
+
+
+def resolve_url(url):
+    if BASE_URL != TRANSFERMARKT_ORIGIN and url.startswith(TRANSFERMARKT_ORIGIN):
+        return BASE_URL + url[len(TRANSFERMARKT_ORIGIN):]
+    return url
+
+
+def fetch_page(url, timeout=20):
+    # HTML of one Transfermarkt page, or None when the request fails
+    resolved = resolve_url(url)
+    rate_limiter.wait(resolved)
+    start = time.perf_counter()
+    try:
+        with stage("fetch", host=urlsplit(resolved).netloc, via="http") as fetched:
+            response = get_session(pool_size=WORKERS).get(resolved, timeout=timeout)
+            fetched.bytes = len(response.content)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        logging.warning(f"HTTP fetch failed for {resolved}: {e}")
+        return None
+    logging.info(f"Fetched {resolved} in {time.perf_counter() - start:.2f}s ({len(response.content)} bytes)")
+    if SAVE_PAGES_DIR:
+        save_page(SAVE_PAGES_DIR, url, response.text)
+    return response.text
+
+
+def parse_value(value_text):
+    # "€1.50m" -> 1.5, "€800k" -> 0.8, "€1.10bn" -> 1100.0; "-" (no market value) -> NaN
+    value = re.sub(r'[^\d.]', '', value_text)
+    value = float(value) if value else np.nan
+    if 'k' in value_text.lower():
+        value /= 1000
+    elif 'bn' in value_text.lower():
+        value *= 1000
+    return value
+
+
+def make_soup(html):
+    # bs4 is imported on the first page parsed: Ex4 runs answered from transfer_cache.json never load it
+    from bs4 import BeautifulSoup
+
+    return BeautifulSoup(html, 'html.parser')
+
+
+def parse_market_values(html, club=None):
+    # [(name, club or None, value in millions)] for every row of a market value or squad table; `club` is used
+    # for rows that do not link their club (squad pages)
+    with stage("parse", source="transfermarkt") as parsed:
+        parsed.bytes = len(html)
+        soup = make_soup(html)
+        table = soup.select_one("table.items")
+        if not table:
+            return []
+        scraped = []
+        for row in table.select("tr.odd, tr.even"):
+            name_tag = row.select_one("td.hauptlink a")
+            value_tag = row.select_one("td.rechts.hauptlink")
+            if name_tag and value_tag:
+                club_tag = row.select_one('a[href*="/verein/"][title], a[href*="/verein/"] img[alt]')
+                row_club = (club_tag.get('title') or club_tag.get('alt')) if club_tag else club
+                scraped.append((name_tag.get_text(strip=True), row_club,
+                                parse_value(value_tag.get_text(strip=True))))
+        parsed.rows = len(scraped)
+    return scraped
+
+
+def page_urls(html, url):
+    # URLs of pages 2..N of a paginated list, N read from the pager's links
+    numbers = [int(match.group(1)) for link in make_soup(html).select('a[href*="/page/"]')
+               if (match := re.search(r'/page/(\d+)', link['href']))]
+    return [f"{url}/page/{number}" for number in range(2, max(numbers, default=1) + 1)]
+
+
+def club_squad_urls(html):
+    # {club name: squad page URL} for every club linked from a league overview page
+    clubs = {}
+    for link in make_soup(html).select('a[href*="/startseite/verein/"][title]'):
+        path = urlsplit(urljoin(TRANSFERMARKT_ORIGIN, link['href'])).path
+        clubs.setdefault(link['title'], TRANSFERMARKT_ORIGIN + path.replace('/startseite/', '/kader/', 1))
+    return clubs
+
+
+def crawl_market_values(mode="pages", workers=WORKERS):
+    # Returns (rows, stats): rows as parse_market_values gives them, de-duplicated; stats counts pages fetched
+    # and failed. An empty first page (blocked, or the layout changed) ends the crawl with no rows.
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}, got {mode!r}")
+    start = time.perf_counter()
+    first_url = LEAGUE_VALUES_URL if mode == "pages" else LEAGUE_CLUBS_URL
+    first = fetch_page(first_url)
+    stats = {"pages": 1, "failed": int(first is None), "seconds": time.perf_counter() - start}
+    if first is None:
+        return [], stats
+
+    if mode == "pages":
+        rows = parse_market_values(first)
+        if not rows:
+            return [], stats
+        targets = [(url, None) for url in page_urls(first, first_url)]
+    else:
+        rows = []
+        targets = [(url, club) for club, url in club_squad_urls(first).items()]
+        if not targets:
+            return [], stats
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        pages = executor.map(lambda target: fetch_page(target[0]), targets)
+        for (url, club), html in zip(targets, pages):
+            stats["pages"] += 1
+            if html is None:
+                stats["failed"] += 1
+                continue
+            rows.extend(parse_market_values(html, club))
+
+    # A player can be listed twice when pages shift mid-crawl; (name, club) identifies a listing
+    unique = {}
+    for row in rows:
+        unique.setdefault(row[:2], row)
+    stats["seconds"] = time.perf_counter() - start
+    return list(unique.values()), stats
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Crawl Transfermarkt's Premier League market values")
+    parser.add_argument("--mode", choices=MODES, default="pages")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--output", help="CSV to write; prints a summary only when omitted")
+    args = parser.parse_args()
+
+    rows, stats = crawl_market_values(args.mode, args.workers)
+    print(f"{len(rows)} players from {stats['pages']} pages ({stats['failed']} failed) in {stats['seconds']:.2f}s")
+    if args.output:
+        pd.DataFrame(rows, columns=['Name', 'Club', 'Value']).to_csv(args.output, index=False)
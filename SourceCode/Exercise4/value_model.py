@@ -0,0 +1,221 @@
+import argparse
+import os
+import pickle
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(script_dir, "..", "Exercise1"))
+from results_data import file_sha256, split_columns
+from instrumentation import stage
+
+# Transfer value regression for Ex4: one model per primary position (GK/DF/MF/FW) on every Ex1 stat plus age,
+# minutes and team, and a pooled model for positions with fewer than MIN_GROUP_ROWS valued players. Each model is
+# a grid search over Ridge, Random Forest and Gradient Boosting with K-fold CV, the candidates x folds spread over
+# N_JOBS processes; targets are fitted on log1p(value) and scored in millions of euros. The feature matrix is cached
+# in .cache/ keyed by the results file, and the fitted model is saved to model/ for batch predict(). sklearn is
+# imported by make_search (and by unpickling a saved model), so Ex4 runs with EX4_TRAIN_MODEL=0 do not load it.
+#   python value_model.py ../Exercise1/results.csv --output predictions.csv
+
+MODEL_PATH = os.path.join(script_dir, "model", "value_model.pkl")
+CACHE_DIR = os.path.join(script_dir, ".cache")
+# Bump when build_features or the saved fields change
+FEATURE_VERSION = 1
+MODEL_VERSION = 1
+TARGET = 'Transfer_Value_Millions_EUR'
+POSITIONS = ('GK', 'DF', 'MF', 'FW')
+POOLED = 'all'
+MIN_GROUP_ROWS = 30
+CV_FOLDS = 5
+N_JOBS = int(os.environ.get("EX4_JOBS", "-1"))
+DAYS_PER_YEAR = 365.25
+
+
+def primary_position(positions):
+    return positions.astype('string').str.split(',').str[0].fillna('')
+
+
+def build_features(players):
+    # Numeric feature frame indexed like `players`: every stat, Age in years, Minutes / Matches Played / Starts,
+    # and one indicator column per team
+    _, stats = split_columns(players.drop(columns=[TARGET], errors='ignore'))
+    numeric = [col for col in ('Minutes', 'Matches Played', 'Starts') if col in players] + stats
+    features = players[numeric].astype(float)
+    if 'Age' in players:
+        features.insert(0, 'Age', players['Age'].astype(float) / DAYS_PER_YEAR)
+    if 'Team' in players:
+        teams = pd.get_dummies(players['Team'].astype('string'), prefix='Team', dtype=float)
+        features = pd.concat([features, teams], axis=1)
+    # PrgP / PrgR appear twice in results.csv
+    return features.loc[:, ~features.columns.duplicated()]
+
+
+def cached_features(players, results_path):
+    # build_features(players), reused across runs while the results file (and the row selection) is unchanged
+    key = f"{file_sha256(results_path)[:16]}-{pd.util.hash_pandas_object(players.index).sum() & 0xffffffff:08x}"
+    path = os.path.join(CACHE_DIR, f"value-features-{key}-v{FEATURE_VERSION}.pkl")
+    if os.path.exists(path):
+        with stage("cache_load", cache="value_features"):
+            return pd.read_pickle(path)
+    with stage("clean", step="value_features") as built:
+        features = build_features(players)
+        built.rows = len(features)
+    with stage("cache_save", cache="value_features"):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        features.to_pickle(path + ".tmp")
+        os.replace(path + ".tmp", path)
+    return features
+
+
+def param_grid():
+    from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+    from sklearn.linear_model import Ridge
+
+    return [
+        {'regressor__model': [Ridge()], 'regressor__model__alpha': [0.1, 1.0, 10.0, 100.0]},
+        {'regressor__model': [RandomForestRegressor(n_estimators=100, max_features=0.5, random_state=42)],
+         'regressor__model__min_samples_leaf': [1, 3]},
+        {'regressor__model': [GradientBoostingRegressor(n_estimators=150, subsample=0.8, random_state=42)],
+         'regressor__model__learning_rate': [0.05, 0.1], 'regressor__model__max_depth': [2, 3]},
+    ]
+
+
+def make_search(rows, n_jobs=N_JOBS):
+    from sklearn.compose import TransformedTargetRegressor
+    from sklearn.impute import SimpleImputer
+    from sklearn.linear_model import Ridge
+    from sklearn.model_selection import GridSearchCV, KFold
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    pipeline = Pipeline([('impute', SimpleImputer(strategy='median', keep_empty_features=True)),
+                         ('scale', StandardScaler()), ('model', Ridge())])
+    estimator = TransformedTargetRegressor(regressor=pipeline, func=np.log1p, inverse_func=np.expm1)
+    folds = KFold(n_splits=min(CV_FOLDS, rows), shuffle=True, random_state=42)
+    return GridSearchCV(estimator, param_grid(), cv=folds, n_jobs=n_jobs, refit='rmse',
+                        scoring={'rmse': 'neg_root_mean_squared_error', 'r2': 'r2'})
+
+
+class ValueModel:
+    def __init__(self, feature_columns, models, metrics):
+        # models: {position or POOLED: fitted estimator}; metrics: one dict per model
+        self.feature_columns = list(feature_columns)
+        self.models = models
+        self.metrics = metrics
+        self.version = MODEL_VERSION
+
+    def predict(self, players, features=None):
+        # Predicted value in millions of euros for each row of `players` (a results.csv-like frame), as a Series
+        # indexed like it; `features` can pass an already built feature frame
+        features = build_features(players) if features is None else features
+        features = features.reindex(columns=self.feature_columns)
+        # A batch from fewer teams lacks some indicator columns; those players are simply not on that team
+        teams = [col for col in self.feature_columns if col.startswith('Team_')]
+        features[teams] = features[teams].fillna(0.0)
+        matrix = features.to_numpy(dtype=float)
+        positions = primary_position(players['Position']).to_numpy()
+        predictions = np.empty(len(players))
+        for group in np.unique(positions):
+            rows = positions == group
+            model = self.models.get(group, self.models[POOLED])
+            predictions[rows] = model.predict(matrix[rows])
+        return pd.Series(predictions, index=players.index, name='Predicted_Value_Millions_EUR')
+
+    def save(self, path=MODEL_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+        return path
+
+    @classmethod
+    def load(cls, path=MODEL_PATH):
+        with open(path, "rb") as f:
+            model = pickle.load(f)
+        if getattr(model, "version", None) != MODEL_VERSION:
+            raise ValueError(f"{path} was saved by model version {getattr(model, 'version', None)}, "
+                             f"expected {MODEL_VERSION}; re-run Ex4.py")
+        return model
+
+
+def train(players, features, target=TARGET, n_jobs=N_JOBS):
+    # Fits the pooled model and one model per position with at least MIN_GROUP_ROWS valued players
+    valued = players[target].notna().to_numpy()
+    positions = primary_position(players['Position']).to_numpy()
+    matrix = features.to_numpy(dtype=float)
+    values = players[target].to_numpy(dtype=float)
+    models, metrics = {}, []
+    for group in (POOLED,) + POSITIONS:
+        rows = valued if group == POOLED else valued & (positions == group)
+        if rows.sum() < (CV_FOLDS if group == POOLED else MIN_GROUP_ROWS):
+            continue
+        start = time.perf_counter()
+        with stage("fit", model=group) as fitted:
+            fitted.rows = int(rows.sum())
+            search = make_search(int(rows.sum()), n_jobs).fit(matrix[rows], values[rows])
+        results = search.cv_results_
+        best = search.best_index_
+        models[group] = search.best_estimator_
+        metrics.append({
+            'model': group, 'rows': int(rows.sum()),
+            'estimator': type(search.best_params_['regressor__model']).__name__,
+            'params': {name.split('__')[-1]: value for name, value in search.best_params_.items()
+                       if name != 'regressor__model'},
+            'cv_rmse': -results['mean_test_rmse'][best], 'cv_r2': results['mean_test_r2'][best],
+            'candidates': len(results['params']), 'train_seconds': time.perf_counter() - start,
+        })
+    if POOLED not in models:
+        raise ValueError(f"Only {int(valued.sum())} players have a transfer value; need at least {CV_FOLDS}")
+    return ValueModel(features.columns, models, metrics)
+
+
+def inference_latency(model, players, features=None, repeats=20):
+    # (p50, p99) milliseconds to predict the whole batch of `players`
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model.predict(players, features)
+        timings.append(time.perf_counter() - start)
+    return tuple(np.percentile(timings, [50, 99]) * 1000)
+
+
+def format_report(model, n_players, latency):
+    table = pd.DataFrame(model.metrics)
+    table['cv_rmse'] = table['cv_rmse'].round(2)
+    table['cv_r2'] = table['cv_r2'].round(3)
+    table['train_seconds'] = table['train_seconds'].round(2)
+    lines = [
+        f"Transfer value models ({CV_FOLDS}-fold CV, RMSE in millions EUR; "
+        f"positions under {MIN_GROUP_ROWS} valued players use the '{POOLED}' model)",
+        table.to_string(index=False),
+        f"Total training time: {table['train_seconds'].sum():.2f}s",
+        f"Batch inference over {n_players} players: p50 {latency[0]:.2f} ms, p99 {latency[1]:.2f} ms "
+        f"({latency[0] * 1000 / max(n_players, 1):.1f} us per player)",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+if __name__ == "__main__":
+    from results_data import load_results
+
+    parser = argparse.ArgumentParser(description="Predict transfer values with the model Ex4 saved")
+    parser.add_argument("results")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--output", help="CSV to write; prints the predictions when omitted")
+    args = parser.parse_args()
+
+    model = ValueModel.load(args.model)
+    players = load_results(args.results)
+    start = time.perf_counter()
+    predicted = model.predict(players)
+    elapsed = time.perf_counter() - start
+    names = [col for col in ('Player', 'First Name', 'Team', 'Position') if col in players]
+    predictions = pd.concat([players[names], predicted.round(2)], axis=1)
+    if args.output:
+        predictions.to_csv(args.output, index=False)
+    else:
+        print(predictions.to_string(index=False))
+    print(f"Predicted {len(predictions)} players in {elapsed * 1000:.2f} ms")